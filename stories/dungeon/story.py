@@ -1,7 +1,9 @@
 import pathlib
 import random
 import sys
-from typing import Generator
+import threading
+from concurrent.futures import Future
+from typing import Generator, Tuple
 
 from tale import parse_utils
 from tale import lang
@@ -11,6 +13,7 @@ from tale.driver import Driver
 from tale.dungeon.dungeon_generator import ItemPopulator, Layout, LayoutGenerator, MobPopulator
 from tale.items.basic import Money
 from tale.json_story import JsonStory
+from tale.llm import llm_scheduler
 from tale.skills.magic import MagicType
 from tale.main import run_from_cmdline
 from tale.npc_defs import RoamingMob
@@ -31,6 +34,8 @@ class Story(JsonStory):
         self.item_populator = item_populator
         self.max_depth = 5
         self.depth = 0
+        self._prepared_levels = dict() # type: dict[str, Tuple[Layout, list]] # zone name to pregenerated level
+        self._layout_lock = threading.Lock() # the layout generator keeps the level it's generating
         
 
     def init(self, driver: Driver) -> None:
@@ -106,11 +111,13 @@ class Story(JsonStory):
             return True
         first_zone = len(self._zones.values()) == 0
         zone.size_z = 1
-        layout = self.layout_generator.generate()
-
-        rooms = self._prepare_locations(layout=layout, first_zone=first_zone)
+        level = self._prepared_levels.pop(zone.name, None)
+        if level:
+            layout, described_rooms = level
+        else:
+            layout, described_rooms = self._prepare_level(zone=zone, first_zone=first_zone)
 
-        self._describe_rooms(zone=zone, layout=layout, rooms=rooms)
+        self._add_rooms(zone=zone, layout=layout, described_rooms=described_rooms)
         
         self._connect_locations(layout=layout)
 
@@ -129,20 +136,29 @@ class Story(JsonStory):
             self.layout_generator.spawn_gold(zone=zone)
     
         return True
+
+    def pregenerate_level(self, zone: Zone) -> Future:
+        """ Lay out and describe the level for a zone on an llm worker, while the player is still
+        busy with the current one. Adding the zone later uses the prepared level."""
+        return self.llm_util.scheduler.submit(lambda: self._prepare_level(zone=zone),
+                                              priority=llm_scheduler.PRIORITY_IDLE,
+                                              on_complete=lambda level: self._prepared_levels.__setitem__(zone.name, level))
+
+    def _prepare_level(self, zone: Zone, first_zone: bool = False) -> Tuple[Layout, list]:
+        """ Doesn't change the story, so it may run on an llm worker."""
+        with self._layout_lock:
+            layout = self.layout_generator.generate()
+        rooms = self._prepare_locations(layout=layout, first_zone=first_zone)
+        return layout, self._describe_rooms(zone=zone, layout=layout, rooms=rooms)
     
-    def _describe_rooms(self, zone: Zone, layout: Layout, rooms: list):
-        described_rooms = []
-        sliced_rooms = []
-        for num in range(0, len(rooms), 10):
-            sliced_rooms.extend(rooms[num:num+10])
-            for i in range(3):
-                described_rooms_slice = self.llm_util.generate_dungeon_locations(zone_info=zone.get_info(), locations=sliced_rooms, depth = self.depth, max_depth=self.max_depth) # type LocationDescriptionResponse
-                if described_rooms_slice.valid:
-                    described_rooms.extend(described_rooms_slice.location_descriptions)
-                    sliced_rooms = []
-                    break
+    def _describe_rooms(self, zone: Zone, layout: Layout, rooms: list) -> list:
+        described_rooms = self.llm_util.describe_dungeon_rooms(zone_info=zone.get_info(), rooms=rooms, depth=self.depth, max_depth=self.max_depth) # type: list[LocationDescription]
         if len(rooms) != len(described_rooms):
             print(f'Rooms list not same length: {len(rooms)} vs {len(described_rooms)}')
+        return described_rooms
+
+    def _add_rooms(self, zone: Zone, layout: Layout, described_rooms: list):
+        cells = list(layout.cells.values())
         for room in described_rooms:
             i = 1
             if zone.get_location(room.name):
@@ -150,10 +166,9 @@ class Story(JsonStory):
                 room.name = f'{room.name}({i})'
                 i += 1
             location = Location(name=room.name, descr=room.description)
-            location.world_location = list(layout.cells.values())[room.index].coord
+            location.world_location = cells[room.index].coord
             zone.add_location(location=location)
             self.add_location(zone=zone.name, location=location)
-        return described_rooms
 
     
     def _prepare_locations(self, layout: Layout, first_zone: bool = False) -> list:
@@ -112,16 +112,7 @@ class Story(JsonStory):
         return True
     
     def _describe_rooms(self, zone: Zone, layout: Layout, rooms: list):
-        described_rooms = []
-        sliced_rooms = []
-        for num in range(0, len(rooms), 10):
-            sliced_rooms.extend(rooms[num:num+10])
-            for i in range(3):
-                described_rooms_slice = self.driver.llm_util.generate_dungeon_locations(zone_info=zone.get_info(), locations=sliced_rooms, depth = self.depth, max_depth=self.max_depth) # type LocationDescriptionResponse
-                if described_rooms_slice.valid:
-                    described_rooms.extend(described_rooms_slice.location_descriptions)
-                    sliced_rooms = []
-                    break
+        described_rooms = self.driver.llm_util.describe_dungeon_rooms(zone_info=zone.get_info(), rooms=rooms, depth=self.depth, max_depth=self.max_depth) # type: list[LocationDescription]
         if len(rooms) != len(described_rooms):
             print(f'Rooms list not same length: {len(rooms)} vs {len(described_rooms)}')
         for room in described_rooms:
@@ -48,8 +48,8 @@ class Story(DynamicStory):
         import zones.prancingllama
         for location in zones.prancingllama.all_locations:
             self._zones["The Prancing Llama"].add_location(location)
-        self._catalogue._creatures = ["human", "giant rat", "bat", "balrog", "dwarf", "elf", "gnome", "halfling", "hobbit", "kobold", "orc", "troll", "vampire", "werewolf", "zombie"]
-        self._catalogue._items = ["woolly gloves", "ice pick", "fur cap", "rusty sword", "lantern", "food rations"]
+        self._catalogue.creatures = [{"name": name} for name in ["human", "giant rat", "bat", "balrog", "dwarf", "elf", "gnome", "halfling", "hobbit", "kobold", "orc", "troll", "vampire", "werewolf", "zombie"]]
+        self._catalogue.items = [{"name": name} for name in ["woolly gloves", "ice pick", "fur cap", "rusty sword", "lantern", "food rations"]]
 
     def init_player(self, player: Player) -> None:
         """
@@ -98,10 +98,10 @@ class Story(DynamicStory):
         player.tell("\n")
 
     def races_for_zone(self, zone: str) -> list[str]:
-        return self._catalogue._creatures
+        return [creature["name"] for creature in self._catalogue.creatures]
 
     def items_for_zone(self, zone: str) -> list[str]:
-        return self._catalogue._items
+        return [item["name"] for item in self._catalogue.items]
 
     def zone_info(self, zone_name: str, location: str) -> dict:
         zone_info = super.zone_info(zone_name, location)
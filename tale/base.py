@@ -45,7 +45,7 @@ from weakref import WeakValueDictionary
 from collections import OrderedDict
 from textwrap import dedent
 from types import ModuleType
-from typing import Callable, Iterable, Any, Sequence, Optional, Set, Dict, Union, FrozenSet, Tuple, List, Type, no_type_check
+from typing import Callable, Iterable, Any, Sequence, Optional, Set, Dict, Mapping, Union, FrozenSet, Tuple, List, Type, no_type_check
 from tale import resources_utils
 
 from tale.coord import Coord
@@ -62,6 +62,7 @@ from . import story
 from . import verbdefs
 from . import combat
 
+from .name_index import AliasSet, NameIndex, NameLookup
 from .errors import ActionRefused, ParseError, LocationIntegrityError, TaleError, UnknownVerbException, NonSoulVerb
 from tale.races import UnarmedAttack
 from tale.skills.weapon_type import WeaponSkills, WeaponType
@@ -307,6 +308,16 @@ class MudObject:
         """
         pass
 
+    @property
+    def name(self) -> str:
+        return self.__dict__["name"]
+
+    @name.setter
+    def name(self, value: str) -> None:
+        # stored under its own name so vars() and the savegames still see it
+        self.__dict__["name"] = value
+        self._names_changed()
+
     @property
     def title(self) -> str:
         return (self._title + '[hidden]') if self.hidden else self._title
@@ -314,6 +325,45 @@ class MudObject:
     @title.setter
     def title(self, value: str) -> None:
         self._title = value
+        self._names_changed()
+        self._looks_changed()
+
+    @property
+    def aliases(self) -> Set[str]:
+        return self._aliases
+
+    @aliases.setter
+    def aliases(self, value: Iterable[str]) -> None:
+        # a set is kept as an AliasSet, which reports its changes. Other collections are kept as they are,
+        # so changes to those (rather than assigning new aliases) aren't seen by name indexes.
+        self._aliases = AliasSet(value, self) if isinstance(value, (set, frozenset)) else value
+        self._names_changed()
+
+    def _names_changed(self) -> None:
+        """The name, title or aliases changed. Things that can be in a container update its name index."""
+        pass
+
+    def _looks_changed(self) -> None:
+        """Something that shows when looking around changed. Things in a location tell that location."""
+        pass
+
+    @property
+    def visible(self) -> bool:
+        return self._visible
+
+    @visible.setter
+    def visible(self, value: bool) -> None:
+        self._visible = value
+        self._looks_changed()
+
+    @property
+    def hidden(self) -> bool:
+        return self._hidden
+
+    @hidden.setter
+    def hidden(self, value: bool) -> None:
+        self._hidden = value
+        self._looks_changed()
 
     @property
     def description(self) -> str:
@@ -322,6 +372,7 @@ class MudObject:
     @description.setter
     def description(self, value: str) -> None:
         self._description = value
+        self._looks_changed()
 
     @property
     def short_description(self) -> str:
@@ -330,6 +381,7 @@ class MudObject:
     @short_description.setter
     def short_description(self, value: str) -> None:
         self._short_description = value
+        self._looks_changed()
 
     @property
     def extra_desc(self) -> Dict[str, str]:
@@ -349,6 +401,8 @@ class MudObject:
         self._description = dedent(descr).strip() if descr else ""
         self._short_description = short_descr.strip() if short_descr else ""
         self._extradesc = {}   # maps keyword to description
+        self._names_changed()
+        self._looks_changed()
 
     def _check_title(self, title: str) -> None:
         w = title.partition(" ")[0].lower()
@@ -467,6 +521,16 @@ class Item(MudObject):
     def __contains__(self, item: 'Item') -> bool:
         raise ActionRefused("You can't look inside of that.")
 
+    def _names_changed(self) -> None:
+        container = getattr(self, "contained_in", None)
+        if container is not None:
+            container._reindex(self)
+
+    def _looks_changed(self) -> None:
+        container = getattr(self, "contained_in", None)
+        if isinstance(container, Location):
+            container._looks_changed()
+
     @property
     def location(self) -> Optional['Location']:
         if not self.contained_in:
@@ -665,6 +729,8 @@ class Location(MudObject):
     """
     def __init__(self, name: str, descr: str="") -> None:
         self.name = name
+        self._look_generation = 0   # bumped whenever something changes that shows in look()
+        self._look_cache = {}  # type: Dict[Tuple[bool, Optional[Living], bool], List[str]]
         self.livings = set()  # type: Set[Living] # set of livings in this location
         self.items = set()    # type: Set[Item] # set of all items in the room
         self.exits = {}       # type: Dict[str, Exit] # dictionary of all exits: exit_direction -> Exit object with target & descr
@@ -678,6 +744,49 @@ class Location(MudObject):
     def __contains__(self, obj: Union['Living', Item]) -> bool:
         return obj in self.livings or obj in self.items
 
+    @property
+    def livings(self) -> Set['Living']:
+        return self._livings
+
+    @livings.setter
+    def livings(self, livings: Set['Living']) -> None:
+        self._livings = livings
+        self._living_names = NameIndex(self._livings)
+        self._looks_changed()
+
+    @property
+    def items(self) -> Set[Item]:
+        return self._items
+
+    @items.setter
+    def items(self, items: Set[Item]) -> None:
+        self._items = items
+        self._item_names = NameIndex(self._items)
+        self._looks_changed()
+
+    @property
+    def living_names(self) -> NameIndex:
+        """The livings in this location by name, alias and title"""
+        return self._living_names
+
+    @property
+    def item_names(self) -> NameIndex:
+        """The items in this location by name, alias and title"""
+        return self._item_names
+
+    def _reindex(self, obj: Union['Living', Item]) -> None:
+        self._living_names.update(obj)
+        self._item_names.update(obj)
+        self._looks_changed()
+
+    def _names_changed(self) -> None:
+        self._looks_changed()
+
+    def _looks_changed(self) -> None:
+        if hasattr(self, "_look_cache"):
+            self._look_generation += 1
+            self._look_cache.clear()
+
     def init_inventory(self, objects: Iterable[Union[Item, 'Living']]) -> None:
         """Set the location's initial item and livings 'inventory'"""
         if len(self.items) > 0 or len(self.livings) > 0:
@@ -690,9 +799,10 @@ class Location(MudObject):
         for living in self.livings:
             if living.location is self:
                 living.location = _limbo
-        self.livings.clear()
-        self.items.clear()
-        self.exits.clear()
+        self.livings = set()
+        self.items = set()
+        for exit in set(self.exits.values()):
+            exit.unbind(self)
 
     def add_exits(self, exits: Iterable['Exit']) -> None:
         """Adds every exit from the sequence as an exit to this room."""
@@ -705,6 +815,10 @@ class Location(MudObject):
         """get a wiretap for this location"""
         return pubsub.topic(("wiretap-location", "%s#%d" % (self.name, self.vnum)))
 
+    def is_wiretapped(self) -> bool:
+        """is someone wiretapping this location (doesn't create the wiretap)"""
+        return pubsub.has_subscribers(("wiretap-location", "%s#%d" % (self.name, self.vnum)))
+
     def tell(self, room_msg: str, exclude_living: 'Living'=None, specific_targets: Set[Union[ParsedWhoType, 'Living']]=None,
              specific_target_msg: str="", evoke : bool=True, short_len : bool=False, alt_prompt: str='', extra_context: str= '') -> None:
         """
@@ -769,7 +883,19 @@ class Location(MudObject):
         return (e.target for e in self.exits.values())
 
     def look(self, exclude_living: 'Living'=None, short: bool=False) -> Sequence[str]:
-        """returns a list of paragraph strings describing the surroundings, possibly excluding one living from the description list"""
+        """
+        returns a list of paragraph strings describing the surroundings, possibly excluding one living from the description list.
+        The paragraphs are cached until something changes in the location.
+        """
+        if exclude_living is not None and exclude_living not in self._livings:
+            exclude_living = None   # excluding someone who isn't here gives the same result as excluding no one
+        key = (short, exclude_living, bool(self.exits) and mud_context.config.show_exits_in_look)
+        paragraphs = self._look_cache.get(key)
+        if paragraphs is None:
+            paragraphs = self._look_cache[key] = self._render_look(exclude_living, short)
+        return list(paragraphs)
+
+    def _render_look(self, exclude_living: Optional['Living'], short: bool) -> List[str]:
         paragraphs = ["<location>[" + self.title + "]</>"]
         if short:
             if self.exits and mud_context.config.show_exits_in_look:
@@ -830,36 +956,45 @@ class Location(MudObject):
         Search for a living in this location by its name (and title, if no names match).
         Is alias-aware. If there's more than one match, returns the first. None if nothing found.
         """
-        name = name.lower()
-        result = [living for living in self.livings if living.name == name]
-        if not result:
-            # try titles and aliases
-            result = [living for living in self.livings if name in living.aliases or living.title.lower() == name]
-        return result[0] if result else None
+        return self._living_names.find(name)
+
+    def search_item(self, name: str) -> Optional[Item]:
+        """
+        Search for an item in this location by its name (and title, if no names match).
+        Is alias-aware. If there's more than one match, returns the first. None if nothing found.
+        """
+        return self._item_names.find(name)
 
     def insert(self, obj: Union['Living', Item], actor: Optional['Living'] = None) -> None:
         """Add item to the contents of the location (either a Living or an Item)"""
         assert obj is not None
         if isinstance(obj, Living):
-            self.livings.add(obj)
+            self._livings.add(obj)
+            self._living_names.add(obj)
         elif isinstance(obj, Item):
-            self.items.add(obj)
+            self._items.add(obj)
+            self._item_names.add(obj)
         elif isinstance(obj, Wearable):
-            self.items.add(obj)
+            self._items.add(obj)
+            self._item_names.add(obj)
         else:
             raise TypeError("can only add Living or Item")
         obj.location = self
+        self._looks_changed()
 
     def remove(self, obj: Union['Living', Item], actor: Optional['Living']) -> None:
         """Remove obj from this location (either a Living or an Item)"""
         assert obj is not None
-        if obj in self.livings:
-            self.livings.remove(obj)    # type: ignore
-        elif obj in self.items:
-            self.items.remove(obj)      # type: ignore
+        if obj in self._livings:
+            self._livings.remove(obj)    # type: ignore
+            self._living_names.discard(obj)
+        elif obj in self._items:
+            self._items.remove(obj)      # type: ignore
+            self._item_names.discard(obj)
         else:
             return   # just ignore an object that wasn't present in the first place
         obj.location = None
+        self._looks_changed()
 
     def handle_verb(self, parsed: ParseResult, actor: 'Living') -> bool:
         """
@@ -1064,6 +1199,7 @@ class Living(MudObject):
         self.money = 0.0  # the currency is determined by util.MoneyFormatter set in the driver
         self.default_verb = "examine"
         self.__inventory = set()   # type: Set[Item]
+        self.__inventory_names = NameIndex()
         self.previous_commandline = ""
         self._previous_parse = ParseResult("")
         self.teleported_from = None   # type: Optional[Location]   # used by teleport/return commands
@@ -1101,6 +1237,24 @@ class Living(MudObject):
     def inventory(self) -> FrozenSet[Item]:
         return frozenset(self.__inventory)
 
+    @property
+    def inventory_names(self) -> NameIndex:
+        """The items in the inventory by name, alias and title"""
+        return self.__inventory_names
+
+    def _reindex(self, item: Item) -> None:
+        self.__inventory_names.update(item)
+
+    def _names_changed(self) -> None:
+        location = getattr(self, "location", None)
+        if location is not None:
+            location._reindex(self)
+
+    def _looks_changed(self) -> None:
+        location = getattr(self, "location", None)
+        if location is not None:
+            location._looks_changed()
+
     def insert(self, item: Union['Living', Item], actor: Optional['Living']) -> None:
         """Add an item to the inventory."""
         assert item is not None
@@ -1116,6 +1270,7 @@ class Living(MudObject):
                     raise ActionRefused("It's probably not a good idea to give things to %s." % self.title)
                 raise
         self.__inventory.add(item)
+        self.__inventory_names.add(item)
         item.contained_in = self
 
     def remove(self, item: Union['Living', Item], actor: Optional['Living']) -> None:
@@ -1125,18 +1280,23 @@ class Living(MudObject):
             raise ActionRefused("You can't do that.")
         if actor is self or actor is not None and "wizard" in actor.privileges:
             self.__inventory.remove(item)
+            self.__inventory_names.discard(item)
             item.contained_in = None
         else:
             raise ActionRefused("You can't take %s from %s." % (item.title, self.title))
 
     def destroy(self, ctx: Optional[util.Context]) -> None:
         super().destroy(ctx)
+        mud_context.driver.llm_util.scheduler.cancel(self)
         if self.location and self in self.location.livings:
             self.location.livings.remove(self)
+            self.location.living_names.discard(self)
+            self.location._looks_changed()
         self.location = _limbo
         for item in self.__inventory:
             item.destroy(ctx)
         self.__inventory.clear()
+        self.__inventory_names.clear()
         # @todo: remove attack status, etc.
         self.soul = None   # type: ignore  # truly die ;-)
 
@@ -1180,6 +1340,10 @@ class Living(MudObject):
         """get a wiretap for this living"""
         return pubsub.topic(("wiretap-living", "%s#%d" % (self.name, self.vnum)))
 
+    def is_wiretapped(self) -> bool:
+        """is someone wiretapping this living (doesn't create the wiretap)"""
+        return pubsub.has_subscribers(("wiretap-living", "%s#%d" % (self.name, self.vnum)))
+
     def tell(self, message: str, *, end: bool=False, format: bool=True, evoke: bool=False, short_len : bool=False, alt_prompt : str='', extra_context: str= '') -> 'Living':
         """
         Every living thing in the mud can receive an action message.
@@ -1433,10 +1597,10 @@ class Living(MudObject):
         containing_object = None   # type: Optional[ContainingType]
         if include_inventory:
             containing_object = self
-            found = Item.search_item(name, self.__inventory)
+            found = self.__inventory_names.find(name)
         if not found and include_location:
             containing_object = self.location
-            found = Item.search_item(name, self.location.items)
+            found = self.location.search_item(name)
         if not found and include_containers_in_inventory:
             # check if an item in the inventory might contain it
             for container in self.__inventory:
@@ -1446,7 +1610,10 @@ class Living(MudObject):
                 except ActionRefused:
                     continue    # no access to inventory, just skip this item silently
                 else:
-                    found = Item.search_item(name, inventory)
+                    if isinstance(container, Container):
+                        found = container.inventory_names.find(name)
+                    else:
+                        found = Item.search_item(name, inventory)
                     if found:
                         break
         return (found, containing_object) if found else (None, None)
@@ -1493,7 +1660,7 @@ class Living(MudObject):
                              evoke=True,
                              short_len=False,
                              alt_prompt=combat_prompt,
-                             extra_context=combat_context.to_prompt_string())
+                             extra_context=combat_context)
         for attacker in attackers:
             if attacker.stats.hp < 1:
                 mud_context.driver.defer(0.1, attacker.do_on_death)
@@ -1742,11 +1909,13 @@ class Container(Item):
     """
     def init(self) -> None:
         self.__inventory = set()   # type: Set[Item]
+        self.__inventory_names = NameIndex()
 
     def init_inventory(self, items: Iterable[Item]) -> None:
         """Set the container's initial inventory"""
         assert len(self.__inventory) == 0
         self.__inventory = set(items)
+        self.__inventory_names = NameIndex(self.__inventory)
         for item in items:
             item.contained_in = self
     
@@ -1754,6 +1923,14 @@ class Container(Item):
     def inventory(self) -> FrozenSet[Item]:
         return frozenset(self.__inventory)
 
+    @property
+    def inventory_names(self) -> NameIndex:
+        """The items in the container by name, alias and title"""
+        return self.__inventory_names
+
+    def _reindex(self, item: Item) -> None:
+        self.__inventory_names.update(item)
+
     @property
     def inventory_size(self) -> int:
         return len(self.__inventory)
@@ -1765,6 +1942,7 @@ class Container(Item):
         for item in self.__inventory:
             item.destroy(ctx)
         self.__inventory.clear()
+        self.__inventory_names.clear()
         super().destroy(ctx)
 
     def insert(self, item: Union[Living, Item], actor: Optional[Living]) -> None:
@@ -1772,6 +1950,7 @@ class Container(Item):
         if not isinstance(item, Item):
             raise ActionRefused("You can't do that.")
         self.__inventory.add(item)
+        self.__inventory_names.add(item)
         item.contained_in = self
 
     def remove(self, item: Union[Living, Item], actor: Optional[Living]) -> None:
@@ -1779,6 +1958,7 @@ class Container(Item):
         if not isinstance(item, Item):
             raise ActionRefused("You can't do that.")
         self.__inventory.remove(item)
+        self.__inventory_names.discard(item)
         item.contained_in = None
 
 
@@ -1793,11 +1973,13 @@ class Exit(MudObject):
     Long_description is optional and will be shown instead if the player examines the exit.
     Enter_msg is the text shown to the player when they succesfully enter/pass through the exit/door.
     The exit's direction is stored as its name attribute (if more than one, the rest are aliases).
-    Note that the exit's origin is not stored in the exit object.
+    Note that the exit's origin is not stored in the exit object; it only remembers where it
+    is bound, so those locations know when the exit looks different.
     """
     def __init__(self, directions: Union[str, Sequence[str]], target_location: Union[str, Location],
                  short_descr: str, long_descr: str="", *, enter_msg: str="") -> None:
         assert isinstance(target_location, (Location, str)), "target must be a Location or a string"
+        self._bound_to = []    # type: List[Location]
         self.target = _limbo   # type: Location
         if isinstance(directions, str):
             direction = directions
@@ -1854,6 +2036,20 @@ class Exit(MudObject):
             if direction in location.exits:
                 raise LocationIntegrityError("exit already exists: '%s' in %s" % (direction, location), direction, self, location)
             location.exits[direction] = self
+        self._bound_to.append(location)
+        location._looks_changed()
+
+    def unbind(self, location: Location) -> None:
+        """Removes the exit from a location."""
+        for direction in [d for d, exit in location.exits.items() if exit is self]:
+            del location.exits[direction]
+        if location in self._bound_to:
+            self._bound_to.remove(location)
+        location._looks_changed()
+
+    def _looks_changed(self) -> None:
+        for location in getattr(self, "_bound_to", ()):
+            location._looks_changed()
 
     def _bind_target(self, game_zones_module: ModuleType) -> None:
         """
@@ -2391,20 +2587,8 @@ class Soul:
             unparsed = unparsed[len(verb):].lstrip()
         include_flag = True
         collect_message = False
-        all_livings = {}  # livings in the room (including player) by name + aliases
-        all_items = {}  # all items in the room or player's inventory, by name + aliases
-        for living in player.location.livings:
-            all_livings[living.name] = living
-            for alias in living.aliases:
-                all_livings[alias] = living
-        for item in player.location.items:
-            all_items[item.name] = item
-            for alias in item.aliases:
-                all_items[alias] = item
-        for item in player.inventory:
-            all_items[item.name] = item
-            for alias in item.aliases:
-                all_items[alias] = item
+        all_livings = NameLookup(player.location.living_names)  # livings in the room (including player) by name + aliases
+        all_items = NameLookup(player.location.item_names, player.inventory_names)  # all items in the room or player's inventory, by name + aliases
         previous_word = None
         words_enumerator = enumerate(words)
         for index, word in words_enumerator:
@@ -2673,8 +2857,8 @@ class Soul:
             return False
         return True
 
-    def check_name_with_spaces(self, words: Sequence[str], startindex: int, all_livings: Dict[str, Living],
-                               all_items: Dict[str, Item], all_exits: Dict[str, Exit]) \
+    def check_name_with_spaces(self, words: Sequence[str], startindex: int, all_livings: Mapping[str, Living],
+                               all_items: Mapping[str, Item], all_exits: Mapping[str, Exit]) \
             -> Tuple[Optional[ParsedWhoType], str, int]:
         """
         Searches for a name used in sentence where the name consists of multiple words (separated by space).
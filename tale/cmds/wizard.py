@@ -520,6 +520,66 @@ def do_pubsub(player: Player, parsed: base.ParseResult, ctx: util.Context) -> No
     player.tell("\n".join(txt), format=False)
 
 
+@wizcmd("ticks")
+def do_ticks(player: Player, parsed: base.ParseResult, ctx: util.Context) -> None:
+    """Show where the server spends its time: tick phases, deferreds, commands and llm requests.
+    Give a name prefix such as 'deferred' to show only those, or 'reset' to start counting again."""
+    profiler = ctx.driver.profiler
+    if parsed.args and parsed.args[0] == "reset":
+        profiler.reset()
+        player.tell("Tick timings have been reset.")
+        return
+    prefix = parsed.args[0] if parsed.args else ""
+    player.tell("<bright>Tick timings</> (ms, of the last %d samples):" % profiler.max_samples, end=True)
+    txt = ["<ul>  name                                    <dim>|</><ul>  count<dim>|</><ul>   p50  <dim>|</><ul>   p90  <dim>|</><ul>   p99  </>"]
+    for name in profiler.names():
+        if name.startswith(prefix):
+            p50, p90, p99 = profiler.percentiles(name)
+            txt.append("%-42.42s<dim>|</>%7d<dim>|</>%8.1f<dim>|</>%8.1f<dim>|</>%8.1f"
+                       % (name, profiler.count(name), p50 * 1000, p90 * 1000, p99 * 1000))
+    for name, value in sorted(profiler.gauges().items()):
+        txt.append("%s: %d" % (name, value))
+    if profiler.slow_ticks:
+        txt.append("")
+        txt.append("Slow ticks (%d in total, showing the last %d):" % (profiler.num_slow_ticks, min(10, len(profiler.slow_ticks))))
+        for slow_tick in list(profiler.slow_ticks)[-10:]:
+            txt.append("  %s  %.0f ms, slowest deferred: %s %.0f ms"
+                       % (datetime.datetime.fromtimestamp(slow_tick.time).strftime("%H:%M:%S"), slow_tick.duration * 1000,
+                          slow_tick.culprit or "none", slow_tick.culprit_duration * 1000))
+    txt.append("")
+    player.tell("\n".join(txt), format=False)
+
+
+@wizcmd("llm_budget")
+def do_llm_budget(player: Player, parsed: base.ParseResult, ctx: util.Context) -> None:
+    """Show the llm requests per kind and zone: admitted, refused (over budget), dropped as stale, and tokens.
+    Use 'reset' to start counting again."""
+    governor = ctx.driver.llm_util.governor
+    if parsed.args and parsed.args[0] == "reset":
+        governor.reset()
+        player.tell("Llm budget counters have been reset.")
+        return
+    stats = governor.stats()
+    player.tell("<bright>Llm budget</> (running: %d, queued: %d, max: %s):"
+                % (stats["in_flight"], stats["queued"], stats["max_concurrent"] or "unlimited"), end=True)
+    txt = ["<ul>  kind        <dim>|</><ul> admitted<dim>|</><ul> refused<dim>|</><ul>  stale<dim>|</><ul>   tokens<dim>|</><ul> req/min<dim>|</><ul> tokens/min </>"]
+    for kind, counts in stats["kinds"].items():
+        txt.append("%-14.14s<dim>|</>%9d<dim>|</>%8d<dim>|</>%7d<dim>|</>%9d<dim>|</>%4d/%-3s<dim>|</>%6d/%s"
+                   % (kind, counts["admitted"], counts["refused"], counts["stale"], counts["tokens"],
+                      counts["requests_per_minute"], counts["request_limit"] or "-",
+                      counts["tokens_per_minute"], counts["token_limit"] or "-"))
+    batcher = ctx.driver.llm_util.batcher
+    if batcher.batches:
+        txt.append("Npc actions asked for together: %d, in %d requests." % (batcher.batched, batcher.batches))
+    if stats["zones"]:
+        txt.append("")
+        txt.append("Requests in the last minute per zone (limit: %s):" % (governor.zone_rate_limit or "none"))
+        for zone, requests in sorted(stats["zones"].items()):
+            txt.append("  %s: %d" % (zone, requests))
+    txt.append("")
+    player.tell("\n".join(txt), format=False)
+
+
 @wizcmd("force")
 def do_force(player: Player, parsed: base.ParseResult, ctx: util.Context) -> None:
     """Force another living being into performing a given command."""
@@ -876,7 +936,7 @@ def do_set_goal(player: Player, parsed: base.ParseResult, ctx: util.Context) ->
         if not character or not isinstance(character, LivingNpc):
             raise ParseError("No LivingNpc found")
         goal = parsed.unparsed.replace(parsed.who_1.name, '').strip()
-        character.goal = goal
+        character.set_goal(goal)
         player.tell("%s goal set to %s" % (character, goal))
     except ValueError as x:
         raise ActionRefused(str(x))
@@ -1,5 +1,6 @@
 from typing import List
 from tale.day_cycle.day_cycle import DayCycleEventObserver
+from tale.llm import llm_governor
 from tale.player import PlayerConnection
 
 
@@ -25,4 +26,6 @@ class LlmDayCycleListener(DayCycleEventObserver):
         pass
 
     def _describe_transition(self, from_time: str, to_time: str):
-        self.llm_util.describe_day_cycle_transition(self.players, from_time, to_time)
\ No newline at end of file
+        for player in list(self.players):
+            if self.llm_util.governor.admit(llm_governor.KIND_DAY_CYCLE, player.player.location):
+                self.llm_util.describe_day_cycle_transition(player, from_time, to_time)
\ No newline at end of file
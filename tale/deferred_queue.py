@@ -0,0 +1,120 @@
+"""
+Bucketed scheduler for the driver's deferreds.
+
+Deferreds are put in buckets by their due time, one bucket per slot of game time.
+Adding a deferred to a bucket, or removing it, doesn't touch any of the others, and an
+owner's deferreds are indexed so they can all be removed when the owner is destroyed.
+A server tick fires whole buckets at once: the periodicals that come due within the
+same slot are fired as one batch.
+
+'Tale' mud driver, mudlib and interactive fiction framework
+Copyright by Irmen de Jong (irmen@razorvine.net)
+"""
+
+import datetime
+import heapq
+from typing import Any, Dict, Iterator, List, Tuple
+
+__all__ = ["DeferredQueue"]
+
+
+_EPOCH = datetime.datetime.min
+
+
+class DeferredQueue:
+    """
+    The pending deferreds, by due time slot (resolution in seconds of game time).
+    Not thread safe; the driver guards it with its deferreds_lock.
+    """
+    def __init__(self, resolution: float = 1.0) -> None:
+        self.resolution = datetime.timedelta(seconds=resolution)
+        self._buckets = {}  # type: Dict[int, Dict[int, Any]]  # slot to deferreds, by id
+        self._slots = []  # type: List[int]  # heapq of the slots that have a bucket
+        self._entries = {}  # type: Dict[int, Tuple[int, int]]  # deferred id to (slot, owner id)
+        self._owners = {}  # type: Dict[int, Dict[int, Any]]  # owner id to its deferreds, by id
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[Any]:
+        """The deferreds, in no particular order."""
+        for bucket in list(self._buckets.values()):
+            yield from list(bucket.values())
+
+    def __contains__(self, deferred: Any) -> bool:
+        return id(deferred) in self._entries
+
+    def slot(self, due_gametime: datetime.datetime) -> int:
+        return (due_gametime - _EPOCH) // self.resolution
+
+    def add(self, deferred: Any) -> None:
+        if id(deferred) in self._entries:
+            return
+        slot = self.slot(deferred.due_gametime)
+        bucket = self._buckets.get(slot)
+        if bucket is None:
+            bucket = self._buckets[slot] = {}
+            heapq.heappush(self._slots, slot)
+        bucket[id(deferred)] = deferred
+        owner_id = id(deferred.owner)
+        self._owners.setdefault(owner_id, {})[id(deferred)] = deferred
+        self._entries[id(deferred)] = (slot, owner_id)
+
+    def cancel(self, deferred: Any) -> bool:
+        """Remove a deferred. Returns False if it wasn't queued."""
+        entry = self._entries.pop(id(deferred), None)
+        if entry is None:
+            return False
+        slot, owner_id = entry
+        del self._buckets[slot][id(deferred)]   # an emptied bucket stays until its slot comes up
+        owned = self._owners[owner_id]
+        del owned[id(deferred)]
+        if not owned:
+            del self._owners[owner_id]
+        return True
+
+    def remove_owner(self, owner: Any) -> int:
+        """Remove all deferreds of the owner (by identity). Returns the number removed."""
+        owned = self._owners.get(id(owner))
+        if not owned:
+            return 0
+        removed = [d for d in owned.values() if d.owner is owner]
+        for deferred in removed:
+            self.cancel(deferred)
+        return len(removed)
+
+    def clear(self) -> None:
+        self._buckets.clear()
+        self._slots.clear()
+        self._entries.clear()
+        self._owners.clear()
+
+    def next_due(self) -> datetime.datetime:
+        """The due time of the first deferred, or None if there are none."""
+        while self._slots:
+            bucket = self._buckets[self._slots[0]]
+            if bucket:
+                return min(d.due_gametime for d in bucket.values())
+            del self._buckets[heapq.heappop(self._slots)]
+        return None
+
+    def pop_due(self, now: datetime.datetime) -> List[Any]:
+        """Remove and return the deferreds due at or before now, sorted by due time."""
+        now_slot = self.slot(now)
+        due = []   # type: List[Any]
+        while self._slots and self._slots[0] <= now_slot:
+            slot = self._slots[0]
+            bucket = self._buckets[slot]
+            batch = list(bucket.values())
+            if slot == now_slot:
+                # the current slot can still hold deferreds that are due later in the slot
+                batch = [d for d in batch if d.due_gametime <= now]
+            for deferred in batch:
+                self.cancel(deferred)
+            due.extend(batch)
+            if bucket:
+                break
+            heapq.heappop(self._slots)
+            del self._buckets[slot]
+        due.sort(key=lambda d: d.due_gametime)
+        return due
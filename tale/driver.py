@@ -7,7 +7,6 @@ Copyright by Irmen de Jong (irmen@razorvine.net)
 
 import collections
 import datetime
-import heapq
 import importlib
 import inspect
 import os
@@ -34,11 +33,17 @@ from . import __version__ as tale_version_str, _check_required_libraries
 from . import mud_context, errors, util, cmds, player, pubsub, charbuilder, lang, verbdefs, vfs, base
 from .story import TickMethod, GameMode, MoneyType, StoryBase
 from .tio import DEFAULT_SCREEN_WIDTH
+from .deferred_queue import DeferredQueue
+from .interest import InterestManager
+from .spawn_manager import SpawnManager
+from .tick_profiler import TickProfiler, deferred_name
 from .races import playable_races
 from .errors import StoryCompleted
 from tale.load_character import CharacterLoader, CharacterV2
 from tale.llm.dynamic_story import DynamicStory
 from tale.llm.llm_utils import LlmUtil
+from tale.llm import llm_scheduler
+from tale.llm.location_prebuilder import LocationPrebuilder
 from tale.web.web_utils import clear_resources, copy_web_resources
 
 
@@ -204,10 +209,17 @@ class Driver(pubsub.Listener):
     """
     def __init__(self) -> None:
         self.unbound_exits = []    # type: List[base.Exit]
-        self.deferreds = []   # type: List[Deferred]  # heapq
+        self.deferreds = DeferredQueue()
         self.deferreds_lock = threading.Lock()
+        self.wakeup = threading.Event()   # set when the main loop has something to do before its next tick
         self.server_started = datetime.datetime.now().replace(microsecond=0)
         self.server_loop_durations = collections.deque(maxlen=10)    # type: MutableSequence[float]
+        self.profiler = TickProfiler()
+        self.profiler.gauge("deferreds", lambda: len(self.deferreds))
+        self.profiler.gauge("players", lambda: len(self.all_players))
+        self.interest = InterestManager()
+        self.spawn_manager = SpawnManager()
+        self.profiler.gauge("spawners", lambda: len(self.spawn_manager))
         self.commands = Commands()
         self.all_players = {}   # type: Dict[str, player.PlayerConnection]  # maps playername to player connection object
         self.zones = None       # type: ModuleType
@@ -219,6 +231,9 @@ class Driver(pubsub.Listener):
         self.game_mode = None     # type: GameMode
         self._stop_mainloop = True
         self.llm_util = LlmUtil() # type: LlmUtil
+        self.llm_util.set_profiler(self.profiler)
+        self.prebuilder = LocationPrebuilder(self.llm_util.scheduler, self._prepare_target_location, self._commit_generated_location,
+                                             llm_config.params.get('PREBUILD_BUDGET', 2))
         # playerconnections that wait for input; maps connection to tuple (dialog, validator, echo_input)
         self.waiting_for_input = {}   # type: Dict[player.PlayerConnection, Tuple[Generator, Any, Any]]
         mud_context.driver = self
@@ -376,10 +391,12 @@ class Driver(pubsub.Listener):
         Flushes any pending output to the players, then closes down.
         """
         self._stop_mainloop = True
+        self.wakeup.set()
         for conn in self.all_players.values():
             conn.write_output()
             conn.destroy()
         self.all_players.clear()
+        self.llm_util.scheduler.shutdown()
         if self.story.config.custom_resources:
             clear_resources()
         time.sleep(0.1)
@@ -470,7 +487,8 @@ class Driver(pubsub.Listener):
                 continue
             try:
                 p.tell("\n")
-                self._process_player_command(cmd, conn)
+                with self.profiler.measure(self._command_metric(cmd, p)):
+                    self._process_player_command(cmd, conn)
                 p.remember_previous_parse()
                 # to avoid flooding/abuse, we stop the loop after processing one command.
                 break
@@ -490,27 +508,37 @@ class Driver(pubsub.Listener):
             except errors.ParseError as x:
                 p.tell(str(x))
 
+    def _command_metric(self, cmd: str, p: player.Player) -> str:
+        # only known verbs get their own timings, anything else typed in would flood the profiler with names
+        verb = cmd.partition(" ")[0]
+        verb = cmds.abbreviations.get(verb, verb)
+        if p.location and verb in p.location.exits:
+            return "command:go"
+        if verb in self.commands.get(p.privileges):
+            return "command:" + verb
+        return "command:other"
+
     def _server_tick(self) -> None:
         """
         Do everything that the server needs to do every tick (timer configurable in story)
         1) game clock
-        2) deferreds
-        3) pending pubsub events
-        4) write buffered output
-        5) verify validity and idle state of connected players
-        6) remove idle wiretaps
+        2) deferreds, and the npc llm requests they collected
+        3) player whereabouts (interest) and spawners
+        4) pending pubsub events
+        5) write buffered output
+        6) verify validity and idle state of connected players
+        7) remove idle wiretaps
         """
         self.game_clock.add_realtime(datetime.timedelta(seconds=self.story.config.server_tick_time))
         ctx = util.Context(self, self.game_clock, self.story.config, None)
+        tick_start = time.perf_counter()
 
-        due_deferreds = []
         with self.deferreds_lock:
-            while self.deferreds:
-                deferred = self.deferreds[0]
-                if deferred.due_gametime > self.game_clock.clock:
-                    break
-                due_deferreds.append(heapq.heappop(self.deferreds))
+            due_deferreds = self.deferreds.pop_due(self.game_clock.clock)
+        slowest = ("", 0.0)
         for deferred in due_deferreds:
+            name = deferred_name(deferred)   # the action is gone once a one-shot deferred has been called
+            start = time.perf_counter()
             try:
                 deferred(ctx=ctx)  # call the deferred and provide a context object
             except StoryCompleted:
@@ -519,16 +547,31 @@ class Driver(pubsub.Listener):
                 print("\n* Exception while executing deferred action {0}:".format(deferred), file=sys.stderr)
                 print("".join(util.format_traceback()), file=sys.stderr)
                 print("(Please report this problem)", file=sys.stderr)
+            duration = time.perf_counter() - start
+            self.profiler.record("deferred:" + name, duration)
+            if duration > slowest[1]:
+                slowest = (name, duration)
         del due_deferreds
-
-        pubsub.sync()
-        for name, conn in list(self.all_players.items()):
-            if conn.player and conn.io and conn.player.location:
-                self.disconnect_idling(conn)
-                conn.write_output()
-            else:
-                # disconnect corrupt player connection
-                self.disconnect_player(conn)
+        deferreds_done = time.perf_counter()
+        self.profiler.record("deferreds", deferreds_done - tick_start)
+
+        with self.profiler.measure("llm_batches"):
+            self.llm_util.batcher.flush()
+        with self.profiler.measure("interest"):
+            player_locations = [conn.player.location for conn in self.all_players.values() if conn.player and conn.player.location]
+            self.interest.update(player_locations, getattr(self.story, "find_zone", None))
+        with self.profiler.measure("spawners"):
+            self.spawn_manager.tick(self.game_clock, self.interest)
+        with self.profiler.measure("pubsub"):
+            pubsub.sync()
+        with self.profiler.measure("output"):
+            for name, conn in list(self.all_players.items()):
+                if conn.player and conn.io and conn.player.location:
+                    self.disconnect_idling(conn)
+                    conn.write_output()
+                else:
+                    # disconnect corrupt player connection
+                    self.disconnect_player(conn)
         # clean up idle wiretap topics
         topicinfo = pubsub.pending()
         for topicname in topicinfo:
@@ -536,6 +579,7 @@ class Driver(pubsub.Listener):
                 events, idle_time, subbers = topicinfo[topicname]
                 if events == 0 and not subbers and idle_time > 30:
                     pubsub.topic(topicname).destroy()
+        self.profiler.tick_done(time.perf_counter() - tick_start, self.story.config.server_tick_time, slowest)
 
     def disconnect_idling(self, conn: player.PlayerConnection) -> None:
         raise NotImplementedError
@@ -626,41 +670,104 @@ class Driver(pubsub.Listener):
         if not target_location.built:
             dynamic_story = typing.cast(DynamicStory, self.story)
             zone = dynamic_story.find_zone(location=player.location.name)
-            # are we close to the edge of a zone? if so we need to build the next zone.
-            new_zone = self.llm_util.get_neighbor_or_generate_zone(current_zone=zone, 
-                                                        current_location=player.location, 
-                                                        target_location=target_location)
-            if zone.name != new_zone.name:
-                player.tell(f"You're entering {new_zone.name}:{new_zone.description}")
-            
-            # generate the location if it's not built yet. retry 5 times.
-            for i in range(5):
-                result = self.build_location(target_location, new_zone, player)
-                if result:
-                    # transfer the location from the old zone to the new zone
-                    zone.remove_location(target_location)
-                    new_zone.add_location(target_location)
-                    break
-
-            if not result:
-                raise errors.ActionRefused("Reached max attempts when building location: " + target_location.name + ". You can try entering again.")
-                    
+            from_location = player.location
+            on_complete = lambda result: self._enter_generated_location(player, xt, from_location, zone, result, evoke)
+            if self.prebuilder.claim(target_location, player, on_complete):
+                return  # it's already being built, the player enters it when done
+            # the location is generated by an llm worker, the player enters it when done.
+            # meanwhile, its description is shown as it streams in, if the backend streams.
+            stream = self.llm_util.stream_to(self.all_players.get(player.name), f"{lang.capital(target_location.title)}: ")
+            if stream:
+                enter = on_complete
+                on_complete = lambda result: (stream.end(), enter(result))
+            self.llm_util.scheduler.submit(self._prepare_target_location(zone, from_location, target_location, on_description=stream),
+                                           priority=llm_scheduler.PRIORITY_WORLD,
+                                           owner=player,
+                                           on_complete=on_complete)
+            return
         elif random.random() < 0.2 and isinstance(self.story, DynamicStory):
+            self.prebuilder.entered(target_location)
             dynamic_story = typing.cast(DynamicStory, self.story)
             zone = dynamic_story.find_zone(location=target_location.name)
             self.llm_util.generate_random_spawn(target_location, zone.get_info())
         elif isinstance(self.story, DynamicStory):
+            self.prebuilder.entered(target_location)
             dynamic_story = typing.cast(DynamicStory, self.story)
             zone = dynamic_story.find_zone(location=player.location.name)
             new_zone = dynamic_story.find_zone(location=target_location.name)
             if zone and zone.name != new_zone.name:
                 player.tell(f"You're entering {new_zone.name}:{new_zone.description}")
+        self._enter_location(player, xt, evoke)
 
+    def _enter_location(self, player: player.Player, xt: base.Exit, evoke: bool) -> None:
         if xt.enter_msg:
             player.tell(xt.enter_msg, end=True, evoke=False, short_len=True)
             player.tell("\n")
-        player.move(target_location, direction_names=[xt.name] + list(xt.aliases))
+        player.move(xt.target, direction_names=[xt.name] + list(xt.aliases))
         player.look(evoke=evoke)
+        if self.prebuilder.enabled and isinstance(self.story, DynamicStory):
+            dynamic_story = typing.cast(DynamicStory, self.story)
+            self.prebuilder.prebuild(xt.target, dynamic_story.find_zone(location=xt.target.name))
+
+    def _prepare_target_location(self, zone: Zone, from_location: base.Location, target_location: base.Location,
+                                 on_description: Callable[[str], None] = None) -> Callable[[], Tuple[Zone, Any]]:
+        """ Runs on the driver thread. Copies what generating the target location needs of the story,
+            and returns the task that generates it on an llm worker."""
+        world = self._location_request_args(target_location)
+        return lambda: self._generate_target_location(zone, from_location, target_location, world, on_description=on_description)
+
+    def _location_request_args(self, target_location: base.Location) -> dict:
+        """ The neighbors of the location and the catalogue, copied, so an llm worker can use them while the story changes."""
+        dynamic_story = typing.cast(DynamicStory, self.story)
+        return dict(neighbors=dynamic_story.neighbors_for_location(target_location),
+                    world_creatures=list(dynamic_story.catalogue._creatures),
+                    world_items=list(dynamic_story.catalogue._items))
+
+    def _generate_target_location(self, zone: Zone, from_location: base.Location, target_location: base.Location, world: dict,
+                                  on_description: Callable[[str], None] = None) -> Tuple[Zone, Any]:
+        """ Runs on an llm worker. Returns the zone of the target location, and the generated location, or None.
+            Nothing is added to the story here, that's up to _commit_generated_location.
+            world is what _location_request_args copied of the story.
+            on_description gets the description of the location while it streams in, on the first attempt."""
+        # are we close to the edge of a zone? if so we need to build the next zone.
+        new_zone = self.llm_util.get_neighbor_or_generate_zone(current_zone=zone, 
+                                                    current_location=from_location, 
+                                                    target_location=target_location,
+                                                    add_zone=False)
+        # generate the location if it's not built yet. retry 5 times.
+        for i in range(5):
+            generated = self._generate_location(target_location, new_zone, from_location.name, world,
+                                                on_description=on_description if i == 0 else None)
+            if generated:
+                return new_zone, generated
+        return new_zone, None
+
+    def _commit_generated_location(self, target_location: base.Location, zone: Zone, result: Tuple[Zone, Any]) -> bool:
+        """ Adds a generated location, and its zone if that's new, to the story in one go.
+            Must run on the driver thread. Returns False if there was nothing to add, or it was already built."""
+        new_zone, generated = result
+        if not generated or target_location.built:
+            return False
+        dynamic_story = typing.cast(DynamicStory, self.story)
+        if new_zone is not zone and not dynamic_story.add_zone(new_zone):
+            new_zone = dynamic_story.get_zone(new_zone.name)
+        self._apply_location(target_location, new_zone, *generated)
+        # transfer the location from the old zone to the new zone
+        zone.remove_location(target_location)
+        new_zone.add_location(target_location)
+        return True
+
+    def _enter_generated_location(self, player: player.Player, xt: base.Exit, from_location: base.Location, zone: Zone, result: Tuple[Zone, Any], evoke: bool) -> None:
+        new_zone, generated = result
+        target_location = xt.target
+        if not generated and not target_location.built:
+            raise errors.ActionRefused("Reached max attempts when building location: " + target_location.name + ". You can try entering again.")
+        self._commit_generated_location(target_location, zone, result)
+        if player.location is not from_location:
+            return  # the player went elsewhere while the location was generated
+        if zone.name != new_zone.name:
+            player.tell(f"You're entering {new_zone.name}:{new_zone.description}")
+        self._enter_location(player, xt, evoke)
 
     def lookup_location(self, location_name: str) -> base.Location:
         location = self.zones
@@ -807,7 +914,7 @@ class Driver(pubsub.Listener):
         if "ctx" in deferred.kwargs:
             raise errors.TaleError("you cannot enqueue a Deferred that already has a 'ctx' kwarg (serialization issues)")
         with self.deferreds_lock:
-            heapq.heappush(self.deferreds, deferred)
+            self.deferreds.add(deferred)
 
     def pubsub_event(self, topicname: pubsub.TopicNameType, event: Union[Callable, Tuple[player.PlayerConnection, str]]) -> None:
         if topicname == "driver-pending-actions":
@@ -829,8 +936,12 @@ class Driver(pubsub.Listener):
 
     def remove_deferreds(self, owner: str) -> None:
         with self.deferreds_lock:
-            self.deferreds = [d for d in self.deferreds if d.owner is not owner]
-            heapq.heapify(self.deferreds)
+            self.deferreds.remove_owner(owner)
+
+    def cancel_deferred(self, deferred: Deferred) -> bool:
+        """Remove a single deferred, as returned by defer(). Returns False if it was no longer pending."""
+        with self.deferreds_lock:
+            return self.deferreds.cancel(deferred)
 
     def register_periodicals(self, obj: Any) -> None:
         for func, period in util.get_periodicals(obj).items():
@@ -916,24 +1027,48 @@ class Driver(pubsub.Listener):
                                                     context=self.story.config.context if self.story else ''), attacker_msg
 
     def build_location(self, targetLocation: base.Location, zone: Zone, player: player.Player):
-        dynamic_story = typing.cast(DynamicStory, self.story)
-        neighbor_locations = dynamic_story.neighbors_for_location(targetLocation)
+        generated = self._generate_location(targetLocation, zone, player.location.name, self._location_request_args(targetLocation))
+        if not generated:
+            return False
+        self._apply_location(targetLocation, zone, *generated)
+        return True
+
+    def _generate_location(self, targetLocation: base.Location, zone: Zone, exit_location_name: str, world: dict,
+                           on_description: Callable[[str], None] = None) -> Optional[Tuple[Any, Any]]:
+        """ Does the llm requests for a new location. Doesn't change the world, so it may run on an llm worker,
+            with world copied by _location_request_args on the driver thread.
+            Returns the location response and spawner, or None if no location was generated."""
         result, spawner = self.llm_util.build_location(location=targetLocation, 
-                                                        exit_location_name=player.location.name, 
+                                                        exit_location_name=exit_location_name, 
                                                         zone_info=zone.get_info(),
-                                                        world_creatures=dynamic_story.catalogue._creatures,
-                                                        world_items=dynamic_story.catalogue._items,
-                                                        neighbors=neighbor_locations)
+                                                        world_creatures=world['world_creatures'],
+                                                        world_items=world['world_items'],
+                                                        neighbors=world['neighbors'],
+                                                        on_description=on_description)
+        if not result.new_locations:
+            return None
+        for item in result.items:
+            if isinstance(item, Note):
+                if random.random() < 0.5:
+                    new_quest = self.llm_util.generate_note_quest(zone_info=zone.get_info())
+                    new_quest.giver = item
+                    item.text = new_quest.reason
+                else:
+                    text = self.llm_util.generate_note_lore(zone_info=zone.get_info())
+                    item.text = text
+        return result, spawner
+
+    def _apply_location(self, targetLocation: base.Location, zone: Zone, result: Any, spawner: Any) -> None:
+        """ Adds a generated location to the story. Must run on the driver thread."""
+        dynamic_story = typing.cast(DynamicStory, self.story)
+        targetLocation.built = True
         new_locations = result.new_locations
         exits = result.exits
         npcs = result.npcs
-        items = result.items
-        if not new_locations:
-            return False
         for location in new_locations:
             # try to add location, and if it fails, remove exit to it
-            result = dynamic_story.add_location(location, zone=zone.name)
-            if not result:
+            added = dynamic_story.add_location(location, zone=zone.name)
+            if not added:
                 for exit in exits:
                     if exit.name == location.name:
                         exits.remove(exit)
@@ -948,20 +1083,9 @@ class Driver(pubsub.Listener):
             if isinstance(npc, StationaryNpc) and random.random() < 0.2:
                 new_quest = dynamic_story.generate_quest(npc)
                 new_quest.giver = npc
-                npc.quest = new_quest
-        for item in items:
-            if isinstance(item, Note):
-                if random.random() < 0.5:
-                    new_quest = self.llm_util.generate_note_quest(zone_info=zone.get_info())
-                    new_quest.giver = item
-                    item.text = new_quest.reason
-                else:
-                    text = self.llm_util.generate_note_lore(zone_info=zone.get_info())
-                    item.text = text
-            #dynamic_story.world.add_item(item)
+                npc.set_quest(new_quest)
         if spawner:
             dynamic_story.world.add_mob_spawner(spawner)
-        return True
     
     def do_on_player_death(self, player: player.Player) -> None:
         pass
@@ -5,6 +5,7 @@ Single user driver (for interactive fiction).
 Copyright by Irmen de Jong (irmen@razorvine.net)
 """
 
+import os
 import sys
 import time
 import threading
@@ -36,6 +37,7 @@ class IFDriver(driver.Driver):
         if screen_delay < 0 or screen_delay > 100:
             raise ValueError("invalid delay, valid range is 0-100")
         self.screen_delay = screen_delay
+        self.savegame_serializer = savegames.TaleSerializer()   # remembers the last save, to append deltas to it
         self.io_type = "console"
         if gui:
             self.io_type = "gui"
@@ -92,15 +94,27 @@ class IFDriver(driver.Driver):
     def do_save(self, player: Player) -> None:
         if not self.story.config.savegames_enabled:
             raise errors.ActionRefused("It is not possible to save your progress.")
-        serializer = savegames.TaleSerializer()
+        serializer = self.savegame_serializer
+        savegame_filename = util.storyname_to_filename(self.story.config.name) + ".savegame"
         all_locations = [loc for loc in base.MudObjRegistry.all_locations.values()]
         all_items = [i for i in base.MudObjRegistry.all_items.values() if i.contained_in]
         all_livings = [l for l in base.MudObjRegistry.all_livings.values() if l.location]
         all_exits = list(base.MudObjRegistry.all_exits.values())
-        savedata = serializer.serialize(self.story.config, player, all_items, all_livings, all_locations, all_exits,
-                                        self.deferreds, self.game_clock)
+        # append the changes since the last save, or write a new checkpoint of everything.
+        # a failed save must leave the previous one intact.
+        delta = serializer.can_save_delta and not self.do_check_savefile_free(player)
+        filename = savegame_filename if delta else savegame_filename + ".tmp"
+        with self.user_resources.open_write(filename, append=delta) as stream:
+            previous_size = stream.tell()
+            try:
+                serializer.serialize_to(stream, self.story.config, player, all_items, all_livings, all_locations, all_exits,
+                                        list(self.deferreds), self.game_clock, delta=delta)
+            except Exception:
+                stream.truncate(previous_size)
+                raise
+        if not delta:
+            os.replace(self.user_resources.validate_path(filename), self.user_resources.validate_path(savegame_filename))
         del all_locations, all_exits, all_items, all_livings
-        self.user_resources[util.storyname_to_filename(self.story.config.name) + ".savegame"] = savedata
         player.tell("Game saved.")
         if self.story.config.display_gametime:
             player.tell("Game time: %s" % self.game_clock)
@@ -426,7 +440,7 @@ class IFDriver(driver.Driver):
 
             saved_deferreds = deserializer.recreate_classes(state.pop("deferreds"), objects_finder)
             assert all(isinstance(d, driver.Deferred) for d in saved_deferreds)
-            self.deferreds = []
+            self.deferreds.clear()
             for d in saved_deferreds:
                 self._enqueue_deferred(d)
 
@@ -19,6 +19,7 @@ from . import errors
 from . import lang
 from . import pubsub
 from . import util
+from .llm import llm_config
 from .player import PlayerConnection, Player
 from .tio.mud_browser_io import TaleMudWsgiApp
 
@@ -33,12 +34,15 @@ class MudDriver(driver.Driver):
         self.game_mode = GameMode.MUD
         self.restricted = restricted   # restricted mud mode? (no new players allowed)
         self.mud_accounts = None   # type: accounts.MudAccounts
+        for topic in (driver.topic_pending_actions, driver.topic_pending_tells, driver.topic_async_dialogs):
+            topic.notify = self.wakeup.set     # completed llm jobs, dialogs etc. wake up the main loop
 
     def start_main_loop(self):
         # Driver runs as main thread, wsgi webserver runs in background thread
         accounts_db_file = self.user_resources.validate_path("useraccounts.sqlite")
         self.mud_accounts = accounts.MudAccounts(accounts_db_file)
         base._limbo.init_inventory([LimboReaper()])  # add the grim reaper to Limbo
+        self.llm_util.scheduler.start(llm_config.params.get('LLM_WORKERS', 2))   # llm requests must not block the server loop
         wsgi_server = TaleMudWsgiApp.create_app_server(self, use_ssl=False, ssl_certs=None)    # you can enable SSL here
         wsgi_thread = threading.Thread(name="wsgi", target=wsgi_server.serve_forever)
         wsgi_thread.daemon = True
@@ -88,6 +92,7 @@ class MudDriver(driver.Driver):
         connect_name = "<connecting_%d>" % id(connection)  # unique temporary name
         new_player = Player(connect_name, "n", race="elemental", descr="This player is still connecting to the game.")
         connection.player = new_player
+        new_player.input_listener = self.wakeup.set
         from .tio.mud_browser_io import MudHttpIo
         connection.io = MudHttpIo(connection)
         self.all_players[new_player.name] = connection
@@ -129,6 +134,7 @@ class MudDriver(driver.Driver):
             conn.player.tell_others("{Actor} suddenly shimmers and fades from sight. %s left the game."
                                     % lang.capital(conn.player.subjective))
         del self.all_players[name]
+        self.llm_util.scheduler.cancel(conn.player)
         conn.write_output()
         # wait a bit to allow the player's screen to display the last goodbye message before killing the connection
         self.defer(1, conn.destroy)
@@ -329,7 +335,6 @@ class MudDriver(driver.Driver):
         The game loop, for the multiplayer MUD mode.
         Until the server is shut down, it processes player input, and prints the resulting output.
         """
-        loop_duration = 0.0
         previous_server_tick = 0.0
         while not self._stop_mainloop:
             pubsub.sync("driver-async-dialogs")
@@ -338,15 +343,12 @@ class MudDriver(driver.Driver):
                 if conn not in self.waiting_for_input:
                     conn.write_input_prompt()
 
-            # server tick goes on a timer
-            wait_time = max(0.01, self.story.config.server_tick_time - loop_duration)
-            while wait_time > 0:
-                if any(conn.player.input_is_available.is_set() for conn in self.all_players.values()):
-                    # there was player input, abort the wait loop and deal with it
-                    break
-                sub_wait = min(0.1, wait_time)  # keep things responsive
-                time.sleep(sub_wait)
-                wait_time -= sub_wait
+            # sleep until the next server tick, unless player input or a pending action wakes us up earlier.
+            # (deferreds are due in game time, which only advances on a tick)
+            wait_time = previous_server_tick + self.story.config.server_tick_time - time.time()
+            if wait_time > 0 and not any(conn.player.input_is_available.is_set() for conn in self.all_players.values()):
+                self.wakeup.wait(wait_time)
+            self.wakeup.clear()
 
             loop_start = time.time()
             for conn in list(self.all_players.values()):
@@ -382,14 +384,14 @@ class MudDriver(driver.Driver):
                         conn.player.tell(txt, format=False)
                         conn.player.tell("<rev><it>Please report this problem.</>")
             try:
+                pubsub.sync("driver-pending-actions")
                 pubsub.sync("driver-pending-tells")
                 # server TICK
                 now = time.time()
                 if now - previous_server_tick >= self.story.config.server_tick_time:
                     self._server_tick()
                     previous_server_tick = now
-                loop_duration = time.time() - loop_start
-                self.server_loop_durations.append(loop_duration)
+                self.server_loop_durations.append(time.time() - loop_start)
             except errors.StoryCompleted:
                 print("StoryCompleted raised! But that should never happen in a MUD!")
                 conn.player.tell("<rev>StoryCompleted event in MUD mode - should NOT happen</> - Please report this error")
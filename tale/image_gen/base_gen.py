@@ -4,7 +4,7 @@ import io
 import base64
 from PIL import Image
 
-from tale import thread_utils
+from tale.image_gen.image_queue import ImageQueue
 
 
 class ImageGeneratorBase(ABC):
@@ -13,6 +13,9 @@ class ImageGeneratorBase(ABC):
         self.address = address
         self.port = port
         self.url = f"http://{self.address}:{self.port}{endpoint}"
+        self.config = {} # type: dict
+        self.generate_in_background = False
+        self._queue = None # type: ImageQueue
 
     def convert_image(self, image_data: bytes, output_folder: str, image_name):
         image = Image.open(io.BytesIO(base64.b64decode(image_data)))
@@ -22,10 +25,17 @@ class ImageGeneratorBase(ABC):
     def generate_image(self, prompt: str, save_path: str, image_name: str) -> bool:
         pass
 
-    def generate_background(self, prompt: str, save_path: str, image_name: str, on_complete: callable) -> bool:
-
-        lambda_task = lambda result_event: result_event.set() if self.generate_image(prompt, save_path, image_name) else result_event.clear()
+    @property
+    def queue(self) -> ImageQueue:
+        """ The background job queue, configured by WORKERS, MAX_PENDING and PENDING_JOBS_FILE."""
+        if not self._queue:
+            self._queue = ImageQueue(self,
+                                     workers=self.config.get('WORKERS', 1),
+                                     max_pending=self.config.get('MAX_PENDING', 100),
+                                     pending_file=self.config.get('PENDING_JOBS_FILE', ''))
+        return self._queue
 
-        if on_complete and thread_utils.do_in_background(lambda_task):
-            on_complete()
-            return True
+    def generate_background(self, prompt: str, save_path: str, image_name: str, on_complete: callable) -> bool:
+        """ Queue the image and return right away. on_complete is called on the driver thread when it's saved.
+            Returns False if the queue is full."""
+        return self.queue.submit(prompt, save_path, image_name, on_complete)
@@ -58,10 +58,11 @@ class ComfyUi(ImageGeneratorBase):
         
         json_data = json.loads(response.content)
         prompt_id = json_data['prompt_id']
+        # comfy-ui only announces finished prompts on its websocket, so poll, backing off to once a second
+        delay = 0.1
         while not self.poll_queue(prompt_id):
-            # pause the thread for 1 second
-            time.sleep(1)
-            self.lock = False
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
         return self.get_history(prompt_id)
         
     def get_history(self, prompt_id: str):
@@ -0,0 +1,154 @@
+""" Generates images on a small pool of worker threads, so gameplay never waits for a picture.
+
+Jobs are keyed by image name: asking for an image that is already queued or being
+rendered just adds another completion callback. Callbacks are handed back to the
+driver thread through the "driver-pending-actions" pubsub topic. Queued jobs are
+written to a file, so a restarted game can pick up the images it was still waiting for.
+"""
+
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Callable, Dict, List
+
+from tale import pubsub, util
+from tale.tick_profiler import TickProfiler
+
+
+topic_pending_actions = pubsub.topic("driver-pending-actions")
+
+
+class ImageJob():
+
+    def __init__(self, prompt: str, save_path: str, image_name: str) -> None:
+        self.prompt = prompt
+        self.save_path = save_path
+        self.image_name = image_name
+        self.callbacks = [] # type: List[Callable[[], None]]
+
+    def to_dict(self) -> dict:
+        return {"prompt": self.prompt, "save_path": self.save_path, "image_name": self.image_name}
+
+
+class ImageQueue():
+    """ A bounded queue of image jobs for one generator. Workers are started on the first submit."""
+
+    def __init__(self, generator: 'ImageGeneratorBase', workers: int = 1, max_pending: int = 100, pending_file: str = '') -> None:
+        self.generator = generator
+        self.num_workers = max(1, workers)
+        self.max_pending = max_pending
+        self.pending_file = pending_file
+        self._queue = queue.Queue() # type: queue.Queue[ImageJob]
+        self._jobs = dict() # type: Dict[str, ImageJob]  # queued and running jobs, by image name
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._workers = [] # type: List[threading.Thread]
+        self.profiler = None # type: TickProfiler
+
+    @property
+    def pending(self) -> int:
+        """ Number of jobs queued or being rendered."""
+        return len(self._jobs)
+
+    def submit(self, prompt: str, save_path: str, image_name: str, on_complete: Callable[[], None] = None) -> bool:
+        """ Queue an image. on_complete is called on the driver thread once the image is saved.
+            Returns False if the queue is full."""
+        with self._lock:
+            job = self._jobs.get(image_name)
+            if not job:
+                if len(self._jobs) >= self.max_pending:
+                    print('Image queue is full, skipping ' + image_name, file=sys.stderr)
+                    return False
+                job = ImageJob(prompt, save_path, image_name)
+                self._jobs[image_name] = job
+                self._queue.put(job)
+                self._save_pending()
+            if on_complete:
+                job.callbacks.append(on_complete)
+            self._start_workers()
+        return True
+
+    def resume(self, on_complete: Callable[[str], None] = None) -> int:
+        """ Queue the jobs left in the pending file by a previous run.
+            on_complete is called with the image name when each one is done. Returns the number of jobs resumed."""
+        if not self.pending_file or not os.path.isfile(self.pending_file):
+            return 0
+        try:
+            with open(self.pending_file, "r") as file:
+                jobs = json.load(file)
+        except (OSError, ValueError) as x:
+            print('Could not read pending image jobs: ' + str(x), file=sys.stderr)
+            return 0
+        for job in jobs:
+            callback = (lambda image_name=job["image_name"]: on_complete(image_name)) if on_complete else None
+            self.submit(job["prompt"], job["save_path"], job["image_name"], callback)
+        return len(jobs)
+
+    def join(self, timeout: float = None) -> bool:
+        """ Wait until all jobs are done. Returns False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._jobs, timeout)
+
+    def shutdown(self) -> None:
+        """ Stop the workers once the jobs being rendered are done. Queued jobs stay in the pending file."""
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for _ in workers:
+            self._queue.put(None)
+        for worker in workers:
+            worker.join()
+
+    def _start_workers(self) -> None:
+        while len(self._workers) < self.num_workers:
+            worker = threading.Thread(name="image-worker-%d" % len(self._workers), target=self._work, daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    def _work(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            start = time.perf_counter()
+            try:
+                generated = self.generator.generate_image(job.prompt, job.save_path, job.image_name)
+            except Exception:
+                generated = False
+                print("\n* Exception while generating image " + job.image_name + ":", file=sys.stderr)
+                print("".join(util.format_traceback()), file=sys.stderr)
+            if self.profiler:
+                self.profiler.record('image:generate', time.perf_counter() - start)
+            with self._lock:
+                del self._jobs[job.image_name]
+                self._save_pending()
+                if generated and job.callbacks:
+                    topic_pending_actions.send(lambda job=job: self._deliver(job))
+                self._idle.notify_all()
+
+    def _deliver(self, job: ImageJob) -> None:
+        """ Runs on the driver thread."""
+        for callback in job.callbacks:
+            try:
+                callback()
+            except Exception:
+                print("\n* Exception while completing image " + job.image_name + ":", file=sys.stderr)
+                print("".join(util.format_traceback()), file=sys.stderr)
+
+    def _save_pending(self) -> None:
+        """ Called with the lock held."""
+        if not self.pending_file:
+            return
+        try:
+            if not self._jobs:
+                if os.path.exists(self.pending_file):
+                    os.remove(self.pending_file)
+                return
+            temp_file = self.pending_file + '.tmp'
+            with open(temp_file, "w") as file:
+                json.dump([job.to_dict() for job in self._jobs.values()], file)
+            os.replace(temp_file, self.pending_file)
+        except OSError as x:
+            print('Could not save pending image jobs: ' + str(x), file=sys.stderr)
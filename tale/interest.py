@@ -0,0 +1,107 @@
+"""
+Interest management: where are the players, and what is worth simulating.
+
+Every server tick the driver tells the InterestManager where the players are. Locations
+(and zones) then fall in one of three tiers:
+
+  ACTIVE   a player is there, or a wizard is wiretapping it
+  NEARBY   a player is next door, or in the same or a neighboring zone
+  DORMANT  nobody is around
+
+NPCs only do their (llm) idle actions when active, roaming mobs stop roaming and spawners
+stop spawning when dormant. Things that sleep through dormancy can ask to be woken up when
+a player comes near, to catch up cheaply on what they missed.
+
+'Tale' mud driver, mudlib and interactive fiction framework
+Copyright by Irmen de Jong (irmen@razorvine.net)
+"""
+
+import sys
+from enum import IntEnum
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Optional, Set
+
+from . import util
+from .base import Location, _limbo
+from .zone import Zone
+
+__all__ = ["Tier", "InterestManager"]
+
+
+class Tier(IntEnum):
+    ACTIVE = 0
+    NEARBY = 1
+    DORMANT = 2
+
+
+class InterestManager:
+    def __init__(self) -> None:
+        self.generation = 0     # goes up every time the players moved somewhere else
+        self.player_locations = frozenset()    # type: FrozenSet[Location]
+        self._nearby = set()    # type: Set[Location]
+        self._zones = None      # type: Optional[Set[str]]   # zones with or next to a player, None if the story has no zones
+        self._find_zone = None  # type: Optional[Callable[[str], Optional[Zone]]]
+        self._sleepers = {}     # type: Dict[Any, None]
+
+    def update(self, player_locations: Iterable[Location], find_zone: Callable[[str], Optional[Zone]] = None) -> bool:
+        """
+        Called every server tick with the locations of the players. find_zone gives the zone
+        of a location (by name), if the story has zones. Returns True if anything changed.
+        Then the sleepers that aren't dormant anymore are woken up.
+        """
+        locations = frozenset(player_locations)
+        if locations == self.player_locations and find_zone == self._find_zone:
+            return False
+        self.player_locations = locations
+        self._find_zone = find_zone
+        self._nearby = {exit.target for location in locations for exit in location.exits.values()}
+        self._nearby.difference_update(locations)
+        if find_zone:
+            self._zones = set()
+            for location in locations:
+                zone = find_zone(location.name)
+                if zone:
+                    self._zones.add(zone.name)
+                    self._zones.update(neighbor.name for neighbor in zone.neighbors.values() if neighbor)
+        else:
+            self._zones = None
+        self.generation += 1
+        self._wake_sleepers()
+        return True
+
+    def tier(self, location: Location) -> Tier:
+        if location in self.player_locations or location.is_wiretapped():
+            return Tier.ACTIVE
+        if location in self._nearby:
+            return Tier.NEARBY
+        if self._zones:
+            zone = self.zone_of(location)
+            if zone and zone.name in self._zones:
+                return Tier.NEARBY
+        return Tier.DORMANT
+
+    def zone_of(self, location: Location) -> Optional[Zone]:
+        return self._find_zone(location.name) if self._find_zone else None
+
+    def zone_active(self, zone_name: str) -> bool:
+        """Is there a player in the zone or in a neighboring zone. Always True if the story has no zones."""
+        return self._zones is None or zone_name in self._zones
+
+    def sleep(self, sleeper: Any) -> None:
+        """
+        Call sleeper.wake_up() once its location isn't dormant anymore.
+        The sleeper should be something with a location, such as an npc.
+        """
+        self._sleepers[sleeper] = None
+
+    def _wake_sleepers(self) -> None:
+        for sleeper in list(self._sleepers):
+            location = sleeper.location
+            if location is None or location is _limbo:
+                del self._sleepers[sleeper]   # destroyed meanwhile
+            elif self.tier(location) != Tier.DORMANT:
+                del self._sleepers[sleeper]
+                try:
+                    sleeper.wake_up()
+                except Exception:
+                    print("\n* Exception while waking up {0}:".format(sleeper), file=sys.stderr)
+                    print("".join(util.format_traceback()), file=sys.stderr)
@@ -2,7 +2,6 @@ import random
 
 from tale import mud_context, parse_utils
 from tale.base import Container, Location
-from tale.util import call_periodically
 from tale.zone import Zone
 
 
@@ -15,20 +14,23 @@ class ItemSpawner():
         self.max_items = max_items
         self.spawn_rate = spawn_rate
         self.time = 0
-        mud_context.driver.register_periodicals(self)
+        mud_context.driver.spawn_manager.add(self)
 
-    @call_periodically(15)
     def spawn(self):
+        """ One spawn interval (15 seconds) has passed. The spawn manager does this for all spawners at once."""
         self.time += 15
         if self.time < self.spawn_rate:
             return
         self.time -= self.spawn_rate
+        self.fire()
+
+    def fire(self):
         item = self._random_item()
         item = parse_utils.load_item(item)
         if self.container:
             self.container.insert(item, None)
         else:
-            location = random.choice(list(self.zone.locations.values())) # type: Location
+            location = self.zone.random_location()
             if len(location.items) < self.max_items:
                 location.insert(item, None)
                 location.tell(f'{item} appears.')
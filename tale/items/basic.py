@@ -63,6 +63,7 @@ class Boxlike(Container):
         if self.opened:
             raise ActionRefused("It's already open.")
         self.opened = True
+        self._looks_changed()   # the title changes with it
         actor.tell("You opened the %s." % self.name)
         actor.tell_others("{Actor} opened the %s." % self.name)
 
@@ -70,6 +71,7 @@ class Boxlike(Container):
         if not self.opened:
             raise ActionRefused("It's already closed.")
         self.opened = False
+        self._looks_changed()
         actor.tell("You closed the %s." % self.name)
         actor.tell_others("{Actor} closed the %s." % self.name)
 
@@ -90,12 +92,14 @@ class Boxlike(Container):
     def insert(self, item: Union[Living, Item], actor: Optional[Living]) -> None:
         if self.opened:
             super().insert(item, actor)
+            self._looks_changed()
         else:
             raise ActionRefused("You can't put things in the %s: you should open it first." % self.title)
 
     def remove(self, item: Union[Living, Item], actor: Optional[Living]) -> None:
         if self.opened:
             super().remove(item, actor)
+            self._looks_changed()
         else:
             raise ActionRefused("You can't take things from the %s: you should open it first." % self.title)
 
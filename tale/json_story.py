@@ -31,11 +31,14 @@ class JsonStory(DynamicStory):
                 self.add_location(loc, name)
         if world.get('catalogue', None):
             if world['catalogue']['creatures']:
-                self._catalogue._creatures = world['catalogue']['creatures']
+                self._catalogue.creatures = world['catalogue']['creatures']
             if  world['catalogue']['items']:
-                self._catalogue._items = world['catalogue']['items']
+                self._catalogue.items = world['catalogue']['items']
             if world['catalogue'].get('wearables', None):
                 wearable.add_story_wearables(world['catalogue']['wearables'])
+        # before the npcs, whose memories refer to it
+        if not llm_cache.attach(self.path + 'llm_cache.sqlite'):
+            llm_cache.load(parse_utils.load_json(self.path +'llm_cache.json'))
         if world.get('world', None):
             if  world['world']['items']:
                 # Keep this so that saved items in worlds will transfer to locations. But don't save them.
@@ -47,8 +50,6 @@ class JsonStory(DynamicStory):
             if world['world'].get('item_spawners', None):
                 self._world.item_spawners = parse_utils.load_item_spawners(world['world']['item_spawners'], self._zones, self._catalogue._items)
 
-        llm_cache.load(parse_utils.load_json(self.path +'llm_cache.json'))
-
         # check if there are predefined items for the setting
         extra_items = generic.generic_items.get(self.check_setting(self.config.type), [])
         if extra_items:
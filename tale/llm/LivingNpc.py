@@ -3,34 +3,60 @@ from tale.llm.contexts.FollowContext import FollowContext
 from tale.llm.item_handling_result import ItemHandlingResult
 from tale.llm import llm_config
 import tale.llm.llm_cache as llm_cache
+from tale.llm import llm_governor, llm_scheduler, npc_memory
+from tale.llm.location_snapshot import LocationSnapshot
+from tale.llm.npc_memory import NpcMemory
 from tale import lang, mud_context
-from tale.base import ContainingType, Living, ParseResult
+from tale.base import ContainingType, Item, Living, ParseResult, Weapon, Wearable
 from tale.errors import LlmResponseException
 from tale.llm.responses.ActionResponse import ActionResponse
 from tale.llm.responses.FollowResponse import FollowResponse
 from tale.player import Player
 
 
-from typing import Sequence
+from typing import Optional, Sequence, Union
 
 from tale.quest import Quest
 from tale.resources_utils import pad_text_for_avatar, unpad_text
 from tale.skills.magic import MagicType
 from tale.skills.skills import SkillType
 from tale.skills.weapon_type import WeaponType
+from tale.wearable import WearLocation
+
+
+CANNED_IDLE_VERBS = ("yawn", "hmm", "nod", "smile", "stretch", "sigh", "shrug", "ponder", "blink", "scratch")   # emotes for when the llm budget is spent
+
+
+def _card_field(name: str) -> property:
+    """ An attribute that shows in the character card. Setting it makes the card be rendered again.
+        The value is kept in the instance dict under its own name, so savegames see a plain attribute."""
+    def get(self):
+        return self.__dict__.get(name)
+    def set(self, value) -> None:
+        self.__dict__[name] = value
+        self._character_card = None
+    return property(get, set)
 
 
 class LivingNpc(Living):
     """An NPC with extra fields to define personality and help LLM generate dialogue"""
 
+    age = _card_field('age') # type: int
+    personality = _card_field('personality') # type: str
+    occupation = _card_field('occupation') # type: str
+    example_voice = _card_field('example_voice') # type: str
+    goal = _card_field('goal') # type: str
+    quest = _card_field('quest') # type: Quest
+
     def __init__(self, name: str, gender: str, *,
                  title: str="", descr: str="", short_descr: str="", age: int = -1, personality: str="", occupation: str="", race: str="", parse_occupation: bool = False):
+        self._character_card = None # type: tuple[str, str] # wielded weapon's location, and the card
         super(LivingNpc, self).__init__(name=name, gender=gender, title=title, descr=descr, short_descr=short_descr, race=race)
         self.age = age
         self.personality = personality
         self.occupation = occupation
         self.known_locations = dict()
-        self._observed_events = [] # type: list[int] # These are hashed values of action the character has been notified of
+        self._observed_events = NpcMemory() # type: NpcMemory # These are hashed values of action the character has been notified of
         self._conversations = [] # type: list[str] # These are hashed values of conversations the character has involved in
         self.sentiments = {}
         self.action_history = [] # type: list[str]
@@ -125,14 +151,14 @@ class LivingNpc(Living):
             self.do_say(parsed.unparsed, actor)
         elif parsed.verb == 'attack' and targeted:
             event_hash = llm_cache.cache_event(unpad_text(parsed.unparsed))
-            self._observed_events.append(event_hash)
+            self._observed_events.append(event_hash, npc_memory.IMPORTANCE_INVOLVED)
             # TODO: should llm decide sentiment?
             self.sentiments[actor.title] = 'hostile'
         elif parsed.verb == 'request_to_follow' and targeted:
             result = mud_context.driver.llm_util.request_follow(actor=actor,
                                                                 character_name=self.title, 
                                                                 character_card=self.character_card, 
-                                                                event_history=llm_cache.get_events(self._observed_events), 
+                                                                event_history=self._observed_events.render(), 
                                                                 location=self.location,
                                                                 asker_reason=parsed.args[0]) # type: FollowResponse
             if result:
@@ -142,7 +168,7 @@ class LivingNpc(Living):
                 if result.reason:
                     response = '{actor.title} says: "{response}"'.format(actor=self, response=("Yes. " if result.follow else "No. ") + result.reason)
                     tell_hash = llm_cache.cache_event(response)
-                    self._observed_events.append(tell_hash)
+                    self._observed_events.append(tell_hash, npc_memory.IMPORTANCE_INVOLVED)
                     actor.tell(response, evoke=False)
                 
         else:
@@ -154,32 +180,53 @@ class LivingNpc(Living):
     
     def do_say(self, what_happened: str, actor: Living) -> None:
         tell_hash = llm_cache.cache_event('{actor.title} says {what_happened}'.format(actor=actor, what_happened=unpad_text(what_happened)))
-        self._observed_events.append(tell_hash)
-        short_len = False if isinstance(actor, Player) else True
-        item = None
-        sentiment = None
+        self._observed_events.append(tell_hash, npc_memory.IMPORTANCE_INVOLVED)
+        llm_util = mud_context.driver.llm_util
+        dialogue_args = dict(conversation=self._observed_events.render(),
+                             character_card = self.character_card,
+                             character_name = self.title,
+                             target = actor.title,
+                             target_description = actor.short_description,
+                             sentiment = self.sentiments.get(actor.title, ''),
+                             location_description=self.location.look(exclude_living=self),
+                             short_len=False if isinstance(actor, Player) else True)
+        stream = None
+        if isinstance(actor, Player):
+            # show the response to the player while it's being generated
+            stream = llm_util.stream_to(mud_context.driver.all_players.get(actor.name), f"{self.title} : ")
+            if stream and mud_context.config.custom_resources and self.avatar:
+                stream = None   # it's shown next to the avatar when done
+        dialogue_args['on_response'] = stream
+        llm_util.governor.admit(llm_governor.KIND_DIALOGUE, self.location)
+        llm_util.scheduler.submit(llm_util.governor.wrap(llm_governor.KIND_DIALOGUE, lambda: self._request_dialogue(llm_util, dialogue_args)),
+                                  priority=llm_scheduler.PRIORITY_DIALOGUE,
+                                  owner=self,
+                                  on_complete=lambda result: self._handle_dialogue(result, actor, streamed=bool(stream and stream.written)))
+
+    def _request_dialogue(self, llm_util, dialogue_args: dict) -> tuple:
+        """ Runs on an llm worker. Retries the dialogue up to 3 times."""
         for i in range(3):
-            response, item, sentiment = mud_context.driver.llm_util.generate_dialogue(
-                conversation=llm_cache.get_events(self._observed_events),
-                character_card = self.character_card,
-                character_name = self.title,
-                target = actor.title,
-                target_description = actor.short_description,
-                sentiment = self.sentiments.get(actor.title, ''),
-                location_description=self.location.look(exclude_living=self),
-                short_len=short_len)
+            response, item, sentiment = llm_util.generate_dialogue(**dialogue_args)
             if response:
-                if not self.avatar:
-                    result = mud_context.driver.llm_util.generate_image(self.name, self.description)
-                    if result:
-                        self.avatar = self.name
-                break
-        if not response:
-            raise LlmResponseException("Failed to parse dialogue")
+                return response, item, sentiment
+            stream = dialogue_args.get('on_response')
+            if stream:
+                # what was streamed didn't parse; the retry is told when done, instead
+                stream.end()
+                stream.written = False
+                dialogue_args = dict(dialogue_args, on_response=None)
+        raise LlmResponseException("Failed to parse dialogue")
+
+    def _handle_dialogue(self, result: tuple, actor: Living, streamed: bool = False) -> None:
+        """ streamed: the actor has seen the response already, while it was generated."""
+        response, item, sentiment = result
+        if not self.avatar:
+            # sets the avatar once the image is done
+            mud_context.driver.llm_util.generate_image(self.name, self.description, target=self)
 
         tell_hash = llm_cache.cache_event('{actor.title} says: {response}'.format(actor=self, response=unpad_text(response)))
-        self._observed_events.append(tell_hash)
-        self._defer_result(response, verb='say')
+        self._observed_events.append(tell_hash, npc_memory.IMPORTANCE_INVOLVED)
+        self._defer_result(response, verb='say', streamed_to=actor if streamed else None)
         if item:
             self.handle_item_result(ItemHandlingResult(item=item, from_=self.title, to=actor.title), actor)
 
@@ -187,16 +234,33 @@ class LivingNpc(Living):
             self.sentiments[actor.title] = sentiment
 
     def _do_react(self, parsed: ParseResult, actor: Living) -> None:
+        llm_util = mud_context.driver.llm_util
+        governor = llm_util.governor
+        if not governor.admit(llm_governor.KIND_REACTION, self.location):
+            return  # over budget, let it pass
         if self.autonomous:
-            action = self.autonomous_action()
-        else: 
-            action = mud_context.driver.llm_util.perform_reaction(action=parsed.unparsed,
-                                            character_card=self.character_card,
-                                            character_name=self.title,
-                                            location=self.location,
-                                            acting_character_name=actor.title if actor else '',
-                                            event_history=llm_cache.get_events(self._observed_events),
-                                            sentiment=self.sentiments.get(actor.name, '') if actor else '')
+            action_args = self._free_form_action_args()
+            llm_util.scheduler.submit(governor.wrap(llm_governor.KIND_REACTION, lambda: llm_util.free_form_action(**action_args), drop_stale=True),
+                                      priority=llm_scheduler.PRIORITY_REACTION,
+                                      owner=self,
+                                      on_complete=lambda actions: self._handle_reaction(self._handle_autonomous_actions(actions)))
+        else:
+            reaction_args = dict(action=parsed.unparsed,
+                                 character_card=self.character_card,
+                                 character_name=self.title,
+                                 location=LocationSnapshot(self.location),
+                                 acting_character_name=actor.title if actor else '',
+                                 event_history=self._observed_events.render(),
+                                 sentiment=self.sentiments.get(actor.name, '') if actor else '')
+            if llm_util.batcher.enabled:
+                llm_util.batcher.add(self, llm_governor.KIND_REACTION, reaction_args, self._handle_reaction)
+                return
+            llm_util.scheduler.submit(governor.wrap(llm_governor.KIND_REACTION, lambda: llm_util.perform_reaction(**reaction_args), drop_stale=True),
+                                      priority=llm_scheduler.PRIORITY_REACTION,
+                                      owner=self,
+                                      on_complete=self._handle_reaction)
+
+    def _handle_reaction(self, action: str) -> None:
         if action:
             self.action_history.append(action)
             self._defer_result(action, verb='reaction')
@@ -238,29 +302,60 @@ class LivingNpc(Living):
     def move(self, target: ContainingType, actor: Living=None,
              *, silent: bool=False, is_player: bool=False, verb: str="move", direction_names: Sequence[str]=None) -> None:
         self.known_locations[self.location.name] = f"description: {self.location.description}. " + ". ".join(self.location.look(exclude_living=self, short=True))
+        mud_context.driver.llm_util.scheduler.cancel(self) # pending reactions and dialogue belong to the old location
         super().move(target, actor, silent=silent, is_player=is_player, verb=verb, direction_names=direction_names)
 
     def idle_action(self):
         """ Plan and perform idle actions. 
             Currently handles planning several actions in advance, and then performing them in reverse order.
+            Returns the action performed, or None if it is still being generated.
         """
-        if not self.planned_actions:
-            if self.action_history:
-                history_length = len(self.action_history)
-                previous_actions = self.action_history[-5:] if history_length > 4 else self.action_history[-history_length:]
-            else:
-                previous_actions = []
-            if self.autonomous:
-                actions = [self.autonomous_action()]
-            else: 
-                actions = mud_context.driver.llm_util.perform_idle_action(character_card=self.character_card,
-                                                    character_name=self.title,
-                                                    location=self.location,
-                                                    last_action=previous_actions,
-                                                    event_history=llm_cache.get_events(self._observed_events),
-                                                    sentiments=self.sentiments)
-            if actions:
-                self.planned_actions.append(actions)
+        if self.planned_actions:
+            return self._perform_planned_action()
+        if self.action_history:
+            history_length = len(self.action_history)
+            previous_actions = self.action_history[-5:] if history_length > 4 else self.action_history[-history_length:]
+        else:
+            previous_actions = []
+        llm_util = mud_context.driver.llm_util
+        governor = llm_util.governor
+        if not governor.admit(llm_governor.KIND_IDLE, self.location):
+            return self._canned_idle_action()
+        if self.autonomous:
+            action_args = self._free_form_action_args()
+            future = llm_util.scheduler.submit(governor.wrap(llm_governor.KIND_IDLE, lambda: llm_util.free_form_action(**action_args)),
+                                               priority=llm_scheduler.PRIORITY_IDLE,
+                                               owner=self,
+                                               on_complete=lambda actions: self._plan_idle_actions([self._handle_autonomous_actions(actions)]))
+        else:
+            idle_args = dict(character_card=self.character_card,
+                             character_name=self.title,
+                             location=LocationSnapshot(self.location),
+                             last_action=previous_actions,
+                             event_history=self._observed_events.render(),
+                             sentiments=self.sentiments)
+            if llm_util.batcher.enabled:
+                llm_util.batcher.add(self, llm_governor.KIND_IDLE, idle_args, self._plan_idle_actions)
+                return None
+            future = llm_util.scheduler.submit(governor.wrap(llm_governor.KIND_IDLE, lambda: llm_util.perform_idle_action(**idle_args)),
+                                               priority=llm_scheduler.PRIORITY_IDLE,
+                                               owner=self,
+                                               on_complete=self._plan_idle_actions)
+        return future.result() if future.done() else None
+
+    def _canned_idle_action(self) -> None:
+        """ A plain emote instead of a generated idle action, for when the llm budget is spent."""
+        parsed = self.parse(random.choice(CANNED_IDLE_VERBS))
+        who, _, room_message, target_message = self.soul.process_verb_parsed(self, parsed)
+        self.location.tell(room_message, self, who, target_message, evoke=False)
+        return None
+
+    def _plan_idle_actions(self, actions: list):
+        if actions:
+            self.planned_actions.append(actions)
+        return self._perform_planned_action()
+
+    def _perform_planned_action(self):
         if len(self.planned_actions) > 0:
             action = self.planned_actions.pop(0)
             if isinstance(action, list):
@@ -272,10 +367,16 @@ class LivingNpc(Living):
         return None
 
     def autonomous_action(self) -> str:
-        actions = mud_context.driver.llm_util.free_form_action(character_card=self.character_card,
-                                            character_name=self.title,
-                                            location=self.location,
-                                            event_history=llm_cache.get_events(self._observed_events)) # type: list
+        actions = mud_context.driver.llm_util.free_form_action(**self._free_form_action_args()) # type: list
+        return self._handle_autonomous_actions(actions)
+
+    def _free_form_action_args(self) -> dict:
+        return dict(character_card=self.character_card,
+                    character_name=self.title,
+                    location=LocationSnapshot(self.location),
+                    event_history=self._observed_events.render())
+
+    def _handle_autonomous_actions(self, actions: list) -> str:
         if not actions:
             return None
         
@@ -289,13 +390,13 @@ class LivingNpc(Living):
     def _parse_action(self, action: ActionResponse):
         defered_actions = []
         if action.goal:
-            self.goal = action.goal
+            self.set_goal(action.goal)
         if self.output_thoughts and action.thoughts:
             self.tell_others(f'\n{self.title} thinks: *<it><rev> ' + action.thoughts + '</> *', evoke=False)
         if action.text:
             text = action.text
             tell_hash = llm_cache.cache_event('{actor.title} says: "{response}"'.format(actor=self, response=unpad_text(text)))
-            self._observed_events.append(tell_hash)
+            self._observed_events.append(tell_hash, npc_memory.IMPORTANCE_INVOLVED)
             if action.target:
                 target = self.location.search_living(action.target)
                 if target:
@@ -343,35 +444,90 @@ class LivingNpc(Living):
             #defered_actions.append(f"{self.title} searches for something.")
         return defered_actions
 
-    def _defer_result(self, action: str, verb: str="idle-action"):
+    def _defer_result(self, action: str, verb: str="idle-action", streamed_to: Living = None):
         """ Defer an action to be performed at the next tick, 
-            or immediately if the server tick method is set to command"""
+            or immediately if the server tick method is set to command.
+            streamed_to is someone who has seen the action already, as it was generated."""
         if mud_context.config.custom_resources and self.avatar:
             action = pad_text_for_avatar(text=action, npc_name=self.title)
         else:
             action = f"{self.title} : {action}"
         self.deferred_actions.add(action)
-        self.tell_action_deferred(verb)
+        self.tell_action_deferred(verb, streamed_to)
 
-    def tell_action_deferred(self, verb: str):
+    def tell_action_deferred(self, verb: str, streamed_to: Living = None):
         actions = '\n'.join(self.deferred_actions) + '\n\n'
         actions = actions.replace('\n\n\n', '\n\n')
         deferred_action = ParseResult(verb=verb, unparsed=actions, who_info=None)
-        self.tell_others(actions)
+        if streamed_to:
+            streamed_to.tell("\n")
+            room_msg = actions.format(actor=self.title, Actor=lang.capital(self.title))
+            self.location.tell(room_msg, exclude_living=self, specific_targets={streamed_to}, specific_target_msg="", evoke=False, short_len=True)
+        else:
+            self.tell_others(actions)
         self.location._notify_action_all(deferred_action, actor=self)
         self.deferred_actions.clear()
 
+    @property
+    def _observed_events(self) -> NpcMemory:
+        return self._memory
+
+    @_observed_events.setter
+    def _observed_events(self, events: list) -> None:
+        self._memory = events if isinstance(events, NpcMemory) else NpcMemory(events)
+
     def get_observed_events(self, amount: int) -> list:
         """ Returns the last amount of observed events as a list of strings"""
-        return llm_cache.get_events(self._observed_events[-amount:])
+        return self._observed_events.render(amount)
 
     def _clear_quest(self):
-        self.quest = None
+        self.set_quest(None)
+
+    def set_quest(self, quest: Quest) -> None:
+        self.quest = quest
+
+    def set_goal(self, goal: str) -> None:
+        self.goal = goal
+
+    @Living.wielding.setter
+    def wielding(self, weapon: Optional[Weapon]) -> None:
+        Living.wielding.fset(self, weapon)
+        self._character_card = None
+
+    def _looks_changed(self) -> None:
+        super()._looks_changed()
+        self._character_card = None   # title, description or hidden
+
+    def insert(self, item: Union[Living, Item], actor: Optional[Living]) -> None:
+        super().insert(item, actor)
+        self._character_card = None
+
+    def remove(self, item: Union[Living, Item], actor: Optional[Living]) -> None:
+        super().remove(item, actor)
+        self._character_card = None
+
+    def set_wearable(self, wearable: Optional[Wearable], wear_location: Optional[WearLocation] = None) -> None:
+        super().set_wearable(wearable, wear_location)
+        self._character_card = None
+
+    def _reindex(self, item: Item) -> None:
+        super()._reindex(item)
+        self._character_card = None   # an item in the inventory was renamed
 
     @property
     def character_card(self) -> str:
+        """ The character as a json string for the prompts. It is kept until something in it changes, so
+            it stays the same text from one request to the next."""
+        wielding = self.wielding
+        wielding_location = wielding.location.name if wielding and wielding.location else ''
+        card = self._character_card
+        if card is None or card[0] != wielding_location:   # the wielded weapon's location is part of the card
+            card = self._character_card = (wielding_location, self._render_character_card(wielding))
+        return card[1]
+
+    def _render_character_card(self, wielding: Optional[Weapon]) -> str:
         items = []
-        for i in self.inventory:
+        for i in sorted(self.inventory, key=lambda item: item.name):
             items.append(f'"{str(i.name)}"')
         return '{{"name":"{name}", "gender":"{gender}","age":{age},"occupation":"{occupation}","personality":"{personality}","appearance":"{description}","items":[{items}], "race":"{race}", "quest":"{quest}", "goal":"{goal}", "example_voice":"{example_voice}", "wearing":"{wearing}", "wielding":"{wielding}"}}'.format(
                 name=self.title,
@@ -384,17 +540,17 @@ class LivingNpc(Living):
                 quest=self.quest,
                 goal=self.goal,
                 example_voice=self.example_voice,
-                wearing=','.join([f'"{str(i.name)}"' for i in self.get_worn_items()]),
-                wielding=self.wielding.to_dict() if self.wielding else None,
+                wearing=','.join(sorted(f'"{str(i.name)}"' for i in self.get_worn_items())),
+                wielding=wielding.to_dict() if wielding else None,
                 items=','.join(items))
     
     def dump_memory(self) -> dict:
         return dict(
-                    known_locations=self.known_locations,
-                    observed_events=self._observed_events,
-                    sentiments=self.sentiments,
-                    action_history=self.action_history,
-                    planned_actions=self.planned_actions,
+                    known_locations=dict(self.known_locations),
+                    observed_events=list(self._observed_events),
+                    sentiments=dict(self.sentiments),
+                    action_history=list(self.action_history),
+                    planned_actions=list(self.planned_actions),
                     goal=self.goal)
 
     
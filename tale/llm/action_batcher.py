@@ -0,0 +1,110 @@
+""" Collects the idle actions and reactions of npcs in the same location, to ask for them in one request.
+
+When a player does something in a crowded tavern, every npc there reacts, and each reaction used
+to be a request of its own that repeated the story, the location and the history. The batcher
+keeps the requests per location for a short window, and the driver flushes it every tick. A
+location with a single request gets the usual request; more are asked for together, and the
+answers are handed to each npc like its own answer would have been.
+"""
+
+import time
+from typing import Any, Callable, Dict, List
+
+from tale.base import Location
+from tale.llm import llm_governor, llm_scheduler
+
+
+class BatchedAction():
+
+    def __init__(self, npc: Any, kind: str, args: dict, on_complete: Callable[[str], Any]) -> None:
+        self.npc = npc
+        self.kind = kind    # llm_governor.KIND_IDLE or KIND_REACTION
+        self.args = args    # the arguments for LlmUtil.perform_idle_action or perform_reaction
+        self.on_complete = on_complete
+
+
+class ActionBatcher():
+
+    def __init__(self, llm_util: Any, window: float = 0, max_batch: int = 6, clock: Callable[[], float] = time.monotonic) -> None:
+        self.llm_util = llm_util
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0    # requests sent for more than one npc
+        self.batched = 0    # npc actions asked for in those
+        self._clock = clock
+        self._pending = dict()  # type: Dict[Location, List[BatchedAction]]
+        self._opened = dict()   # type: Dict[Location, float]
+
+    @property
+    def enabled(self) -> bool:
+        """ Only when requests run on workers; inline (if mode), the npc waits for its own answer."""
+        return self.window > 0 and self.llm_util.scheduler.is_async
+
+    @property
+    def pending(self) -> int:
+        return sum(len(actions) for actions in self._pending.values())
+
+    def add(self, npc: Any, kind: str, args: dict, on_complete: Callable[[str], Any]) -> None:
+        """ Queue an idle action or reaction of the npc. on_complete gets the action text, on the driver thread.
+            args['location'] is the snapshot of the npc's location, for the prompt."""
+        location = npc.location
+        actions = self._pending.setdefault(location, [])
+        if not actions:
+            self._opened[location] = self._clock()
+        actions[:] = [action for action in actions if not (action.npc is npc and action.kind == kind)]   # only the latest
+        actions.append(BatchedAction(npc, kind, args, on_complete))
+        if len(actions) >= self.max_batch:
+            self._send(location)
+
+    def flush(self, force: bool = False) -> int:
+        """ Send the requests of the locations whose window has passed. Returns the number of requests sent."""
+        now = self._clock()
+        due = [location for location, opened in self._opened.items() if force or now - opened >= self.window]
+        for location in due:
+            self._send(location)
+        return len(due)
+
+    def _send(self, location: Location) -> None:
+        actions = self._pending.pop(location, [])
+        self._opened.pop(location, None)
+        actions = [action for action in actions if action.npc.location is location]    # moved away meanwhile
+        if not actions:
+            return
+        llm_util = self.llm_util
+        if len(actions) == 1:
+            action = actions[0]
+            if action.kind == llm_governor.KIND_REACTION:
+                task = lambda: llm_util.perform_reaction(**action.args)
+            else:
+                task = lambda: llm_util.perform_idle_action(**action.args)
+            llm_util.scheduler.submit(llm_util.governor.wrap(action.kind, task, drop_stale=action.kind == llm_governor.KIND_REACTION),
+                                      priority=self._priority(actions),
+                                      owner=action.npc,
+                                      on_complete=action.on_complete)
+            return
+        self.batches += 1
+        self.batched += len(actions)
+        requests = [action.args for action in actions]
+        reacting = any(action.kind == llm_governor.KIND_REACTION for action in actions)
+        kind = llm_governor.KIND_REACTION if reacting else llm_governor.KIND_IDLE
+        snapshot = requests[-1]['location']   # the latest
+        llm_util.scheduler.submit(llm_util.governor.wrap(kind, lambda: llm_util.perform_group_actions(snapshot, requests), drop_stale=reacting),
+                                  priority=self._priority(actions),
+                                  on_complete=lambda results: self._deliver(location, actions, results))
+
+    def _deliver(self, location: Location, actions: List[BatchedAction], results: Dict[str, str]) -> None:
+        """ Runs on the driver thread. Hands each npc its own action."""
+        if not results:
+            return
+        for action in actions:
+            if action.npc.location is not location:
+                continue
+            text = results.get(action.args['character_name'].lower()) or results.get(action.npc.name.lower())
+            if text:
+                action.on_complete(text + "\n" if action.kind == llm_governor.KIND_REACTION else text)
+
+    @staticmethod
+    def _priority(actions: List[BatchedAction]) -> int:
+        if any(action.kind == llm_governor.KIND_REACTION for action in actions):
+            return llm_scheduler.PRIORITY_REACTION
+        return llm_scheduler.PRIORITY_IDLE
@@ -4,6 +4,7 @@ from copy import deepcopy
 from json import JSONDecodeError
 import json
 import random
+from typing import Callable, Union
 
 from tale import _MudContext, parse_utils
 from tale.base import Location
@@ -13,6 +14,7 @@ from tale.llm.contexts.ActionContext import ActionContext
 from tale.llm.contexts.CharacterContext import CharacterContext
 from tale.llm.contexts.FollowContext import FollowContext
 from tale.llm.llm_io import IoUtil
+from tale.llm.location_snapshot import LocationSnapshot
 from tale.llm.contexts.DialogueContext import DialogueContext
 from tale.llm.responses.ActionResponse import ActionResponse
 from tale.llm.responses.FollowResponse import FollowResponse
@@ -31,6 +33,7 @@ class CharacterBuilding():
         self.travel_prompt = llm_config.params['TRAVEL_PROMPT']
         self.reaction_prompt = llm_config.params['REACTION_PROMPT']
         self.idle_action_prompt = llm_config.params['IDLE_ACTION_PROMPT']
+        self.group_action_prompt = llm_config.params['GROUP_ACTION_PROMPT']
         self.free_form_action_prompt = llm_config.params['ACTION_PROMPT']
         self.json_grammar = llm_config.params['JSON_GRAMMAR']
         self.json_grammar_key = json_grammar_key
@@ -43,7 +46,9 @@ class CharacterBuilding():
     def generate_dialogue(self,
                           context: DialogueContext,
                           sentiment = '', 
-                          short_len : bool=False):
+                          short_len : bool=False,
+                          on_response: Callable[[str], None] = None):
+        """ on_response gets the text of the response while it streams in, if the backend streams."""
         prompt = self.pre_prompt
 
         #formatted_conversation = llm_config.params['USER_START']
@@ -56,7 +61,8 @@ class CharacterBuilding():
                 sentiment=sentiment)
         request_body = deepcopy(self.default_body)
         request_body['grammar'] = self.json_grammar
-        response = self.io_util.synchronous_request(request_body, prompt=prompt, context=context.to_prompt_string())
+        response = self.io_util.stream_json_request(request_body, prompt=prompt, context=context,
+                                                    fields={'response': on_response} if on_response else None)
         try:
             json_result = json.loads(parse_utils.sanitize_json(response))
             text = json_result["response"]
@@ -82,7 +88,7 @@ class CharacterBuilding():
         request_body = deepcopy(self.default_body)
         if self.json_grammar_key:
             request_body[self.json_grammar_key] = self.json_grammar
-        result = self.io_util.synchronous_request(request_body, prompt=prompt, context=character_context.to_prompt_string())
+        result = self.io_util.synchronous_request(request_body, prompt=prompt, context=character_context)
         try:
             json_result = json.loads(parse_utils.sanitize_json(result))
         except JSONDecodeError as exc:
@@ -94,15 +100,16 @@ class CharacterBuilding():
             print(f'Exception while parsing character {json_result}')
             return None
     
-    def perform_idle_action(self, character_name: str, location: Location, story_context: str, character_card: str = '', sentiments: dict = {}, last_action: str = '', event_history: str = '') -> list:
+    def perform_idle_action(self, character_name: str, location: Union[Location, LocationSnapshot], story_context: str, character_card: str = '', sentiments: dict = {}, last_action: str = '', event_history: str = '') -> list:
+        location = LocationSnapshot.of(location)
         characters = {}
-        for living in location.livings:
-            if living.visible and living.name != character_name.lower():
+        for living in location.characters:
+            if living.name != character_name.lower():
                 if living.alive:
                     characters[living.name] = living.short_description
                 else:
                     characters[living.name] = f"{living.short_description} (dead)"
-        items = [item.name for item in location.items if item.visible]
+        items = location.items
         prompt = self.idle_action_prompt.format(
             last_action=last_action if last_action else f"{character_name} arrives in {location.name}",
             location=": ".join([location.title, location.short_description]),
@@ -135,7 +142,7 @@ class CharacterBuilding():
         text = self.io_util.synchronous_request(request_body, prompt=prompt)
         return text
     
-    def perform_reaction(self, action: str, character_name: str, acting_character_name: str, location: Location, story_context: str, character_card: str = '', sentiment: str = '', event_history: str = ''):
+    def perform_reaction(self, action: str, character_name: str, acting_character_name: str, location: Union[Location, LocationSnapshot], story_context: str, character_card: str = '', sentiment: str = '', event_history: str = ''):
         prompt = self.pre_prompt
         prompt += self.reaction_prompt.format(
             action=action,
@@ -150,6 +157,47 @@ class CharacterBuilding():
         text = self.io_util.synchronous_request(request_body, prompt=prompt)
         return parse_utils.trim_response(text) + "\n"
     
+    def perform_group_actions(self, location: Union[Location, LocationSnapshot], story_context: str, requests: list) -> dict:
+        """ Idle actions and reactions of several characters in the same location, in one request.
+            Requests are the arguments of perform_idle_action or perform_reaction, one per character.
+            The location, story and history are only in the prompt once; the history is that of the
+            first character, since they've been seeing the same things.
+            Returns the action per character name, in lowercase."""
+        location = LocationSnapshot.of(location)
+        characters = []
+        for request in requests:
+            character = {"name": request['character_name'], "description": request.get('character_card', '')}
+            if request.get('action'):
+                character["reacts to"] = f"{request.get('acting_character_name', '')}: {request['action']}"
+                character["sentiment"] = request.get('sentiment', '')
+            else:
+                character["last action"] = request.get('last_action') or f"{request['character_name']} arrives in {location.name}"
+                character["sentiments"] = request.get('sentiments', {})
+            characters.append(character)
+        prompt = self.pre_prompt
+        prompt += self.group_action_prompt.format(
+            story_context=story_context,
+            history=requests[0].get('event_history', '').replace('<break>', '\n'),
+            location=": ".join([location.title, location.short_description]),
+            location_name=location.name,
+            items=location.items,
+            characters=json.dumps(characters))
+        request_body = deepcopy(self.default_body)
+        text = self.io_util.synchronous_request(request_body, prompt=prompt)
+        try:
+            response = json.loads(parse_utils.sanitize_json(text))
+        except Exception as exc:
+            print('Failed to parse group actions ' + str(exc))
+            print(text)
+            return {}
+        if isinstance(response, dict):
+            response = [response]
+        actions = {}
+        for action in response:
+            if isinstance(action, dict) and action.get('name') and action.get('action'):
+                actions[str(action['name']).lower()] = parse_utils.trim_response(str(action['action']))
+        return actions
+
     def free_form_action(self, action_context: ActionContext) -> list:
         prompt = self.pre_prompt
         prompt += self.free_form_action_prompt.format(
@@ -162,7 +210,7 @@ class CharacterBuilding():
             request_body[self.json_grammar_key] = self.json_grammar
         text = ''
         try :
-            text = self.io_util.synchronous_request(request_body, prompt=prompt, context=action_context.to_prompt_string())
+            text = self.io_util.synchronous_request(request_body, prompt=prompt, context=action_context)
             if not text:
                 return None
             response = json.loads(parse_utils.sanitize_json(text))
@@ -180,7 +228,7 @@ class CharacterBuilding():
     def request_follow(self, follow_context: FollowContext) -> FollowResponse:
         prompt = self.pre_prompt
         prompt += self.request_follow_prompt.format(
-            context=follow_context.to_prompt_string(),
+            context='{context}',
             character_name=follow_context.character_name, 
                                                     target=follow_context.asker_name, 
                                                     follow_template=self.follow_template,
@@ -188,7 +236,7 @@ class CharacterBuilding():
         request_body = deepcopy(self.default_body)
         if self.json_grammar_key:
             request_body[self.json_grammar_key] = self.json_grammar
-        text = self.io_util.synchronous_request(request_body, prompt=prompt)
+        text = self.io_util.synchronous_request(request_body, prompt=prompt, context=follow_context)
         if not text:
             return None
         return FollowResponse(json.loads(parse_utils.sanitize_json(text)))
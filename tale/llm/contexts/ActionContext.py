@@ -1,31 +1,34 @@
 import random
+from typing import Union
 from tale.base import Location
 from tale.llm.contexts.BaseContext import BaseContext
+from tale.llm.location_snapshot import LocationSnapshot
+from tale.llm.prompt_budget import PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_REQUIRED, Section
 
 
 class ActionContext(BaseContext):
 
-    def __init__(self, story_context: str, story_type: str, character_name: str, character_card: str, event_history: str, location: Location, actions: list):
+    def __init__(self, story_context: str, story_type: str, character_name: str, character_card: str, event_history: str, location: Union[Location, LocationSnapshot], actions: list):
         super().__init__(story_context)
         self.story_type = story_type
         self.character_name = character_name
         self.character_card = character_card
         self.event_history = event_history.replace('<break>', '\n')
-        self.location = location
+        self.location = LocationSnapshot.of(location)
         self.actions = actions
 
 
-    def to_prompt_string(self) -> str:
+    def sections(self) -> list:
         actions = ', '.join(self.actions)
         characters = []
-        for living in self.location.livings:
-            if living.visible and not living.hidden and living.name != self.character_name.lower():
+        for living in self.location.characters:
+            if not living.hidden and living.name != self.character_name.lower():
                 character = f"{living.name}: {living.short_description}"
                 if not living.alive:
                     character = character + " (dead)"
                 characters.append(character)
-        exits = self.location.exits.keys()
-        items = [item.name for item in self.location.items if item.visible]
+        exits = self.location.exits
+        items = self.location.items
         examples = []
         if len(items) > 0:
             examples.append(f'{{"goal":"", "thoughts":"I want this thing.", "action":"take", "target":{random.choice(items)}, "text":""}}')
@@ -33,4 +36,13 @@ class ActionContext(BaseContext):
             examples.append(f'{{"goal":"", "thoughts":"I want to go there.", "action":"move", "target":{random.choice(list(exits))}, "text":""}}')
         if len(characters) > 0:
             examples.append(f'{{"goal":"", "thoughts":"", "action":"say", "target":{random.choice(characters)}, "text":""}}')
-        return f"Story context:{self.story_context}; Story type:{self.story_type}; Available actions: {actions}; Location: {self.location.name}, {self.location.description}; Available exits: {exits}; Self({self.character_name}): {self.character_card}; Present items: {items}; Present characters: {characters}; History:{self.event_history}; Example actions: {', '.join(examples)};"
\ No newline at end of file
+        return [Section("Story context:", self.story_context),
+                Section("Story type:", self.story_type, priority=PRIORITY_REQUIRED),
+                Section("Available actions: ", actions, priority=PRIORITY_REQUIRED),
+                Section("Location: ", f"{self.location.name}, {self.location.description}", priority=PRIORITY_HIGH),
+                Section("Available exits: ", exits, priority=PRIORITY_REQUIRED),
+                Section(f"Self({self.character_name}): ", self.character_card, priority=PRIORITY_REQUIRED),
+                Section("Present items: ", items, priority=PRIORITY_HIGH),
+                Section("Present characters: ", characters, priority=PRIORITY_HIGH),
+                Section("History:", self.event_history, priority=PRIORITY_LOW, keep_end=True),
+                Section("Example actions: ", ', '.join(examples), end=';')]
\ No newline at end of file
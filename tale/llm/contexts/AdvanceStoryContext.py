@@ -1,6 +1,7 @@
 
 
 from tale.llm.contexts.BaseContext import BaseContext
+from tale.llm.prompt_budget import Section
 
 
 class AdvanceStoryContext(BaseContext):
@@ -8,5 +9,5 @@ class AdvanceStoryContext(BaseContext):
         def __init__(self, story_context: str):
             super().__init__(story_context)
     
-        def to_prompt_string(self) -> str:
-            return f"{self.story_context}"
\ No newline at end of file
+        def sections(self) -> list:
+            return [Section("", self.story_context, end='')]
\ No newline at end of file
@@ -1,6 +1,8 @@
 from abc import ABC, abstractmethod
-from typing import Union
+from typing import List, Union
 
+from tale.llm import prompt_budget
+from tale.llm.prompt_budget import Section
 from tale.story_context import StoryContext
 
 
@@ -11,7 +13,11 @@ class BaseContext(ABC):
             self.story_context = story_context.to_context_with_past()
         else:
             self.story_context = story_context
+        self.budget = 0 # type: int # max tokens for the prompt string, 0 is unlimited. IoUtil sets it from the backend's context window
 
     @abstractmethod
+    def sections(self) -> List[Section]:
+        pass
+
     def to_prompt_string(self) -> str:
-        pass
\ No newline at end of file
+        return prompt_budget.fit(self.sections(), self.budget)
\ No newline at end of file
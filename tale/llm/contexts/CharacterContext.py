@@ -1,6 +1,7 @@
 
 
 from tale.llm.contexts.WorldGenerationContext import WorldGenerationContext
+from tale.llm.prompt_budget import PRIORITY_REQUIRED, Section
 
 
 class CharacterContext(WorldGenerationContext):
@@ -8,5 +9,6 @@ class CharacterContext(WorldGenerationContext):
         super().__init__(story_type=story_type, story_context=story_context, world_info=world_info, world_mood=world_mood)
         self.key_words = key_words
 
-    def to_prompt_string(self) -> str:
-        return super().to_prompt_string() + f"story_type: {self.story_type}, world_info: {self.world_info}"
\ No newline at end of file
+    def sections(self) -> list:
+        return super().sections() + [Section("story_type: ", self.story_type, end=', ', priority=PRIORITY_REQUIRED),
+                                     Section("world_info: ", self.world_info, end='')]
\ No newline at end of file
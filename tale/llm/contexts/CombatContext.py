@@ -1,18 +1,23 @@
 from typing import List
 
 from tale import base
-class CombatContext():
+from tale.llm.contexts.BaseContext import BaseContext
+from tale.llm.prompt_budget import PRIORITY_HIGH, PRIORITY_LOW, Section
+
+
+class CombatContext(BaseContext):
+    """ The fighters are read when the context is made, on the driver thread."""
 
     def __init__(self, attackers: List['base.Living'], defenders: List['base.Living'], location_description: str) -> None:
-        self.attackers = attackers
-        self.defenders = defenders
+        super().__init__('')
+        self.attackers_info = [self._fighter_info(attacker) for attacker in attackers]
+        self.defenders_info = [self._fighter_info(defender) for defender in defenders]
         self.location_description = location_description
 
-    def to_prompt_string(self) -> str:
-        attackers_info = []
-        for attacker in self.attackers:
-            attackers_info.append(f"{attacker.name}: Health:({str(attacker.stats.hp / attacker.stats.max_hp)}). Weapon: {attacker.wielding.name}.")
-        defenders_info = []
-        for defender in self.defenders:
-            defenders_info.append(f"{defender.name}: Health:({str(defender.stats.hp / defender.stats.max_hp)}). Weapon: {defender.wielding.name}.")
-        return f"Attackers: {attackers_info}; Defenders: {defenders_info}; Location: {self.location_description}."
\ No newline at end of file
+    def sections(self) -> list:
+        return [Section("Attackers: ", self.attackers_info, priority=PRIORITY_HIGH),
+                Section("Defenders: ", self.defenders_info, priority=PRIORITY_HIGH),
+                Section("Location: ", self.location_description, end='.', priority=PRIORITY_LOW)]
+
+    def _fighter_info(self, fighter: 'base.Living') -> str:
+        return f"{fighter.name}: Health:({str(fighter.stats.hp / fighter.stats.max_hp)}). Weapon: {fighter.wielding.name}."
@@ -1,9 +1,13 @@
 
 
 from tale.llm.contexts.BaseContext import BaseContext
+from tale.llm.prompt_budget import PRIORITY_HIGH, PRIORITY_REQUIRED, Section
 
 
 class DialogueContext(BaseContext):
+    """ The conversation isn't one of the budgeted sections. It goes in the dialogue prompt, so it's
+        counted against the context window before the sections are fitted, and it's kept short by
+        the npc's memory budget (NPC_MEMORY_SIZE) instead."""
 
     def __init__(self, 
             story_context: str,
@@ -22,5 +26,8 @@ class DialogueContext(BaseContext):
         self.conversation = conversation.replace('<break>', '\n') # Added last in actual prompt
 
 
-    def to_prompt_string(self) -> str:
-        return f"Story context:{self.story_context}; Location:{self.location_description}; Self:{self.speaker_name}:{self.speaker_card}; Listener:{self.target_name}:{self.target_description};"
\ No newline at end of file
+    def sections(self) -> list:
+        return [Section("Story context:", self.story_context),
+                Section("Location:", self.location_description, priority=PRIORITY_HIGH),
+                Section(f"Self:{self.speaker_name}:", self.speaker_card, priority=PRIORITY_REQUIRED),
+                Section(f"Listener:{self.target_name}:", self.target_description, end=';', priority=PRIORITY_HIGH)]
\ No newline at end of file
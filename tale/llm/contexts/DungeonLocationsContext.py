@@ -1,6 +1,7 @@
 
 from tale.llm.contexts.BaseContext import BaseContext
 from tale.llm.contexts.WorldGenerationContext import WorldGenerationContext
+from tale.llm.prompt_budget import PRIORITY_HIGH, PRIORITY_REQUIRED, Section
 
 
 class DungeonLocationsContext(WorldGenerationContext):
@@ -12,5 +13,7 @@ class DungeonLocationsContext(WorldGenerationContext):
         self.depth = depth
         self.max_depth = max_depth
 
-    def to_prompt_string(self) -> str:
-        return f"{super().to_prompt_string()}; Zone: {self.zone}; Depth: {round(self.depth / self.max_depth, 2)}, Rooms:{', '.join(self.rooms)};"
\ No newline at end of file
+    def sections(self) -> list:
+        return super().sections() + [Section("; Zone: ", self.zone, priority=PRIORITY_HIGH),
+                                     Section("Depth: ", round(self.depth / self.max_depth, 2), end=', ', priority=PRIORITY_REQUIRED),
+                                     Section("Rooms:", ', '.join(self.rooms), end=';', priority=PRIORITY_REQUIRED)]
\ No newline at end of file
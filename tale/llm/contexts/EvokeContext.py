@@ -1,12 +1,24 @@
+from typing import Union
+
 from tale.llm.contexts.BaseContext import BaseContext
+from tale.llm.prompt_budget import PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_REQUIRED, Section
 
 class EvokeContext(BaseContext):
+    """ extra_context may be another context, whose sections are fitted along with these."""
 
-    def __init__(self, story_context: str, history: str, time_of_day: str = 'day', extra_context: str = '') -> None:
+    def __init__(self, story_context: str, history: str, time_of_day: str = 'day', extra_context: Union[str, BaseContext] = '') -> None:
         super().__init__(story_context)
         self.history = history
         self.time_of_day = time_of_day
         self.extra_context = extra_context
 
-    def to_prompt_string(self) -> str:
-        return f"Story context:{self.story_context}; History:{self.history}; " + (f"{self.extra_context};" if self.extra_context else '' + f"Time of day:{self.time_of_day};" if self.time_of_day else '')
\ No newline at end of file
+    def sections(self) -> list:
+        sections = [Section("Story context:", self.story_context),
+                    Section("History:", self.history, priority=PRIORITY_LOW, keep_end=True)]
+        if isinstance(self.extra_context, BaseContext):
+            sections.extend(self.extra_context.sections())
+        elif self.extra_context:
+            sections.append(Section("", self.extra_context, end=';', priority=PRIORITY_HIGH))
+        elif self.time_of_day:
+            sections.append(Section("Time of day:", self.time_of_day, end=';', priority=PRIORITY_REQUIRED))
+        return sections
\ No newline at end of file
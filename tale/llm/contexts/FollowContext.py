@@ -3,6 +3,7 @@
 from tale.base import Location
 from tale.llm.contexts.ActionContext import ActionContext
 from tale.llm.contexts.BaseContext import BaseContext
+from tale.llm.prompt_budget import PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_REQUIRED, Section
 
 
 class FollowContext(ActionContext):
@@ -13,5 +14,10 @@ class FollowContext(ActionContext):
         self.asker_card = asker_card
         self.asker_reason = asker_reason # Added last in actual prompt
 
-    def to_prompt_string(self) -> str:
-        return f"Story context:{self.story_context}; Story type:{self.story_type}; Location:{self.location.name}, {self.location.description}; Self({self.character_name}): {self.character_card}; Asker({self.asker_name}): {self.asker_card} ; History:{self.event_history};"
\ No newline at end of file
+    def sections(self) -> list:
+        return [Section("Story context:", self.story_context),
+                Section("Story type:", self.story_type, priority=PRIORITY_REQUIRED),
+                Section("Location:", f"{self.location.name}, {self.location.description}", priority=PRIORITY_HIGH),
+                Section(f"Self({self.character_name}): ", self.character_card, priority=PRIORITY_REQUIRED),
+                Section(f"Asker({self.asker_name}): ", self.asker_card, end=' ; ', priority=PRIORITY_HIGH),
+                Section("History:", self.event_history, end=';', priority=PRIORITY_LOW, keep_end=True)]
\ No newline at end of file
@@ -2,15 +2,23 @@
 
 from tale import parse_utils
 from tale.llm.contexts.BaseContext import BaseContext
+from tale.llm.prompt_budget import PRIORITY_LOW, PRIORITY_REQUIRED, Section
 
 
 class WorldGenerationContext(BaseContext):
 
-    def __init__(self, story_context: str, story_type: str, world_info: str, world_mood: int) -> None:
+    def __init__(self, story_context: str, story_type: str, world_info: str, world_mood: int, location: str = '') -> None:
         super().__init__(story_context)
         self.story_type = story_type
         self.world_info = world_info
         self.world_mood = world_mood
+        self.location = location # type: str # where it happens, for events at a location
 
-    def to_prompt_string(self) -> str:
-        return f"Story context:{self.story_context}; Story type:{self.story_type}; World info:{self.world_info}; World mood:{parse_utils.mood_string_from_int(self.world_mood)};"
\ No newline at end of file
+    def sections(self) -> list:
+        sections = [Section("Story context:", self.story_context),
+                    Section("Story type:", self.story_type, priority=PRIORITY_REQUIRED),
+                    Section("World info:", self.world_info),
+                    Section("World mood:", parse_utils.mood_string_from_int(self.world_mood), end=';', priority=PRIORITY_REQUIRED)]
+        if self.location:
+            sections.append(Section("Location:", self.location, end=';', priority=PRIORITY_LOW))
+        return sections
\ No newline at end of file
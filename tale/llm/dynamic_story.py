@@ -1,7 +1,7 @@
 import json
 import os
 import random
-import shutil
+from concurrent.futures import Future
 from typing import List
 from tale import parse_utils
 from tale.base import Item, Living, Location
@@ -18,6 +18,7 @@ from tale.story import GameMode, StoryBase
 from tale.story_context import StoryContext
 from tale.zone import Zone
 import tale.llm.llm_cache as llm_cache
+from tale.llm import llm_config, story_saver
 
 class DynamicStory(StoryBase):
 
@@ -25,6 +26,7 @@ class DynamicStory(StoryBase):
 
     def __init__(self) -> None:
         self._zones = dict() # type: dict[str, Zone]
+        self._location_zones = dict() # type: dict[str, Zone] # location name to zone
         self._world = WorldInfo()
         self._catalogue = Catalogue()
         if isinstance(self.config.context, str):
@@ -43,14 +45,24 @@ class DynamicStory(StoryBase):
         if isinstance(self.config.context, StoryContext):
             driver.register_periodicals(self.config.context)
 
+        autosave_interval = llm_config.params.get('AUTOSAVE_INTERVAL', 0)
+        if autosave_interval > 0:
+            driver.defer((autosave_interval, autosave_interval, autosave_interval), self.autosave)
+
     def get_zone(self, name: str) -> Zone:
         """ Find a zone by name."""
         return self._zones[name]
     
+    def has_zone(self, name: str) -> bool:
+        return name in self._zones
+
     def add_zone(self, zone: Zone) -> bool:
         if zone.name in self._zones:
             return False
         self._zones[zone.name] = zone
+        for name, location in zone.locations.items():
+            if location:
+                self._location_zones.setdefault(name, zone)
         return True
     
     def get_location(self, zone: str, name: str) -> Location:
@@ -59,15 +71,18 @@ class DynamicStory(StoryBase):
     
     def find_location(self, name: str) -> Location:
         """ Find a location by name in any zone."""
-        for zone in self._zones.values():
-            location = zone.get_location(name)
-            if location:
-                return location
+        zone = self.find_zone(name)
+        return zone.get_location(name) if zone else None
     
     def find_zone(self, location: str) -> Zone:
         """ Find a zone by location name."""
+        zone = self._location_zones.get(location)
+        if zone and zone.get_location(location):
+            return zone
+        # locations can also be added to a zone directly, so look them up the slow way
         for zone in self._zones.values():
             if zone.get_location(location):
+                self._location_zones[location] = zone
                 return zone
         return None
     
@@ -78,10 +93,18 @@ class DynamicStory(StoryBase):
         self._world._locations[location.name] = location
         coord = location.world_location
         self._world._grid[coord.as_tuple()] = location
-        if zone:
-            return self._zones[zone].add_location(location)
-        for zone in self._zones:
-            return self._zones[zone].add_location(location)
+        if not zone:
+            zone = next(iter(self._zones), '')
+            if not zone:
+                return None
+        added = self._zones[zone].add_location(location)
+        if added:
+            self._location_zones.setdefault(location.name, self._zones[zone])
+        return added
+
+    def locations_within(self, coord: Coord, radius: int) -> List[Location]:
+        """ All locations within radius (manhattan distance) of coord."""
+        return self._world.locations_within(coord, radius)
 
     def races_for_zone(self, zone: str) -> List[str]:
         return self._zones[zone].races
@@ -124,29 +147,23 @@ class DynamicStory(StoryBase):
             neighbors[dir] = self._world._grid.get(coord.as_tuple(), None)
         return neighbors
     
-    def save(self, save_name: str = '') -> None:
-        """ Save the story to disk."""
-        story = self.to_json()
-        
-        save_path = os.path.join(os.getcwd(), '../', save_name) if save_name else './'
-        if not os.path.exists(save_path):
-            os.mkdir(save_path)
-        with open(os.path.join(save_path, 'world.json'), "w") as fp:
-            json.dump(story , fp, indent=4)
-
-        with open(os.path.join(save_path, 'story_config.json'), "w") as fp:
-            json.dump(parse_utils.save_story_config(self.config), fp, indent=4)
-
-        with open(os.path.join(save_path, 'llm_cache.json'), "w") as fp:
-            json.dump(llm_cache.json_dump(), fp, indent=4)
-
+    def save(self, save_name: str = '') -> Future:
+        """ Save the story to disk. The story is captured right away, and serialized and written in the background.
+            Returns a future that is done when the save is on disk."""
+        save_path = os.path.abspath(os.path.join(os.getcwd(), '../', save_name) if save_name else './')
+        world = self.to_json()
+        files = {'world.json': lambda: json.dumps(world, separators=(',', ':')),
+                 'story_config.json': json.dumps(parse_utils.save_story_config(self.config), indent=4)}
+        copies = []
         if save_name:
-            resource_path = os.path.join(save_path, 'resources')
-            if not os.path.exists(resource_path):
-                os.mkdir(resource_path)
-            shutil.copy(os.path.join(os.getcwd(), 'story.py'), os.path.join(save_path, 'story.py'))
-            if os.path.exists(os.path.join(os.getcwd(), 'resources')):
-                shutil.copytree(os.path.join(os.getcwd(), 'resources'), resource_path, dirs_exist_ok=True)
+            copies.append((os.path.join(os.getcwd(), 'story.py'), os.path.join(save_path, 'story.py')))
+            copies.append((os.path.join(os.getcwd(), 'resources'), os.path.join(save_path, 'resources')))
+        return story_saver.submit(save_path, files, copies,
+                                  after=lambda: llm_cache.save(os.path.join(save_path, 'llm_cache.sqlite')))
+
+    def autosave(self) -> None:
+        """ Periodically saves the story in place, if AUTOSAVE_INTERVAL is set."""
+        self.save()
 
     def to_json(self) -> dict:
         story = dict()
@@ -160,7 +177,6 @@ class DynamicStory(StoryBase):
             story["zones"][zone.name] = zone.get_info()
             story["zones"][zone.name]["name"] = zone.name
             story["zones"][zone.name]["locations"] = parse_utils.save_locations(zone.locations.values())
-        print(story)
         return story
 
     
@@ -199,12 +215,30 @@ class WorldInfo():
         self._items = dict() # type: dict[str, Item]
         self._npcs  = dict() # type: dict[str, Living]
         self._locations = dict() # type: dict[str, Location]
-        self._grid = dict() # type: dict[Coord, Location]
+        self._grid = dict() # type: dict[tuple, Location] # coordinate tuple to location
         self._mob_spawners = [] # type: list[MobSpawner]
         self._item_spawners = [] # type: list[ItemSpawner]
 
     def get_npc(self, npc: str) -> Living:
         return self._npcs[npc]
+
+    def locations_within(self, coord: Coord, radius: int) -> List[Location]:
+        """ All locations on the grid within radius (manhattan distance) of coord."""
+        locations = []
+        if (2 * radius + 1) ** 3 > len(self._grid):
+            # sparse world, or a large radius: checking every location is cheaper
+            for (x, y, z), location in self._grid.items():
+                if abs(x - coord.x) + abs(y - coord.y) + abs(z - coord.z) <= radius:
+                    locations.append(location)
+            return locations
+        for dx in range(-radius, radius + 1):
+            for dy in range(-(radius - abs(dx)), radius - abs(dx) + 1):
+                dz_max = radius - abs(dx) - abs(dy)
+                for dz in range(-dz_max, dz_max + 1):
+                    location = self._grid.get((coord.x + dx, coord.y + dy, coord.z + dz))
+                    if location:
+                        locations.append(location)
+        return locations
     
     def add_npc(self, npc: Living) -> bool:
         if npc.name in self._npcs:
@@ -292,19 +326,21 @@ class Catalogue():
     def __init__(self) -> None:
         self._items = [] # type: list[dict]
         self._creatures =[] # type: list[dict]
+        self._items_by_name = dict() # type: dict[str, dict]
+        self._creatures_by_name = dict() # type: dict[str, dict]
 
     def add_item(self, item: dict) -> bool:
-        for world_item in self._items:
-            if item['name'] == world_item['name']:
-                return False
+        if item['name'] in self._items_by_name:
+            return False
         self._items.append(item)
+        self._items_by_name[item['name']] = item
         return True
     
     def add_creature(self, creature: dict) -> bool:
-        for world_creature in self._creatures:
-            if creature['name'] == world_creature['name']:
-                return False
+        if creature['name'] in self._creatures_by_name:
+            return False
         self._creatures.append(creature)
+        self._creatures_by_name[creature['name']] = creature
         return True
     
     def get_creatures(self) -> List[dict]:
@@ -314,14 +350,32 @@ class Catalogue():
         return self._items
     
     def get_item(self, name: str) -> dict:
-        for item in self._items:
-            if item['name'] == name:
-                return item
+        return self._items_by_name.get(name)
             
     def get_creature(self, name: str) -> dict:
-        for creature in self._creatures:
-            if creature['name'] == name:
-                return creature
+        return self._creatures_by_name.get(name)
+
+    @property
+    def items(self) -> List[dict]:
+        return self._items
+
+    @items.setter
+    def items(self, value: List[dict]):
+        self._items = value
+        self._items_by_name = dict()
+        for item in value:
+            self._items_by_name.setdefault(item['name'], item)
+
+    @property
+    def creatures(self) -> List[dict]:
+        return self._creatures
+
+    @creatures.setter
+    def creatures(self, value: List[dict]):
+        self._creatures = value
+        self._creatures_by_name = dict()
+        for creature in value:
+            self._creatures_by_name.setdefault(creature['name'], creature)
     
     def to_json(self) -> dict:
-        return dict(items=self._items, creatures=self._creatures)
+        return dict(items=list(self._items), creatures=list(self._creatures))
@@ -2,19 +2,20 @@
 from abc import ABC, abstractmethod
 import asyncio
 import json
+import threading
 import time
-
-import aiohttp
-import requests
+from typing import Callable
 
 from tale.errors import LlmResponseException
+from tale.llm.llm_transport import HttpTransport
 from tale.player import PlayerConnection
 
 
 class AbstractIoAdapter(ABC):
 
-    def __init__(self, url: str, stream_endpoint: str, user_start_prompt: str = '', user_end_prompt: str = '', system_start_prompt: str = '', prompt_end: str = ''):
+    def __init__(self, url: str, stream_endpoint: str, user_start_prompt: str = '', user_end_prompt: str = '', system_start_prompt: str = '', prompt_end: str = '', transport: HttpTransport = None):
         self.url = url
+        self.transport = transport or HttpTransport()
         self.stream_endpoint = stream_endpoint
         self.system_start_prompt = system_start_prompt
         self.user_start_prompt = user_start_prompt
@@ -22,7 +23,8 @@ class AbstractIoAdapter(ABC):
         self.prompt_end = prompt_end
 
     @abstractmethod
-    def stream_request(self, headers: dict, request_body: dict, io = None, wait: bool = False) -> str:
+    def stream_request(self, headers: dict, request_body: dict, io = None, wait: bool = False, on_text: Callable[[str], None] = None) -> str:
+        """ Streams the response to io, or to on_text if given. Returns the whole text."""
         pass
         
     @abstractmethod
@@ -39,45 +41,49 @@ class AbstractIoAdapter(ABC):
 
 class KoboldCppAdapter(AbstractIoAdapter):
 
-    def __init__(self, url: str, stream_endpoint: str, data_endpoint: str, user_start_prompt: str, user_end_prompt: str, system_start_prompt: str = '', prompt_end: str = ''):
-        super().__init__(url, stream_endpoint, user_start_prompt, user_end_prompt)
+    def __init__(self, url: str, stream_endpoint: str, data_endpoint: str, user_start_prompt: str, user_end_prompt: str, system_start_prompt: str = '', prompt_end: str = '', transport: HttpTransport = None):
+        super().__init__(url, stream_endpoint, user_start_prompt, user_end_prompt, transport=transport)
         self.data_endpoint = data_endpoint
         self.place_context_in_memory = False
+        self._stream_lock = threading.Lock()
 
-    def stream_request(self, headers: dict, request_body: dict, io: PlayerConnection = None, wait: bool = False) -> str:
-        result = asyncio.run(self._do_stream_request(self.url + self.stream_endpoint, headers, request_body))
+    def stream_request(self, headers: dict, request_body: dict, io: PlayerConnection = None, wait: bool = False, on_text: Callable[[str], None] = None) -> str:
+        # the data endpoint has the text of the latest generation only, so one stream at a time
+        with self._stream_lock:
+            result = self.transport.run(self._do_stream_request(self.url + self.stream_endpoint, headers, request_body))
 
-        try:
-            if result:
-                return self._do_process_result(self.url + self.data_endpoint, io, wait)
-        except LlmResponseException as exc:
-            print("Error parsing response from backend - ", exc)
-        return ''
+            try:
+                if result:
+                    return self._do_process_result(self.url + self.data_endpoint, io, wait, on_text)
+            except LlmResponseException as exc:
+                print("Error parsing response from backend - ", exc)
+            return ''
 
     async def _do_stream_request(self, url: str, headers: dict, request_body: dict,) -> bool:
         """ Send request to stream endpoint async to not block the main thread"""
-        async with aiohttp.ClientSession() as session:
-            session.headers.update(headers)
-            async with session.post(url, data=json.dumps(request_body)) as response:
-                if response.status == 200:
-                    return True
-                else:
-                    print("Error occurred:", response.status)
-
-    def _do_process_result(self, url, io: PlayerConnection, wait: bool = False) -> str:
+        session = await self.transport.session()
+        async with session.post(url, headers=headers, data=json.dumps(request_body)) as response:
+            if response.status == 200:
+                return True
+            else:
+                print("Error occurred:", response.status)
+
+    def _do_process_result(self, url, io: PlayerConnection, wait: bool = False, on_text: Callable[[str], None] = None) -> str:
         """ Process the result from the stream endpoint """
         tries = 0
         old_text = ''
         while tries < 4:
             time.sleep(0.25)
-            data = requests.post(url)
+            data = self.transport.post(url)
             
             text = json.loads(data.text)['results'][0]['text']
 
             if len(text) == len(old_text):
                 tries += 1
                 continue
-            if not wait:
+            if on_text:
+                on_text(text[len(old_text):])
+            elif not wait:
                 new_text = text[len(old_text):]
                 io.output_no_newline(new_text, new_paragraph=False)
             old_text = text
@@ -104,39 +110,41 @@ class KoboldCppAdapter(AbstractIoAdapter):
     
 class LlamaCppAdapter(AbstractIoAdapter):
 
-    def stream_request(self, headers: dict, request_body: dict, io: PlayerConnection = None, wait: bool = False) -> str:
-        return asyncio.run(self._do_stream_request(self.url + self.stream_endpoint, headers, request_body, io = io))
+    def stream_request(self, headers: dict, request_body: dict, io: PlayerConnection = None, wait: bool = False, on_text: Callable[[str], None] = None) -> str:
+        return self.transport.run(self._do_stream_request(self.url + self.stream_endpoint, headers, request_body, io = io, on_text = on_text))
 
-    async def _do_stream_request(self, url: str, headers: dict, request_body: dict, io: PlayerConnection) -> str:
+    async def _do_stream_request(self, url: str, headers: dict, request_body: dict, io: PlayerConnection, on_text: Callable[[str], None] = None) -> str:
         """ Send request to stream endpoint async to not block the main thread"""
         request_body['stream'] = True
         text = ''
-        async with aiohttp.ClientSession() as session:
-            session.headers.update(headers)
-            async with session.post(url, data=json.dumps(request_body)) as response:
-                if response.status != 200:
-                    print("Error occurred:", response.status)
-                    return False
-                async for chunk in response.content.iter_any():
-                    decoded = chunk.decode('utf-8')
-                    lines = decoded.split('\n')
-                    for line in lines:
-                        # Ignore empty lines
-                        if not line.strip():
-                            continue
-                        key, value = line.split(':', 1)
-                        key = key.strip()
-                        value = value.strip()
-                        if key == 'data':
-                            data = json.loads(value)
-                            choice = data['choices'][0]['delta']
-                            content = choice.get('content', None)
-                            
-                            if content:
+        session = await self.transport.session()
+        async with session.post(url, headers=headers, data=json.dumps(request_body)) as response:
+            if response.status != 200:
+                print("Error occurred:", response.status)
+                return False
+            async for chunk in response.content.iter_any():
+                decoded = chunk.decode('utf-8')
+                lines = decoded.split('\n')
+                for line in lines:
+                    # Ignore empty lines
+                    if not line.strip():
+                        continue
+                    key, value = line.split(':', 1)
+                    key = key.strip()
+                    value = value.strip()
+                    if key == 'data':
+                        data = json.loads(value)
+                        choice = data['choices'][0]['delta']
+                        content = choice.get('content', None)
+                        
+                        if content:
+                            if on_text:
+                                on_text(content)
+                            elif io:
                                 io.output_no_newline(content, new_paragraph=False)
-                                text += content
-                    while len(lines) == 0:
-                        await asyncio.sleep(0.15)
+                            text += content
+                while len(lines) == 0:
+                    await asyncio.sleep(0.15)
         return text
             
     def parse_result(self, result: str) -> str:
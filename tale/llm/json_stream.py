@@ -0,0 +1,117 @@
+""" Reads a JSON object while it streams in from the backend.
+
+Structured responses used to be parsed only once they were complete, so players saw nothing
+until the last closing brace. JsonFieldStream follows the object a chunk at a time, and hands
+the text of chosen top level string fields to a callback as it arrives, such as the response
+of a dialogue or the description of a location. The complete text is still parsed the usual
+way (sanitize_json and json.loads) when it's done.
+"""
+
+from typing import Callable, Dict, Optional
+
+from tale.player import PlayerConnection
+
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class JsonFieldStream():
+
+    def __init__(self, fields: Dict[str, Callable[[str], None]]) -> None:
+        self.fields = fields
+        self.text = ''
+        self.done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = ''       # the escape sequence being read, starting with the backslash
+        self._expect_key = False
+        self._key = ''
+        self._string = []       # the key or (streamed) value being read
+        self._reading_key = False
+        self._streaming = None  # type: Optional[Callable[[str], None]]
+
+    def feed(self, chunk: str) -> None:
+        """ The next part of the response text."""
+        self.text += chunk
+        if self.done:
+            return
+        for char in chunk:
+            if self._in_string:
+                self._string_char(char)
+            elif char == '"':
+                self._start_string()
+            elif char in '{[':
+                self._depth += 1
+                self._expect_key = self._depth == 1 and char == '{'
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth <= 0:
+                    self.done = True
+                    break
+            elif self._depth == 1 and char == ',':
+                self._expect_key = True
+        self._flush()
+
+    def _start_string(self) -> None:
+        self._in_string = True
+        self._string = []
+        self._reading_key = self._depth == 1 and self._expect_key
+        if self._depth == 1 and not self._expect_key:
+            self._streaming = self.fields.get(self._key)
+
+    def _string_char(self, char: str) -> None:
+        if self._escape:
+            self._escape += char
+            if self._escape[1] == 'u':
+                if len(self._escape) < 6:
+                    return
+                try:
+                    char = chr(int(self._escape[2:], 16))
+                except ValueError:
+                    char = ''
+            else:
+                char = _ESCAPES.get(char, char)
+            self._escape = ''
+            self._append(char)
+        elif char == '\\':
+            self._escape = char
+        elif char == '"':
+            self._in_string = False
+            if self._reading_key:
+                self._key = ''.join(self._string)
+                self._expect_key = False
+            self._flush()
+            self._streaming = None
+        else:
+            self._append(char)
+
+    def _append(self, char: str) -> None:
+        if self._reading_key or self._streaming:
+            self._string.append(char)
+
+    def _flush(self) -> None:
+        """ Hand what was read of a streamed field to its callback."""
+        if self._streaming and self._string:
+            text = ''.join(self._string)
+            self._string = []
+            self._streaming(text)
+
+
+class TextStream():
+    """ Writes streamed text to a player's screen as it arrives, after a prefix. Remembers if it wrote anything."""
+
+    def __init__(self, connection: PlayerConnection, prefix: str = '') -> None:
+        self.connection = connection
+        self.prefix = prefix
+        self.written = False
+
+    def __call__(self, text: str) -> None:
+        if not self.written:
+            text = self.prefix + text.lstrip()
+            self.written = True
+        self.connection.output_no_newline(text, new_paragraph=False)
+
+    def end(self) -> None:
+        """ Finish the line, if anything was written."""
+        if self.written:
+            self.connection.output_no_newline('\n', new_paragraph=False)
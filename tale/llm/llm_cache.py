@@ -1,24 +1,214 @@
-""" This file stores various caches for LLM related things. """
+""" This file stores various caches for LLM related things.
+
+Each cache is a bounded namespace that evicts the least recently used entries when it
+grows past its entry or byte limit. Evicted entries go to SQLite files, and are read back
+when asked for. The store of a loaded save is only read. Entries added since the last save
+are written to a temporary store, and copied into the save when the game is saved, so a
+save only changes when the player saves it.
+"""
 
 import hashlib
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+from urllib.request import pathname2url
+
+from tale.llm import llm_config
+
+_FLUSH_THRESHOLD = 1000
+
+
+class CacheStore():
+    """ SQLite backing for the caches. One table, keyed by namespace and hash."""
+
+    def __init__(self, path: str, read_only: bool = False) -> None:
+        self.path = path
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        if read_only:
+            self._connection = sqlite3.connect('file:%s?mode=ro' % pathname2url(os.path.abspath(path)), uri=True, check_same_thread=False)
+            return
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS cache (namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (namespace, key))")
+        self._connection.commit()
+
+    def get(self, namespace: str, key: int) -> Optional[str]:
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM cache WHERE namespace=? AND key=?", (namespace, str(key))).fetchone()
+        return row[0] if row else None
+
+    def put_many(self, namespace: str, entries: Dict[int, str]) -> None:
+        if not entries:
+            return
+        with self._lock:
+            self._connection.executemany("INSERT OR REPLACE INTO cache (namespace, key, value) VALUES (?, ?, ?)",
+                                         [(namespace, str(key), value) for key, value in entries.items()])
+            self._connection.commit()
+
+    def delete_many(self, namespace: str, keys: Iterable[int]) -> None:
+        with self._lock:
+            self._connection.executemany("DELETE FROM cache WHERE namespace=? AND key=?", [(namespace, str(key)) for key in keys])
+            self._connection.commit()
+
+    def items(self, namespace: str) -> Iterator[Tuple[int, str]]:
+        with self._lock:
+            rows = self._connection.execute("SELECT key, value FROM cache WHERE namespace=?", (namespace,)).fetchall()
+        for key, value in rows:
+            yield int(key), value
+
+    def copy_to(self, path: str) -> 'CacheStore':
+        """ Copy the whole store to a new file, and return a store for it."""
+        target = sqlite3.connect(path)
+        with self._lock:
+            self._connection.backup(target)
+        target.close()
+        return CacheStore(path)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class LlmCache():
+    """ A bounded cache of texts, keyed by hash. A limit of 0 means unbounded.
+        Entries are written to store, and read back from it or from base, which is only read.
+        Without a store, evicted entries are gone, unless spill gives one when the first is evicted."""
+
+    def __init__(self, namespace: str, max_entries: int = 0, max_bytes: int = 0) -> None:
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.store = None # type: CacheStore
+        self.base = None # type: CacheStore
+        self.spill = None # type: Callable[[], CacheStore]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict() # type: OrderedDict[int, str]
+        self._dirty = dict() # type: Dict[int, str]
+        self._bytes = 0
+        self._lock = threading.RLock()
+
+    def get(self, key: int, default: str = None) -> str:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            value = self._dirty.get(key) or self._stored(key)
+            if value is not None:
+                self.hits += 1
+                self._insert(key, value)
+                return value
+            self.misses += 1
+            return default
+
+    def put(self, key: int, value: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._insert(key, value)
+            if self.store:
+                # unsaved entries stay here after eviction, until flushed
+                self._dirty[key] = value
+                if len(self._dirty) >= _FLUSH_THRESHOLD:
+                    self.flush()
+
+    def __contains__(self, key: int) -> bool:
+        with self._lock:
+            return key in self._entries or key in self._dirty or self._stored(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
 
-event_cache = {}
-look_cache = {}
+    def values(self):
+        return self.to_dict().values()
+
+    def to_dict(self) -> Dict[int, str]:
+        """ All entries, including those only on disk."""
+        with self._lock:
+            entries = dict(self.base.items(self.namespace)) if self.base else dict()
+            if self.store:
+                entries.update(self.store.items(self.namespace))
+            entries.update(self._dirty)
+            entries.update(self._entries)
+            return entries
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._dirty.clear()
+            self._bytes = 0
+
+    def flush(self) -> None:
+        """ Write entries added since the last flush to the store."""
+        with self._lock:
+            if self.store:
+                self.store.put_many(self.namespace, self._dirty)
+                self._dirty.clear()
+
+    def use_store(self, store: CacheStore) -> None:
+        """ Write to store from now on. What's only in memory is written to it on the next flush."""
+        with self._lock:
+            if self.store is store:
+                return
+            self.store = store
+            self._dirty.update(self._entries)
+
+    def stats(self) -> dict:
+        return {'entries': len(self._entries), 'bytes': self._bytes, 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+    def _stored(self, key: int) -> Optional[str]:
+        value = self.store.get(self.namespace, key) if self.store else None
+        if value is None and self.base:
+            value = self.base.get(self.namespace, key)
+        return value
+
+    def _insert(self, key: int, value: str) -> None:
+        self._entries[key] = value
+        self._bytes += len(value)
+        while len(self._entries) > 1 and ((self.max_entries and len(self._entries) > self.max_entries) or (self.max_bytes and self._bytes > self.max_bytes)):
+            if self.store is None and self.spill:
+                self.use_store(self.spill())
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+
+    def _remove(self, key: int) -> None:
+        self._bytes -= len(self._entries.pop(key))
+
+
+event_cache = LlmCache('events', llm_config.params.get('LLM_CACHE_MAX_ENTRIES', 0), llm_config.params.get('LLM_CACHE_MAX_BYTES', 0))
+look_cache = LlmCache('looks', llm_config.params.get('LLM_CACHE_MAX_ENTRIES', 0), llm_config.params.get('LLM_CACHE_MAX_BYTES', 0))
+
+_caches = [event_cache, look_cache]
+for cache in _caches:
+    cache.spill = lambda: _temporary_store()
+
+_store_lock = threading.RLock()
+_temporary = None # type: CacheStore # entries added since the last save
+_saved = None # type: CacheStore # the last save, only read
 
 def generate_hash(item: str) -> int:
     """ Generates a hash for an item. """
     return int(hashlib.md5(item.encode('utf-8')).hexdigest(), 16)
 
 def cache_event(event: str, event_hash: int = -1) -> int:
-    """ Adds an event to the cache. 
+    """ Adds an event to the cache.
     Generates a hash if none supplied"""
     if not isinstance(event, str):
         print('cache_event received non-string look: ' + str(event) + ' of type ' + str(type(event)) + '. Converting to string.')
         event = str(event)
     if event_hash == -1:
         event_hash = generate_hash(event)
-    if event_cache.get(event_hash) == None:
-        event_cache[event_hash] = event
+    if event_hash not in event_cache:
+        event_cache.put(event_hash, event)
     return event_hash
 
 def get_events(event_hashes: list[int]) -> str:
@@ -26,15 +216,15 @@ def get_events(event_hashes: list[int]) -> str:
     return "<break>".join([event_cache.get(event_hash, '') for event_hash in event_hashes])
 
 def cache_look(look: str, look_hash: int = -1) -> int:
-    """ Adds an event to the cache. 
+    """ Adds an event to the cache.
     Generates a hash if none supplied"""
     if not isinstance(look, str):
         print('cache_look received non-string look: ' + str(look) + ' of type ' + str(type(look)) + '. Converting to string.')
         look = str(look)
     if look_hash == -1:
         look_hash = generate_hash(look)
-    if look_cache.get(look_hash) == None:
-        look_cache[look_hash] = look
+    if look_hash not in look_cache:
+        look_cache.put(look_hash, look)
     return look_hash
 
 def get_looks(look_hashes: list[int]) -> str:
@@ -42,13 +232,83 @@ def get_looks(look_hashes: list[int]) -> str:
     return ", ".join([look_cache.get(look_hash, '') for look_hash in look_hashes])
 
 def load(cache_file: dict):
-    global event_cache, look_cache, tell_cache
-    """ Loads the caches from disk. """
-    event_cache = cache_file.get("events", {})
-    look_cache = cache_file.get("looks", {})
+    """ Loads the caches from a json dump, as written by older saves. """
+    for cache, entries in ((event_cache, cache_file.get("events", {})), (look_cache, cache_file.get("looks", {}))):
+        cache.clear()
+        for key, value in entries.items():
+            try:
+                cache.put(int(key), value)
+            except ValueError:
+                print('Skipping llm cache entry with invalid key: ' + str(key), file=sys.stderr)
 
-def json_dump() -> dict:
-    """ Saves the caches to disk. """
-    return {"events":event_cache, "looks":look_cache}
+def attach(path: str) -> bool:
+    """ Attach the store of a save, to read entries from when asked for, not up front.
+        It's never written to; new entries go to a temporary store until the game is saved.
+        Returns False if there is no store at path."""
+    if not os.path.isfile(path):
+        return False
+    with _store_lock:
+        detach()
+        _use_saved(path)
+    return True
+
+def detach() -> None:
+    """ Close the stores, keeping only what's in memory."""
+    global _saved, _temporary
+    with _store_lock:
+        for cache in _caches:
+            cache.store = None
+            cache.base = None
+        if _saved:
+            _saved.close()
+        if _temporary:
+            _temporary.close()
+            shutil.rmtree(os.path.dirname(_temporary.path), ignore_errors=True)
+        _saved = _temporary = None
 
+def _use_saved(path: str) -> None:
+    global _saved
+    previous, _saved = _saved, CacheStore(path, read_only=True)
+    for cache in _caches:
+        cache.base = _saved
+    if previous:
+        previous.close()
+
+def save(path: str) -> None:
+    """ Saves the caches to a store on disk. Saving to the attached save only writes what's been
+        added since the last save. Saving elsewhere copies the attached save first.
+        The store at path is attached afterwards."""
+    with _store_lock:
+        temporary = _temporary_store()
+        for cache in _caches:
+            cache.use_store(temporary)
+            cache.flush()
+        if _saved and os.path.abspath(_saved.path) == os.path.abspath(path):
+            target = CacheStore(path)
+        else:
+            if os.path.exists(path):
+                os.remove(path)
+            target = _saved.copy_to(path) if _saved else CacheStore(path)
+        added = {cache.namespace: dict(temporary.items(cache.namespace)) for cache in _caches}
+        for namespace, entries in added.items():
+            target.put_many(namespace, entries)
+        target.close()
+        _use_saved(path)
+        for namespace, entries in added.items():
+            temporary.delete_many(namespace, entries.keys())
+
+def stats() -> dict:
+    """ Hit, miss and eviction counters per namespace. """
+    return {cache.namespace: cache.stats() for cache in _caches}
+
+def json_dump() -> dict:
+    """ All cached entries, as a dict. """
+    return {"events":event_cache.to_dict(), "looks":look_cache.to_dict()}
 
+def _temporary_store() -> CacheStore:
+    """ The store the caches write to until the game is saved: the entries added, and those evicted from memory."""
+    global _temporary
+    with _store_lock:
+        if _temporary is None:
+            _temporary = CacheStore(os.path.join(tempfile.mkdtemp(prefix='tale_llm_cache_'), 'llm_cache.sqlite'))
+        return _temporary
@@ -0,0 +1,57 @@
+""" Coalesces identical in-flight LLM requests, so concurrent callers share one backend call. """
+
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict
+
+
+class RequestCoalescer():
+    """ The first caller for a key does the request. Callers arriving with the same key
+        while it's in flight wait for, and get, the same result. Nothing is kept once the
+        request is done; finished results are the llm cache's business."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._in_flight = dict() # type: Dict[str, Future]
+        self.requests = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def key(url: str, request_body: dict) -> str:
+        """ Key on the fully rendered request, prompt included."""
+        return hashlib.md5((url + json.dumps(request_body, sort_keys=True, default=str)).encode('utf-8')).hexdigest()
+
+    def request(self, key: str, call: Callable[[], Any]) -> Any:
+        leader = False
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future:
+                self.coalesced += 1
+            else:
+                future = Future()
+                self._in_flight[key] = future
+                self.requests += 1
+                leader = True
+        if not leader:
+            return future.result()
+        try:
+            result = call()
+        except Exception as x:
+            future.set_exception(x)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    def stats(self) -> dict:
+        """ requests actually sent, and requests that were served by one already in flight."""
+        return {'requests': self.requests, 'coalesced': self.coalesced}
@@ -0,0 +1,173 @@
+""" Keeps the llm requests of the whole server within a budget.
+
+Every kind of request (idle actions, reactions, evokes, narrative and day cycle events) can get
+a limit on requests and on tokens per minute, and every zone a limit on requests per minute.
+On top of that there's a ceiling on requests running or waiting at the same time. Callers ask
+admit() before doing a request, and degrade when refused: evokes show the plain text, idle
+actions become a canned emote, reactions and events are skipped. Dialogue and world building
+are counted, but never refused, since a player is waiting for them.
+"""
+
+import collections
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from tale.llm import prompt_budget
+
+
+KIND_DIALOGUE = 'dialogue'
+KIND_WORLD = 'world'
+KIND_EVOKE = 'evoke'
+KIND_REACTION = 'reaction'
+KIND_IDLE = 'idle'
+KIND_NARRATIVE = 'narrative'
+KIND_DAY_CYCLE = 'day_cycle'
+
+ESSENTIAL_KINDS = frozenset([KIND_DIALOGUE, KIND_WORLD])
+
+
+class LlmGovernor():
+
+    window = 60.0   # seconds that the rate limits are counted over
+
+    def __init__(self, max_concurrent: int = 0, rate_limits: Dict[str, int] = None, token_limits: Dict[str, int] = None,
+                 zone_rate_limit: int = 0, stale_after: float = 0, clock: Callable[[], float] = time.monotonic) -> None:
+        self.max_concurrent = max_concurrent
+        self.rate_limits = rate_limits or {}
+        self.token_limits = token_limits or {}
+        self.zone_rate_limit = zone_rate_limit
+        self.stale_after = stale_after
+        self.queue_depth = lambda: 0    # type: Callable[[], int]   # requests waiting for a worker
+        self.find_zone = None   # type: Callable[[str], Any]   # zone of a location, by name
+        self.in_flight = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._requests = {}     # type: Dict[str, Deque[float]]
+        self._tokens = {}       # type: Dict[str, Deque[Tuple[float, int]]]
+        self._zone_requests = {}    # type: Dict[str, Deque[float]]
+        self.admitted = collections.Counter()   # type: collections.Counter
+        self.refused = collections.Counter()    # type: collections.Counter
+        self.stale = collections.Counter()      # type: collections.Counter
+        self.tokens_used = collections.Counter()    # type: collections.Counter
+
+    @classmethod
+    def from_config(cls, params: dict) -> 'LlmGovernor':
+        return cls(max_concurrent=params.get('LLM_MAX_CONCURRENT', 0),
+                   rate_limits=params.get('LLM_RATE_LIMITS', {}),
+                   token_limits=params.get('LLM_TOKEN_LIMITS', {}),
+                   zone_rate_limit=params.get('LLM_ZONE_RATE_LIMIT', 0),
+                   stale_after=params.get('LLM_STALE_REACTION', 0))
+
+    def admit(self, kind: str, location: Any = None) -> bool:
+        """ May a request of this kind, for something happening at location, be done now?
+            If so, it's counted against the limits. If not, the caller should do without."""
+        zone = self._zone_name(location)
+        with self._lock:
+            now = self._clock()
+            requests = self._expire(self._requests.setdefault(kind, collections.deque()), now)
+            zone_requests = self._expire(self._zone_requests.setdefault(zone, collections.deque()), now) if zone else None
+            if kind not in ESSENTIAL_KINDS and self._over_budget(kind, requests, zone_requests, now):
+                self.refused[kind] += 1
+                return False
+            requests.append(now)
+            if zone_requests is not None:
+                zone_requests.append(now)
+            self.admitted[kind] += 1
+            return True
+
+    def busy(self, kind: str) -> bool:
+        """ Is the budget running low? Then callers should ask for less, such as shorter evokes."""
+        if self.max_concurrent and (self.in_flight + self.queue_depth()) * 2 >= self.max_concurrent:
+            return True
+        limit = self.rate_limits.get(kind, 0)
+        with self._lock:
+            requests = self._expire(self._requests.get(kind, collections.deque()), self._clock())
+            return bool(limit) and len(requests) * 4 >= limit * 3
+
+    def wrap(self, kind: str, task: Callable[[], Any], drop_stale: bool = False) -> Callable[[], Any]:
+        """ The task, counted as running while it runs, with its tokens counted for kind.
+            With drop_stale, it returns None without running if it waited too long for a worker."""
+        submitted = self._clock()
+        def run() -> Any:
+            if drop_stale and self.stale_after and self._clock() - submitted > self.stale_after:
+                with self._lock:
+                    self.stale[kind] += 1
+                return None
+            with self._lock:
+                self.in_flight += 1
+            self._local.kind = kind
+            try:
+                return task()
+            finally:
+                self._local.kind = None
+                with self._lock:
+                    self.in_flight -= 1
+        return run
+
+    def record(self, prompt: str, response: str) -> None:
+        """ Count the tokens of a request, for the kind of the task running on this thread."""
+        kind = getattr(self._local, 'kind', None)
+        if not kind:
+            return
+        tokens = prompt_budget.count_tokens(prompt) + prompt_budget.count_tokens(response or '')
+        with self._lock:
+            self._tokens.setdefault(kind, collections.deque()).append((self._clock(), tokens))
+            self.tokens_used[kind] += tokens
+
+    def stats(self) -> dict:
+        """ Counters per kind, and what's being used of the limits right now."""
+        with self._lock:
+            now = self._clock()
+            kinds = sorted(set(self.admitted) | set(self.refused) | set(self.stale) | set(self.rate_limits) | set(self.token_limits))
+            return {
+                'in_flight': self.in_flight,
+                'queued': self.queue_depth(),
+                'max_concurrent': self.max_concurrent,
+                'kinds': {kind: {'admitted': self.admitted[kind],
+                                 'refused': self.refused[kind],
+                                 'stale': self.stale[kind],
+                                 'tokens': self.tokens_used[kind],
+                                 'requests_per_minute': len(self._expire(self._requests.get(kind, collections.deque()), now)),
+                                 'request_limit': self.rate_limits.get(kind, 0),
+                                 'tokens_per_minute': self._window_tokens(kind, now),
+                                 'token_limit': self.token_limits.get(kind, 0)}
+                          for kind in kinds},
+                'zones': {zone: len(self._expire(requests, now)) for zone, requests in self._zone_requests.items() if requests},
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            for counter in (self.admitted, self.refused, self.stale, self.tokens_used):
+                counter.clear()
+
+    def _over_budget(self, kind: str, requests: Deque[float], zone_requests: Optional[Deque[float]], now: float) -> bool:
+        if self.max_concurrent and self.in_flight + self.queue_depth() >= self.max_concurrent:
+            return True
+        limit = self.rate_limits.get(kind, 0)
+        if limit and len(requests) >= limit:
+            return True
+        limit = self.token_limits.get(kind, 0)
+        if limit and self._window_tokens(kind, now) >= limit:
+            return True
+        return bool(self.zone_rate_limit) and zone_requests is not None and len(zone_requests) >= self.zone_rate_limit
+
+    def _window_tokens(self, kind: str, now: float) -> int:
+        tokens = self._tokens.get(kind)
+        if not tokens:
+            return 0
+        while tokens and tokens[0][0] <= now - self.window:
+            tokens.popleft()
+        return sum(count for _, count in tokens)
+
+    def _expire(self, requests: Deque[float], now: float) -> Deque[float]:
+        while requests and requests[0] <= now - self.window:
+            requests.popleft()
+        return requests
+
+    def _zone_name(self, location: Any) -> str:
+        if location is None or not self.find_zone:
+            return ''
+        zone = self.find_zone(location.name)
+        return zone.name if zone else ''
@@ -1,55 +1,112 @@
-import requests
 import json
+from typing import Callable, Dict, Union
 from tale.errors import LlmResponseException
+from tale.llm import prompt_budget
+from tale.llm.contexts.BaseContext import BaseContext
 from tale.llm.io_adapters import KoboldCppAdapter, LlamaCppAdapter
+from tale.llm.llm_coalescer import RequestCoalescer
+from tale.llm.llm_governor import LlmGovernor
+from tale.llm.json_stream import JsonFieldStream
+from tale.llm.llm_transport import HttpTransport
+from tale.tick_profiler import TickProfiler
 
 class IoUtil():
     """ Handles connection and data retrieval from backend """
 
     def __init__(self, config: dict = None, backend_config: dict = None):
+        self.coalescer = RequestCoalescer()
+        self.context_window = 0
+        self.profiler = None # type: TickProfiler
+        self.governor = None # type: LlmGovernor
+        self.stream = False
+        self.io_adapter = None
         if not config:
             # for tests
             return 
         self.backend = config['BACKEND']
         self.url = backend_config['URL']
         self.endpoint = backend_config['ENDPOINT']
+        self.transport = HttpTransport.from_config(config)
+        self.context_window = config.get('CONTEXT_WINDOW', 0)
+        prompt_budget.load_tokenizer(config.get('TOKENIZER', ''))
         headers = {}
         if self.backend != 'kobold_cpp':
             headers = json.loads(backend_config['OPENAI_HEADERS'])
             headers['Authorization'] = f"Bearer {backend_config['OPENAI_API_KEY']}"
             self.openai_json_format = json.loads(backend_config['OPENAI_JSON_FORMAT'])
             self.headers = headers
-            self.io_adapter = LlamaCppAdapter(self.url, backend_config['STREAM_ENDPOINT'], config.get('USER_START', ''), config.get('USER_END', ''), config.get('SYSTEM_START', ''), config.get('PROMPT_END', ''))
+            self.io_adapter = LlamaCppAdapter(self.url, backend_config['STREAM_ENDPOINT'], config.get('USER_START', ''), config.get('USER_END', ''), config.get('SYSTEM_START', ''), config.get('PROMPT_END', ''), transport=self.transport)
         else:
             if 'API_PASSWORD' in backend_config and backend_config['API_PASSWORD']:
                 headers['Authorization'] = f"Bearer {backend_config['API_PASSWORD']}"
             self.headers = headers
-            self.io_adapter = KoboldCppAdapter(self.url, backend_config['STREAM_ENDPOINT'], backend_config['DATA_ENDPOINT'], config.get('USER_START', ''), config.get('USER_END', ''), config.get('SYSTEM_START', ''), config.get('PROMPT_END', ''))
+            self.io_adapter = KoboldCppAdapter(self.url, backend_config['STREAM_ENDPOINT'], backend_config['DATA_ENDPOINT'], config.get('USER_START', ''), config.get('USER_END', ''), config.get('SYSTEM_START', ''), config.get('PROMPT_END', ''), transport=self.transport)
 
         self.stream = backend_config['STREAM']
 
 
-    def synchronous_request(self, request_body: dict, prompt: str, context: str = '') -> str:
+    def synchronous_request(self, request_body: dict, prompt: str, context: Union[str, BaseContext] = '') -> str:
         """ Send request to backend and return the result """
+        context = self._fit_context(request_body, prompt, context)
         if request_body.get('grammar_string', None) and 'openai' in self.url:
             # TODO: temp fix for openai
             request_body.pop('grammar_string')
             request_body['response_format'] = self.openai_json_format
         request_body = self.io_adapter.set_prompt(request_body, prompt, context)
-        response = requests.post(self.url + self.endpoint, headers=self.headers, data=json.dumps(request_body))
+        url = self.url + self.endpoint
+        return self._counted(request_body, self._timed(lambda: self.coalescer.request(RequestCoalescer.key(url, request_body), lambda: self._post(url, request_body))))
+
+    def _timed(self, request: Callable[[], str]) -> str:
+        if not self.profiler:
+            return request()
+        with self.profiler.measure('llm:request'):
+            return request()
+
+    def _counted(self, request_body: dict, text: str) -> str:
+        """ Count the tokens of the (rendered) request and its response against the llm budget."""
+        if self.governor:
+            self.governor.record(str(request_body.get('prompt', request_body.get('messages', ''))), text if isinstance(text, str) else '')
+        return text
+
+    def _post(self, url: str, request_body: dict) -> str:
+        response = self.transport.post(url, headers=self.headers, data=json.dumps(request_body))
         if response.status_code == 200:
             return self.io_adapter.parse_result(response.text)
         return ''
     
-    def asynchronous_request(self, request_body: dict, prompt: str, context: str = '') -> str:
+    def asynchronous_request(self, request_body: dict, prompt: str, context: Union[str, BaseContext] = '') -> str:
         if self.backend != 'kobold_cpp':
             return self.synchronous_request(request_body=request_body, prompt=prompt, context=context)
         return self.stream_request(request_body, wait=True, prompt=prompt, context=context)
 
-    def stream_request(self, request_body: dict, prompt: str, context: str = '', io = None, wait: bool = False) -> str:
+    def stream_request(self, request_body: dict, prompt: str, context: Union[str, BaseContext] = '', io = None, wait: bool = False) -> str:
+        context = self._fit_context(request_body, prompt, context)
         if self.io_adapter:
             request_body = self.io_adapter.set_prompt(request_body, prompt, context)
-            return self.io_adapter.stream_request(self.headers, request_body, io, wait)
+            if io:
+                # the stream is written to one player's connection, so it can't be shared
+                return self._counted(request_body, self._timed(lambda: self.io_adapter.stream_request(self.headers, request_body, io, wait)))
+            return self._counted(request_body, self._timed(lambda: self.coalescer.request(RequestCoalescer.key(self.url + self.io_adapter.stream_endpoint, request_body),
+                                          lambda: self.io_adapter.stream_request(self.headers, request_body, io, wait))))
         # fall back if no io adapter
         return self.synchronous_request(request_body=request_body, prompt=prompt, context=context)
 
+    def stream_json_request(self, request_body: dict, prompt: str, context: Union[str, BaseContext] = '', fields: Dict[str, Callable[[str], None]] = None) -> str:
+        """ Like synchronous_request, for a JSON response. If the backend streams, the text of the top level
+            string fields is handed to their callbacks while it comes in. Returns the whole response text."""
+        if not fields or not self.stream or not self.io_adapter:
+            return self.synchronous_request(request_body, prompt=prompt, context=context)
+        context = self._fit_context(request_body, prompt, context)
+        if request_body.get('grammar_string', None) and 'openai' in self.url:
+            request_body.pop('grammar_string')
+            request_body['response_format'] = self.openai_json_format
+        request_body = self.io_adapter.set_prompt(request_body, prompt, context)
+        parser = JsonFieldStream(fields)
+        return self._counted(request_body, self._timed(lambda: self.io_adapter.stream_request(self.headers, request_body, wait=True, on_text=parser.feed)))
+
+    def _fit_context(self, request_body: dict, prompt: str, context: Union[str, BaseContext]) -> str:
+        """ Render a context to fit what's left of the context window, once prompt and response are accounted for."""
+        if isinstance(context, BaseContext):
+            context.budget = prompt_budget.context_budget(request_body, prompt, self.context_window)
+            return context.to_prompt_string()
+        return context
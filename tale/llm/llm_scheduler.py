@@ -0,0 +1,146 @@
+""" Schedules LLM requests on a bounded pool of worker threads, so the driver tick never waits on a model.
+
+Callers submit a task (a callable doing the backend request) and get a Future back.
+The task runs on a worker thread, and the on_complete callback is handed back to the
+driver thread through the "driver-pending-actions" pubsub topic, so it may safely change the world.
+Without workers (the default, and what IF mode uses) tasks run inline, exactly as a direct call would.
+"""
+
+import itertools
+import queue
+import sys
+import threading
+from concurrent.futures import CancelledError, Future
+from typing import Any, Callable, Dict, List, Set
+
+from tale import errors, pubsub, util
+
+
+PRIORITY_DIALOGUE = 0   # a player is waiting for an answer
+PRIORITY_REACTION = 1
+PRIORITY_WORLD = 2      # location and zone building
+PRIORITY_IDLE = 3       # npc idle chatter
+
+topic_pending_actions = pubsub.topic("driver-pending-actions")
+
+
+class LlmJob():
+
+    def __init__(self, priority: int, sequence: int, task: Callable, owner: Any = None, on_complete: Callable = None) -> None:
+        self.priority = priority
+        self.sequence = sequence
+        self.task = task
+        self.owner = owner
+        self.on_complete = on_complete
+        self.future = Future()
+        self.cancelled = False
+
+    def __lt__(self, other: 'LlmJob') -> bool:
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+class LlmScheduler():
+
+    def __init__(self, workers: int = 0) -> None:
+        self._queue = queue.PriorityQueue()   # type: queue.PriorityQueue[LlmJob]
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._jobs_by_owner = dict()  # type: Dict[Any, Set[LlmJob]]
+        self._workers = []  # type: List[threading.Thread]
+        if workers:
+            self.start(workers)
+
+    @property
+    def is_async(self) -> bool:
+        return len(self._workers) > 0
+
+    @property
+    def pending(self) -> int:
+        """ Number of jobs waiting for a worker."""
+        return self._queue.qsize()
+
+    def start(self, workers: int) -> None:
+        """ Start the worker threads. With zero workers, jobs keep running inline."""
+        for i in range(workers - len(self._workers)):
+            worker = threading.Thread(name="llm-worker-%d" % len(self._workers), target=self._work, daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    def shutdown(self) -> None:
+        workers, self._workers = self._workers, []
+        for _ in workers:
+            self._queue.put(LlmJob(-1, next(self._sequence), None))
+        for worker in workers:
+            worker.join()
+
+    def submit(self, task: Callable[[], Any], *, priority: int = PRIORITY_WORLD, owner: Any = None, on_complete: Callable[[Any], Any] = None) -> Future:
+        """ Schedule a task doing an LLM request. on_complete is called with the task's result,
+            on the driver thread. The returned future resolves with the result of on_complete
+            if given, otherwise with the task's result. When running inline, the future is already
+            done when submit returns and exceptions propagate to the caller."""
+        job = LlmJob(priority, next(self._sequence), task, owner, on_complete)
+        if not self._workers:
+            result = task()
+            job.future.set_result(on_complete(result) if on_complete else result)
+            return job.future
+        if owner is not None:
+            with self._lock:
+                self._jobs_by_owner.setdefault(owner, set()).add(job)
+        self._queue.put(job)
+        return job.future
+
+    def cancel(self, owner: Any) -> int:
+        """ Cancel all jobs submitted for the owner, for instance when an npc or player leaves.
+            Jobs already running finish, but their result is not delivered. Returns the number of jobs cancelled."""
+        with self._lock:
+            jobs = self._jobs_by_owner.pop(owner, set())
+        for job in jobs:
+            job.cancelled = True
+            job.future.cancel()
+        return len(jobs)
+
+    def _work(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job.task is None:
+                break
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = job.task()
+            except Exception as x:
+                self._forget(job)
+                job.future.set_exception(x)
+                print("\n* Exception while executing llm request:", file=sys.stderr)
+                print("".join(util.format_traceback()), file=sys.stderr)
+                continue
+            topic_pending_actions.send(lambda job=job, result=result: self._deliver(job, result))
+
+    def _deliver(self, job: LlmJob, result: Any) -> None:
+        """ Runs on the driver thread."""
+        self._forget(job)
+        if job.cancelled:
+            job.future.set_exception(CancelledError())
+            return
+        try:
+            value = job.on_complete(result) if job.on_complete else result
+        except (errors.ActionRefused, errors.ParseError) as x:
+            if hasattr(job.owner, "tell"):
+                job.owner.tell(str(x))
+            job.future.set_exception(x)
+        except Exception as x:
+            job.future.set_exception(x)
+            print("\n* Exception while delivering llm result:", file=sys.stderr)
+            print("".join(util.format_traceback()), file=sys.stderr)
+        else:
+            job.future.set_result(value)
+
+    def _forget(self, job: LlmJob) -> None:
+        if job.owner is None:
+            return
+        with self._lock:
+            jobs = self._jobs_by_owner.get(job.owner)
+            if jobs:
+                jobs.discard(job)
+                if not jobs:
+                    del self._jobs_by_owner[job.owner]
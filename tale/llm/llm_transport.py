@@ -0,0 +1,108 @@
+""" Long-lived, connection pooled http transport shared by IoUtil and the io adapters. """
+
+import asyncio
+import atexit
+import threading
+from typing import Any, Coroutine
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class HttpTransport():
+    """ Keeps one pooled requests.Session for synchronous calls and one aiohttp.ClientSession,
+        running on a dedicated event loop thread, for streamed calls. Both reuse
+        keep-alive connections to the backend instead of doing a new handshake per request."""
+
+    def __init__(self, pool_size: int = 10, timeout: float = 120, keep_alive: float = 30) -> None:
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._lock = threading.Lock()
+        self._loop = None # type: asyncio.AbstractEventLoop
+        self._loop_thread = None # type: threading.Thread
+        self._async_session = None # type: aiohttp.ClientSession
+        self._async_requests = 0
+        self._async_connections_opened = 0
+        self._async_connections_reused = 0
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'HttpTransport':
+        return cls(pool_size=config.get('HTTP_POOL_SIZE', 10),
+                   timeout=config.get('HTTP_TIMEOUT', 120),
+                   keep_alive=config.get('HTTP_KEEP_ALIVE', 30))
+
+    def post(self, url: str, headers: dict = None, data: Any = None, timeout: float = None) -> requests.Response:
+        """ Synchronous post over the pooled session."""
+        return self._session.post(url, headers=headers, data=data, timeout=timeout or self.timeout)
+
+    def run(self, coro: Coroutine) -> Any:
+        """ Run a coroutine on the transport's event loop and wait for the result.
+            Replaces asyncio.run, which would create a new loop (and session) per call."""
+        future = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        return future.result()
+
+    async def session(self) -> aiohttp.ClientSession:
+        """ The shared aiohttp session. Must be awaited from a coroutine started with run()."""
+        if self._async_session is None or self._async_session.closed:
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_request_start.append(self._on_request_start)
+            trace_config.on_connection_create_end.append(self._on_connection_create)
+            trace_config.on_connection_reuseconn.append(self._on_connection_reuse)
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=self.keep_alive)
+            self._async_session = aiohttp.ClientSession(connector=connector,
+                                                        # a stream may take longer than the timeout, as long as text keeps coming
+                                                        timeout=aiohttp.ClientTimeout(sock_connect=self.timeout, sock_read=self.timeout),
+                                                        trace_configs=[trace_config])
+        return self._async_session
+
+    def stats(self) -> dict:
+        """ Counters for requests made and connections opened or reused, for both sessions."""
+        requests_made = 0
+        connections_opened = 0
+        for adapter in set(self._session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool:
+                    requests_made += pool.num_requests
+                    connections_opened += pool.num_connections
+        return {'requests': requests_made + self._async_requests,
+                'connections_opened': connections_opened + self._async_connections_opened,
+                'connections_reused': max(0, requests_made - connections_opened) + self._async_connections_reused}
+
+    def close(self) -> None:
+        self._session.close()
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop:
+            if self._async_session:
+                asyncio.run_coroutine_threadsafe(self._async_session.close(), loop).result()
+                self._async_session = None
+            loop.call_soon_threadsafe(loop.stop)
+            self._loop_thread.join()
+            loop.close()
+            atexit.unregister(self.close)
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(name="llm-transport", target=self._loop.run_forever, daemon=True)
+                self._loop_thread.start()
+                atexit.register(self.close)
+            return self._loop
+
+    async def _on_request_start(self, session, context, params) -> None:
+        self._async_requests += 1
+
+    async def _on_connection_create(self, session, context, params) -> None:
+        self._async_connections_opened += 1
+
+    async def _on_connection_reuse(self, session, context, params) -> None:
+        self._async_connections_reused += 1
@@ -1,14 +1,16 @@
+from concurrent.futures import Future, ThreadPoolExecutor
 from copy import deepcopy
 import json
 import os
 import sys
-from typing import Any, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 import yaml
 from tale.base import Location, MudObject
 from tale.image_gen.base_gen import ImageGeneratorBase
-from tale.llm import llm_config
+from tale.llm import llm_config, llm_governor, llm_scheduler
 from tale.llm.character import CharacterBuilding
 from tale.llm.contexts.ActionContext import ActionContext
+from tale.llm.contexts.BaseContext import BaseContext
 from tale.llm.contexts.CharacterContext import CharacterContext
 from tale.llm.contexts.DungeonLocationsContext import DungeonLocationsContext
 from tale.llm.contexts.EvokeContext import EvokeContext
@@ -16,16 +18,22 @@ from tale.llm.contexts.FollowContext import FollowContext
 from tale.llm.contexts.WorldGenerationContext import WorldGenerationContext
 from tale.llm.dynamic_story import DynamicStory
 from tale.llm.llm_io import IoUtil
+from tale.llm.json_stream import TextStream
+from tale.llm.location_snapshot import LocationSnapshot
+from tale.llm.action_batcher import ActionBatcher
+from tale.llm.llm_governor import LlmGovernor
+from tale.llm.llm_scheduler import LlmScheduler
 from tale.llm.contexts.DialogueContext import DialogueContext
 from tale.llm.quest_building import QuestBuilding
 from tale.llm.responses.ActionResponse import ActionResponse
-from tale.llm.responses.LocationDescriptionResponse import LocationDescriptionResponse
+from tale.llm.responses.LocationDescriptionResponse import LocationDescription, LocationDescriptionResponse
 from tale.llm.responses.LocationResponse import LocationResponse
 from tale.llm.responses.WorldCreaturesResponse import WorldCreaturesResponse
 from tale.llm.responses.WorldItemsResponse import WorldItemsResponse
 from tale.llm.story_building import StoryBuilding
 from tale.llm.world_building import WorldBuilding
 from tale.mob_spawner import MobSpawner
+from tale.tick_profiler import TickProfiler
 from tale.player import PlayerConnection
 from tale.player_utils import TextBuffer
 import tale.parse_utils as parse_utils
@@ -53,9 +61,15 @@ class LlmUtil():
         
         self.__story = None # type: DynamicStory
         self.io_util = io_util or IoUtil(config=llm_config.params, backend_config=backend_config)
+        self.scheduler = LlmScheduler() # runs requests inline until the driver starts workers
+        self.governor = LlmGovernor.from_config(llm_config.params)
+        self.governor.queue_depth = lambda: self.scheduler.pending
+        self.io_util.governor = self.governor
+        self.batcher = ActionBatcher(self, llm_config.params.get('NPC_BATCH_WINDOW', 0))
         self.stream = backend_config['STREAM']
         self.connection = None # type: PlayerConnection
         self._image_gen = None # type: ImageGeneratorBase
+        self.profiler = None # type: TickProfiler
         self.__story_context = ''
         self.__story_type = ''
         self.__world_info = ''
@@ -79,7 +93,7 @@ class LlmUtil():
                                              backend=self.backend,
                                              json_grammar_key=json_grammar_key)
 
-    def evoke(self, message: str, short_len: bool=False, rolling_prompt: str = '', alt_prompt: str = '', extra_context: str = '', skip_history: bool = True):
+    def evoke(self, message: str, short_len: bool=False, rolling_prompt: str = '', alt_prompt: str = '', extra_context: Union[str, BaseContext] = '', skip_history: bool = True):
         """Evoke a response from LLM. Async if stream is True, otherwise synchronous.
         Update the rolling prompt with the latest message.
         Will put generated text in lm_cache.look_hashes, and reuse it if same hash is generated."""
@@ -90,7 +104,7 @@ class LlmUtil():
 
         rolling_prompt = self.update_memory(rolling_prompt, message)
 
-        text_hash_value = llm_cache.generate_hash(message + extra_context)
+        text_hash_value = llm_cache.generate_hash(message + (extra_context.to_prompt_string() if isinstance(extra_context, BaseContext) else extra_context))
 
         cached_look = llm_cache.get_looks([text_hash_value])
         if cached_look:
@@ -111,12 +125,12 @@ class LlmUtil():
         request_body = deepcopy(self.default_body)
 
         if not self.stream:
-            text = self.io_util.synchronous_request(request_body, prompt=prompt, context=story_context.to_prompt_string())
+            text = self.io_util.synchronous_request(request_body, prompt=prompt, context=story_context)
             llm_cache.cache_look(text, text_hash_value)
             return output_template.format(message=message, text=text), rolling_prompt
         if self.connection:
             self.connection.output(output_template.format(message=message, text=''))
-        text = self.io_util.stream_request(request_body=request_body, prompt=prompt, context=story_context.to_prompt_string(), io=self.connection)
+        text = self.io_util.stream_request(request_body=request_body, prompt=prompt, context=story_context, io=self.connection)
         llm_cache.cache_look(text, text_hash_value)
         return '\n', rolling_prompt
     
@@ -127,7 +141,8 @@ class LlmUtil():
                           target_description: str='', 
                           sentiment = '', 
                           location_description = '',
-                          short_len : bool=False):
+                          short_len : bool=False,
+                          on_response: Callable[[str], None] = None):
         dialogue_context = DialogueContext(story_context=self.__story_context,
                                            location_description=location_description,
                                            speaker_card=character_card,
@@ -137,8 +152,15 @@ class LlmUtil():
                                            conversation=conversation)
         return self._character.generate_dialogue(context=dialogue_context,
                                                 sentiment=sentiment,
-                                                short_len=short_len)
+                                                short_len=short_len,
+                                                on_response=on_response)
     
+    def stream_to(self, connection: PlayerConnection, prefix: str = '') -> Optional[TextStream]:
+        """ Something to show streamed text on the player's screen with, or None if the backend doesn't stream."""
+        if not self.stream or not connection:
+            return None
+        return TextStream(connection, prefix)
+
     def update_memory(self, rolling_prompt: str, response_text: str):
         """ Keeps a history of the last couple of events"""
         rolling_prompt += response_text
@@ -156,10 +178,11 @@ class LlmUtil():
             self.generate_image(character.name, f"{character.description}. Wearing: {','.join(character.wearing)}. Holding: {character.wielding}" )
         return character
     
-    def get_neighbor_or_generate_zone(self, current_zone: Zone, current_location: Location, target_location: Location) -> Zone:
-        return self._world_building.get_neighbor_or_generate_zone(current_zone, current_location, target_location, self.__story)
+    def get_neighbor_or_generate_zone(self, current_zone: Zone, current_location: Location, target_location: Location, add_zone: bool = True) -> Zone:
+        return self._world_building.get_neighbor_or_generate_zone(current_zone, current_location, target_location, self.__story, add_zone)
 
-    def build_location(self, location: Location, exit_location_name: str, zone_info: dict, world_items: dict = {}, world_creatures: dict = {}, neighbors: dict = {}) -> Tuple[LocationResponse, MobSpawner]:
+    def build_location(self, location: Location, exit_location_name: str, zone_info: dict, world_items: dict = {}, world_creatures: dict = {}, neighbors: dict = {},
+                       on_description: Callable[[str], None] = None) -> Tuple[LocationResponse, MobSpawner]:
         """ Generate a location based on the current story context"""
         world_generation_context = WorldGenerationContext(story_context=self.__story_context,
                                                             story_type=self.__story_type,
@@ -171,20 +194,21 @@ class LlmUtil():
                                                     context=world_generation_context,
                                                     world_creatures=world_creatures if world_creatures else self.__story.catalogue._creatures,
                                                     world_items=world_items if world_items else self.__story.catalogue._items,
-                                                    neighbors=neighbors)
+                                                    neighbors=neighbors,
+                                                    on_description=on_description)
         
         if not location.avatar and self.__story.config.image_gen:
             self.generate_image(location.name, location.description)
         return location_result, spawner
                     
      
-    def perform_idle_action(self, character_name: str, location: Location, character_card: str = '', sentiments: dict = {}, last_action: str = '', event_history: str = '') -> list:
+    def perform_idle_action(self, character_name: str, location: Union[Location, LocationSnapshot], character_card: str = '', sentiments: dict = {}, last_action: str = '', event_history: str = '') -> list:
         return self._character.perform_idle_action(character_name, location, self.__story_context, character_card, sentiments, last_action, event_history=event_history)
     
     def perform_travel_action(self, character_name: str, location: Location, locations: list, directions: list, character_card: str = ''):
         return self._character.perform_travel_action(character_name, location, locations, directions, character_card)
     
-    def perform_reaction(self, action: str, character_name: str, acting_character_name: str, location: Location, character_card: str = '', sentiment: str = '', event_history: str = ''):
+    def perform_reaction(self, action: str, character_name: str, acting_character_name: str, location: Union[Location, LocationSnapshot], character_card: str = '', sentiment: str = '', event_history: str = ''):
         return self._character.perform_reaction(action=action, 
                                                 character_name=character_name, 
                                                 acting_character_name=acting_character_name, 
@@ -193,6 +217,9 @@ class LlmUtil():
                                                 story_context=self.__story_context,
                                                 event_history=event_history)
     
+    def perform_group_actions(self, location: Union[Location, LocationSnapshot], requests: list) -> dict:
+        return self._character.perform_group_actions(location, self.__story_context, requests)
+
     def generate_story_background(self, world_mood: int, world_info: str, story_type: str):
         return self._story_building.generate_story_background(world_mood, world_info, story_type)
     
@@ -221,12 +248,15 @@ class LlmUtil():
                                                             world_mood=world_mood or self.__story.config.world_mood)
         return self._world_building.generate_world_creatures(world_generation_context)
         
-    def generate_random_spawn(self, location: Location, zone_info: dict) -> bool:
-        return self._world_building.generate_random_spawn(location=location, 
-                                                          zone_info=zone_info,
-                                                          context=self._get_world_context(),
-                                                          world_creatures=self.__story.catalogue._creatures,
-                                                          world_items=self.__story.catalogue._items)
+    def generate_random_spawn(self, location: Location, zone_info: dict) -> Future:
+        """ Spawn npcs and items at the location. The request runs on an llm worker; they're added when it's done."""
+        location_info = self._world_building.spawn_location_info(location)
+        context = self._get_world_context()
+        world_creatures = list(self.__story.catalogue._creatures)
+        world_items = list(self.__story.catalogue._items)
+        return self.scheduler.submit(lambda: self._world_building.request_random_spawn(location_info, context, zone_info),
+                                     priority=llm_scheduler.PRIORITY_WORLD,
+                                     on_complete=lambda result: self._world_building.add_random_spawn(location, result, world_creatures, world_items))
     
     def generate_quest(self, base_quest: dict, character_name: str, location: Location, character_card: str, zone_info: dict, event_history: str = '') -> Quest:
         return self._quest_building.generate_quest(base_quest=base_quest,
@@ -255,6 +285,44 @@ class LlmUtil():
                                                                                                     depth=depth,
                                                                                                     max_depth=max_depth))
 
+    def describe_dungeon_rooms(self, zone_info: dict, rooms: list, depth: int, max_depth: int, slice_size: int = 10, retries: int = 3) -> List[LocationDescription]:
+        """ Describe the rooms of a dungeon level. The rooms are sent in slices of slice_size, at most
+            DUNGEON_FAN_OUT slices at a time. Failed slices, and rooms left out of an answer, are retried.
+            Returns the descriptions in room index order. Doesn't change the world, so it may run on an llm worker."""
+        pending = dict() # type: Dict[int, str] # room index to room
+        for position, room in enumerate(rooms):
+            pending[self._room_index(room, position)] = room
+        described = dict() # type: Dict[int, LocationDescription]
+        fan_out = max(1, llm_config.params.get('DUNGEON_FAN_OUT', 4))
+        for attempt in range(retries):
+            if not pending:
+                break
+            indexes = list(pending.keys())
+            slices = [[pending[index] for index in indexes[i:i + slice_size]] for i in range(0, len(indexes), slice_size)]
+            with ThreadPoolExecutor(max_workers=min(fan_out, len(slices)), thread_name_prefix='dungeon-rooms') as executor:
+                responses = list(executor.map(lambda rooms_slice: self._describe_rooms_slice(zone_info, rooms_slice, depth, max_depth), slices))
+            for response in responses:
+                for description in response.location_descriptions:
+                    if description.index in pending:
+                        described[description.index] = description
+                        del pending[description.index]
+        if pending:
+            print(f'Could not describe {len(pending)} of {len(rooms)} dungeon rooms')
+        return [described[index] for index in sorted(described)]
+
+    def _describe_rooms_slice(self, zone_info: dict, rooms: list, depth: int, max_depth: int) -> LocationDescriptionResponse:
+        try:
+            return self.generate_dungeon_locations(zone_info=zone_info, locations=rooms, depth=depth, max_depth=max_depth)
+        except Exception as exc:
+            print(f'Failed to describe dungeon rooms: {exc}')
+            return LocationDescriptionResponse([])
+
+    def _room_index(self, room: str, position: int) -> int:
+        try:
+            return json.loads(room).get('index', position)
+        except (ValueError, AttributeError):
+            return position
+
     # visible for testing
     def generate_image(self, name: str, description: dict = '', save_path: str = "./resources", copy_file: bool = True, target: MudObject = None, id: str = None) -> bool:
         if not self._image_gen:
@@ -272,14 +340,18 @@ class LlmUtil():
             #on_complete = lambda : self.connection.io.send_data('{"data":"result", "id":"image"}'.format(result=image_name, image=name)) if self.connection else None;copy_single_image('./', image_name + '.jpg') if copy_file else None;target.avatar = name + '.jpg' if target else None
             return self._image_gen.generate_background(prompt=description, save_path=save_path , image_name=image_name, on_complete=on_complete)
         else:
-            result = self._image_gen.generate_image(prompt=description, save_path=save_path , image_name=image_name)
+            if self.profiler:
+                with self.profiler.measure('image:generate'):
+                    result = self._image_gen.generate_image(prompt=description, save_path=save_path , image_name=image_name)
+            else:
+                result = self._image_gen.generate_image(prompt=description, save_path=save_path , image_name=image_name)
             if result and copy_file:
                 copy_single_image('./', image_name + '.jpg')
             if result and target:
                 target.avatar = image_name + '.jpg'
             return result
 
-    def free_form_action(self, location: Location, character_name: str,  character_card: str = '', event_history: str = '') -> list:
+    def free_form_action(self, location: Union[Location, LocationSnapshot], character_name: str,  character_card: str = '', event_history: str = '') -> list:
         action_context = ActionContext(story_context=self.__story_context,
                                        story_type=self.__story_type,
                                        character_name=character_name,
@@ -300,10 +372,12 @@ class LlmUtil():
                                         asker_card=actor.short_description,
                                         asker_reason=asker_reason))
     
-    def describe_day_cycle_transition(self, player: PlayerConnection, from_time: str, to_time: str) -> str:
+    def describe_day_cycle_transition(self, player: PlayerConnection, from_time: str, to_time: str) -> Future:
+        """ Describe the time of day changing where the player is. The request runs on an llm worker.
+            The text is streamed to the player, or told to the location when done. The future resolves with the text."""
         prompt = self.pre_prompt
         location = player.player.location
-        context = self._get_world_context()
+        context = self._get_world_context(location=f'{location.name}, {location.description}')
         prompt += llm_config.params['DAY_CYCLE_EVENT_PROMPT'].format(
             context= '{context}',
             location_name=location.name,
@@ -312,21 +386,27 @@ class LlmUtil():
         request_body = deepcopy(self.default_body)
 
         if not self.stream:
-            text = self.io_util.synchronous_request(request_body, prompt=prompt, context=context.to_prompt_string() + f'Location: {location.name, location.description};')
-            location.tell(text, evoke=False)
-            return text
-        text = self.io_util.stream_request(request_body=request_body, prompt=prompt, context=context.to_prompt_string() + f'Location: {location.name, location.description};', io=player)
-        return text
+            return self.scheduler.submit(self.governor.wrap(llm_governor.KIND_DAY_CYCLE, lambda: self.io_util.synchronous_request(request_body, prompt=prompt, context=context)),
+                                         priority=llm_scheduler.PRIORITY_IDLE,
+                                         on_complete=lambda text: self._tell_location(location, text))
+        return self.scheduler.submit(self.governor.wrap(llm_governor.KIND_DAY_CYCLE, lambda: self.io_util.stream_request(request_body=request_body, prompt=prompt, context=context, io=player)),
+                                     priority=llm_scheduler.PRIORITY_IDLE)
     
-    def generate_narrative_event(self, location: Location) -> str:
+    def generate_narrative_event(self, location: Location) -> Future:
+        """ Something happening at the location. The request runs on an llm worker, and the text
+            is told to the location when done. The future resolves with the text."""
         prompt = self.pre_prompt
-        context = self._get_world_context()
+        context = self._get_world_context(location=f'{location.name}, {location.description}')
         prompt += llm_config.params['NARRATIVE_EVENT_PROMPT'].format(
             context= '{context}',
             location_name=location.name)
         request_body = deepcopy(self.default_body)
 
-        text = self.io_util.synchronous_request(request_body, prompt=prompt, context=context.to_prompt_string() + f'Location: {location.name, location.description};')
+        return self.scheduler.submit(self.governor.wrap(llm_governor.KIND_NARRATIVE, lambda: self.io_util.synchronous_request(request_body, prompt=prompt, context=context)),
+                                     priority=llm_scheduler.PRIORITY_IDLE,
+                                     on_complete=lambda text: self._tell_location(location, text))
+
+    def _tell_location(self, location: Location, text: str) -> str:
         location.tell(text, evoke=False)
         return text
   
@@ -336,6 +416,7 @@ class LlmUtil():
         self.__story_context = story.config.context
         self.__story_type = story.config.type
         self.__world_info = story.config.world_info
+        self.governor.find_zone = story.find_zone
         if story.config.image_gen:
             self._init_image_gen(story.config.image_gen)
 
@@ -343,16 +424,31 @@ class LlmUtil():
         """ Increase the story progress"""
         return self._story_building.advance_story_section(story_context or self.__story.config.context)
 
+    def set_profiler(self, profiler: TickProfiler) -> None:
+        """ Record llm request and image timings, and queue depths, in profiler."""
+        self.profiler = profiler
+        self.io_util.profiler = profiler
+        if self._image_gen and self._image_gen.generate_in_background:
+            self._image_gen.queue.profiler = profiler
+        profiler.gauge('llm_queue_depth', lambda: self.scheduler.pending)
+        profiler.gauge('llm_batch_pending', lambda: self.batcher.pending)
+        profiler.gauge('image_queue_depth', lambda: self._image_gen.queue.pending if self._image_gen and self._image_gen.generate_in_background else 0)
+
     def _init_image_gen(self, image_gen: str):
         """ Initialize the image generator"""
         clazz =  getattr(sys.modules['tale.image_gen.' + image_gen.lower()], image_gen)
         self._image_gen = clazz()
+        if self._image_gen.generate_in_background:
+            self._image_gen.queue.profiler = self.profiler
+            # pick up the images a previous run was still waiting for
+            self._image_gen.queue.resume(lambda image_name: copy_single_image('./', image_name + '.jpg'))
 
-    def _get_world_context(self):
+    def _get_world_context(self, location: str = '') -> WorldGenerationContext:
         return WorldGenerationContext(story_context=self.__story_context,
                                         story_type=self.__story_type,
                                         world_info=self.__world_info,
-                                        world_mood=self.__story.config.world_mood)
+                                        world_mood=self.__story.config.world_mood,
+                                        location=location)
 
 
 
@@ -0,0 +1,115 @@
+""" Speculatively builds the unbuilt locations next to where players are, so most moves
+find their destination already built.
+
+Builds run on the llm workers at idle priority, and are committed to the story on the
+driver thread. A player stepping into a location that is still being prebuilt waits for
+that build instead of starting another one.
+"""
+
+import sys
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+from tale import errors, util
+from tale.base import Location
+from tale.llm.llm_scheduler import LlmScheduler, PRIORITY_IDLE
+from tale.zone import Zone
+
+
+class LocationPrebuilder():
+    """ prepare(zone, from_location, target_location) runs on the driver thread, and returns the task that does
+        the llm requests on a worker and returns (zone, generated). commit(target_location, zone, result) adds it to the story on the driver thread,
+        returning True if the location was built. At most budget builds are in flight; 0 disables prebuilding."""
+
+    def __init__(self, scheduler: LlmScheduler, prepare: Callable[[Zone, Location, Location], Callable[[], Tuple[Zone, Any]]],
+                 commit: Callable[[Location, Zone, Tuple[Zone, Any]], bool], budget: int = 2) -> None:
+        self.scheduler = scheduler
+        self.prepare = prepare
+        self.commit = commit
+        self.budget = budget
+        self._in_flight = dict() # type: Dict[Location, List[Tuple[Any, Callable[[Tuple[Zone, Any]], None]]]] # target to waiting players
+        self._unvisited = set() # type: Set[Location] # prebuilt, but nobody went there yet
+        self.started = 0
+        self.built = 0
+        self.wasted = 0 # failed, or built by someone else first
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        # without workers the build would run inline, and the player would wait for it anyway
+        return self.budget > 0 and self.scheduler.is_async
+
+    def prebuild(self, location: Location, zone: Zone) -> int:
+        """ Start building the unbuilt exit targets of location, within the budget. Returns the number of builds started."""
+        if not self.enabled or not zone:
+            return 0
+        started = 0
+        for exit in location.exits.values():
+            if len(self._in_flight) >= self.budget:
+                break
+            target = exit.target
+            if not target or target.built or target in self._in_flight:
+                continue
+            self._in_flight[target] = []
+            self.started += 1
+            started += 1
+            task = self.prepare(zone, location, target)
+            self.scheduler.submit(lambda task=task, target=target: self._generate(task, zone, target),
+                                  priority=PRIORITY_IDLE,
+                                  on_complete=lambda result, target=target: self._finish(target, zone, result))
+        return started
+
+    def claim(self, target: Location, player: Any, on_built: Callable[[Tuple[Zone, Any]], None]) -> bool:
+        """ A player goes to an unbuilt location. If it's being prebuilt, on_built is called with the
+            result once it's done, and True is returned. Otherwise it's a miss, and the caller builds it."""
+        waiting = self._in_flight.get(target)
+        if waiting is None:
+            self.misses += 1
+            return False
+        self.hits += 1
+        waiting.append((player, on_built))
+        return True
+
+    def entered(self, target: Location) -> None:
+        """ A player goes to a built location."""
+        if target in self._unvisited:
+            self._unvisited.discard(target)
+            self.hits += 1
+
+    def stats(self) -> dict:
+        visits = self.hits + self.misses
+        return {'started': self.started,
+                'built': self.built,
+                'wasted': self.wasted,
+                'in_flight': len(self._in_flight),
+                'unvisited': len(self._unvisited),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / visits if visits else 0.0}
+
+    def _generate(self, task: Callable[[], Tuple[Zone, Any]], zone: Zone, target: Location) -> Tuple[Zone, Any]:
+        """ Runs on an llm worker. A failed build must still be finished, to release the waiting players."""
+        try:
+            return task()
+        except Exception:
+            print("\n* Exception while prebuilding location " + target.name + ":", file=sys.stderr)
+            print("".join(util.format_traceback()), file=sys.stderr)
+            return zone, None
+
+    def _finish(self, target: Location, zone: Zone, result: Tuple[Zone, Any]) -> None:
+        """ Runs on the driver thread."""
+        waiting = self._in_flight.pop(target, [])
+        if self.commit(target, zone, result):
+            self.built += 1
+            if not waiting:
+                self._unvisited.add(target)
+        else:
+            self.wasted += 1
+        for player, on_built in waiting:
+            try:
+                on_built(result)
+            except errors.ActionRefused as x:
+                player.tell(str(x))
+            except Exception:
+                print("\n* Exception while entering prebuilt location:", file=sys.stderr)
+                print("".join(util.format_traceback()), file=sys.stderr)
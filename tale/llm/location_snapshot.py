@@ -0,0 +1,36 @@
+""" What the prompts need of a location, copied on the driver thread.
+
+Npc actions are generated on the llm workers, while the driver thread keeps changing the
+world. Going through location.livings or items there can fail with 'Set changed size during
+iteration', or see a move that's half done. So callers copy the location before they submit
+a request, and the prompt is built from the copy.
+"""
+
+from typing import List, NamedTuple, Union
+
+from tale.base import Location
+
+
+class Character(NamedTuple):
+    name: str
+    short_description: str
+    alive: bool
+    hidden: bool
+
+
+class LocationSnapshot():
+
+    def __init__(self, location: Location) -> None:
+        self.name = location.name
+        self.title = location.title
+        self.short_description = location.short_description
+        self.description = location.description
+        self.exits = list(location.exits.keys())    # type: List[str]
+        self.items = [item.name for item in location.items if item.visible] # type: List[str]
+        self.characters = [Character(living.name, living.short_description, living.alive, living.hidden)
+                           for living in location.livings if living.visible] # type: List[Character]
+
+    @classmethod
+    def of(cls, location: Union[Location, 'LocationSnapshot']) -> 'LocationSnapshot':
+        """ The location as a snapshot. When it's one already, it's returned as it is."""
+        return location if isinstance(location, LocationSnapshot) else cls(location)
@@ -0,0 +1,82 @@
+""" The events an npc remembers, kept within a fixed budget so prompts don't grow with uptime. """
+
+from typing import Iterator, Union
+
+from tale.llm import llm_config
+import tale.llm.llm_cache as llm_cache
+
+
+IMPORTANCE_OBSERVED = 0     # things happening around the npc
+IMPORTANCE_INVOLVED = 1     # things said or done to, or by, the npc
+
+SEPARATOR = '<break>'
+
+
+class NpcMemory():
+    """ A list of event hashes, like _observed_events used to be, that forgets when it goes over
+        budget (in characters). The least important of the older events goes first; the most
+        recent events are always kept. The texts are kept alongside the hashes, so rendering
+        doesn't depend on the llm cache, and the rendered history is extended as events are added.
+        Events whose text isn't cached yet, such as memories loaded before the cache of a save,
+        are looked up again when rendered."""
+
+    def __init__(self, events: list = None, budget: int = 0, keep_recent: int = 4) -> None:
+        self.budget = budget or llm_config.params.get('NPC_MEMORY_SIZE', 2000)
+        self.keep_recent = keep_recent
+        self._events = [] # type: list[tuple[int, str, int]] # hash, text, importance
+        self._size = 0
+        self._rendered = '' # type: str
+        self._unresolved = False
+        for event_hash in events or []:
+            self.append(event_hash)
+
+    def append(self, event_hash: int, importance: int = IMPORTANCE_OBSERVED) -> None:
+        text = llm_cache.get_events([event_hash])
+        if not text:
+            self._unresolved = True
+        self._rendered = self._rendered + SEPARATOR + text if self._events else text
+        self._events.append((event_hash, text, importance))
+        self._size += len(text) + len(SEPARATOR)
+        if self._size > self.budget:
+            self._forget()
+
+    def render(self, amount: int = 0) -> str:
+        """ The remembered events as prompt text. With amount, only the latest amount of events."""
+        if self._unresolved:
+            self._resolve()
+        if amount:
+            return SEPARATOR.join([text for _, text, _ in self._events[-amount:]])
+        return self._rendered
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter([event_hash for event_hash, _, _ in self._events])
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[int, list]:
+        if isinstance(index, slice):
+            return [event_hash for event_hash, _, _ in self._events[index]]
+        return self._events[index][0]
+
+    def _forget(self) -> None:
+        while self._size > self.budget and len(self._events) > self.keep_recent:
+            older = self._events[:-self.keep_recent]
+            least_important = min([importance for _, _, importance in older])
+            index = next(i for i, (_, _, importance) in enumerate(older) if importance == least_important)
+            _, text, _ = self._events.pop(index)
+            self._size -= len(text) + len(SEPARATOR)
+        self._rendered = SEPARATOR.join([text for _, text, _ in self._events])
+
+    def _resolve(self) -> None:
+        """ Look up the texts that weren't cached when their events were added."""
+        self._unresolved = False
+        events = []
+        for event_hash, text, importance in self._events:
+            if not text:
+                text = llm_cache.get_events([event_hash])
+                self._unresolved = self._unresolved or not text
+            events.append((event_hash, text, importance))
+        self._events = events
+        self._size = sum([len(text) + len(SEPARATOR) for _, text, _ in events])
+        self._forget()
@@ -0,0 +1,100 @@
+""" Fits prompt contexts to the backend's context window.
+
+Token counts come from a pluggable tokenizer. Without one, they're estimated from the
+length of the text, which errs on the generous side for english prose.
+"""
+
+from typing import Callable, List
+
+
+
+PRIORITY_REQUIRED = 0   # never trimmed
+PRIORITY_HIGH = 1       # the acting characters, the location
+PRIORITY_MEDIUM = 2     # story and world info
+PRIORITY_LOW = 3        # history and other things that can be cut first
+
+CHARS_PER_TOKEN = 4
+
+_tokenizer = None # type: Callable[[str], int]
+
+
+def set_tokenizer(tokenizer: Callable[[str], int]) -> None:
+    """ Use tokenizer (a function returning the number of tokens in a string) to count tokens.
+        None reverts to the length based estimate."""
+    global _tokenizer
+    _tokenizer = tokenizer
+
+def load_tokenizer(name: str) -> None:
+    """ Set up a local tokenizer by name, if it's installed. Currently 'tiktoken'."""
+    if name == 'tiktoken':
+        try:
+            import tiktoken
+        except ImportError:
+            print('tiktoken is not installed, estimating token counts from text length')
+            return
+        encoding = tiktoken.get_encoding('cl100k_base')
+        set_tokenizer(lambda text: len(encoding.encode(text)))
+    elif name:
+        print('Unknown tokenizer ' + name + ', estimating token counts from text length')
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _tokenizer:
+        return _tokenizer(text)
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def context_budget(request_body: dict, prompt: str, context_window: int = 0) -> int:
+    """ Tokens left for the context, once the prompt and the generated response are accounted for.
+        0 means the context window isn't known and nothing is trimmed."""
+    window = request_body.get('max_context_length', context_window)
+    if not window:
+        return 0
+    reserved = request_body.get('max_length', request_body.get('max_tokens', 0))
+    return max(1, window - reserved - count_tokens(prompt))
+
+def truncate(text: str, tokens: int, keep_end: bool = False) -> str:
+    """ Cut text down to about tokens, from the end, or from the start if keep_end."""
+    length = min(len(text), tokens * CHARS_PER_TOKEN)
+    while length > 0:
+        cut = text[len(text) - length:] if keep_end else text[:length]
+        if count_tokens(cut) <= tokens:
+            return cut
+        length = int(length * 0.9)
+    return ''
+
+
+class Section():
+    """ A part of a context prompt: label + text + end. Only the text is trimmed. """
+
+    def __init__(self, label: str, text: str, end: str = '; ', priority: int = PRIORITY_MEDIUM, keep_end: bool = False) -> None:
+        self.label = label
+        self.text = str(text)
+        self.end = end
+        self.priority = priority
+        self.keep_end = keep_end # trim from the start, keeping the latest, as for history
+
+    def render(self) -> str:
+        return f"{self.label}{self.text}{self.end}"
+
+
+def fit(sections: List[Section], budget: int) -> str:
+    """ Render sections in order, trimming the lowest priority ones first until they fit the budget.
+        Sections trimmed to nothing are left out, unless they're required."""
+    if budget <= 0:
+        return ''.join([section.render() for section in sections])
+    texts = [section.text for section in sections]
+    over = sum([count_tokens(section.render()) for section in sections]) - budget
+    for priority in (PRIORITY_LOW, PRIORITY_MEDIUM, PRIORITY_HIGH):
+        if over <= 0:
+            break
+        for i, section in enumerate(sections):
+            if over <= 0:
+                break
+            if section.priority != priority or not texts[i]:
+                continue
+            tokens = count_tokens(texts[i])
+            texts[i] = truncate(texts[i], tokens - over, section.keep_end)
+            over -= tokens - count_tokens(texts[i])
+    return ''.join([f"{section.label}{texts[i]}{section.end}" for i, section in enumerate(sections)
+                    if texts[i] or section.priority == PRIORITY_REQUIRED or not section.text])
@@ -64,7 +64,6 @@ class LocationResponse():
             new_locations, exits = parse_utils.parse_generated_exits(json_result.get('exits', []), 
                                                                      exit_location_name, 
                                                                      location_to_build)
-            location_to_build.built = True
             self.new_locations = new_locations
             self.exits = exits
             return True
@@ -24,9 +24,9 @@ class StoryBuilding():
     
     def advance_story_section(self, story_context: StoryContext) -> str:
         context = AdvanceStoryContext(story_context)
-        prompt = llm_config.params['ADVANCE_STORY_PROMPT'].format(context=context.to_prompt_string())
+        prompt = llm_config.params['ADVANCE_STORY_PROMPT'].format(context='{context}')
         request_body = self.default_body
-        result = self.io_util.synchronous_request(request_body, prompt=prompt)
+        result = self.io_util.synchronous_request(request_body, prompt=prompt, context=context)
         story_context.set_current_section(result)
         return result
     
\ No newline at end of file
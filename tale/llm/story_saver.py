@@ -0,0 +1,79 @@
+""" Writes saved stories to disk in the background.
+
+The story is captured on the driver thread, as the json data of its files. Serializing and
+writing them, syncing them to disk and copying resources happens on a single save thread, one
+save at a time and in the order they were asked for. Files are written to a temporary file and renamed
+into place, so a crash halfway a save leaves the previous files intact.
+"""
+
+import os
+import shutil
+import sys
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple, Union
+
+from tale import util
+
+
+_executor = None # type: ThreadPoolExecutor
+
+
+def submit(save_path: str, files: Dict[str, Union[str, Callable[[], str]]], copies: List[Tuple[str, str]] = [], after: Callable[[], None] = None) -> Future:
+    """ Write files (name to text, or to a function giving the text on the save thread) to save_path, then copy the (source, destination) files and folders
+        in copies, skipping unchanged files, then call after. The future's result is the number of files written and copied."""
+    global _executor
+    if not _executor:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='story-save')
+    return _executor.submit(_save, save_path, files, copies, after)
+
+def _save(save_path: str, files: Dict[str, Union[str, Callable[[], str]]], copies: List[Tuple[str, str]], after: Callable[[], None]) -> int:
+    try:
+        os.makedirs(save_path, exist_ok=True)
+        written = 0
+        for name, text in files.items():
+            write_atomic(os.path.join(save_path, name), text() if callable(text) else text)
+            written += 1
+        for source, destination in copies:
+            if os.path.isdir(source):
+                written += sync_tree(source, destination)
+            elif os.path.exists(source) and sync_file(source, destination):
+                written += 1
+        if after:
+            after()
+        return written
+    except Exception:
+        print("\n* Exception while saving story to " + save_path + ":", file=sys.stderr)
+        print("".join(util.format_traceback()), file=sys.stderr)
+        raise
+
+def write_atomic(path: str, text: str) -> None:
+    """ Write text to path through a temporary file that is synced to disk and renamed over it."""
+    temp_path = path + '.tmp'
+    with open(temp_path, "w") as fp:
+        fp.write(text)
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(temp_path, path)
+
+def sync_file(source: str, destination: str) -> bool:
+    """ Copy source to destination, unless it's there already with the same size and modification time."""
+    try:
+        stat = os.stat(destination)
+        source_stat = os.stat(source)
+        if stat.st_size == source_stat.st_size and int(stat.st_mtime) == int(source_stat.st_mtime):
+            return False
+    except FileNotFoundError:
+        pass
+    shutil.copy2(source, destination)
+    return True
+
+def sync_tree(source: str, destination: str) -> int:
+    """ Copy the changed and new files of the source folder to destination. Returns the number copied."""
+    copied = 0
+    for folder, _, names in os.walk(source):
+        target_folder = os.path.join(destination, os.path.relpath(folder, source))
+        os.makedirs(target_folder, exist_ok=True)
+        for name in names:
+            if sync_file(os.path.join(folder, name), os.path.join(target_folder, name)):
+                copied += 1
+    return copied
@@ -2,7 +2,7 @@
 from copy import deepcopy
 import json
 import random
-from typing import Any, Tuple
+from typing import Any, Callable, Tuple
 from tale import load_items, parse_utils, races
 from tale import zone
 from tale.base import Location
@@ -41,8 +41,10 @@ class WorldBuilding():
                        context: WorldGenerationContext,
                        world_items: dict = {}, 
                        world_creatures: dict = {},
-                       neighbors: dict = {}) -> Tuple[LocationResponse, MobSpawner]:
+                       neighbors: dict = {},
+                       on_description: Callable[[str], None] = None) -> Tuple[LocationResponse, MobSpawner]:
         """ Build 'up' a previously generated location.
+            on_description gets the description while it streams in, if the backend streams.
             Returns lists of new locations, exits, and npcs."""
         
         spawn_prompt = ''
@@ -80,7 +82,8 @@ class WorldBuilding():
 
         request_body = deepcopy(self.default_body)
         request_body['grammar'] = self.json_grammar
-        result = self.io_util.synchronous_request(request_body, prompt=prompt, context=context.to_prompt_string())
+        result = self.io_util.stream_json_request(request_body, prompt=prompt, context=context,
+                                                  fields={'description': on_description} if on_description else None)
         try:
             json_result = json.loads(parse_utils.sanitize_json(result))
             result = LocationResponse(json_result, location=location, exit_location_name=exit_location_name, world_items=world_items, world_creatures=world_creatures, neighbors=neighbors, item_types=self.item_types)
@@ -95,10 +98,11 @@ class WorldBuilding():
             print(exc)
             return LocationResponse.empty(), None
       
-    def get_neighbor_or_generate_zone(self, current_zone: Zone, current_location: Location, target_location: Location, story: DynamicStory) -> Zone:
+    def get_neighbor_or_generate_zone(self, current_zone: Zone, current_location: Location, target_location: Location, story: DynamicStory, add_zone: bool = True) -> Zone:
         """ Check if the target location is on the edge of the current zone. If not, will return the current zone.
         If it is, will check if there is a neighbor zone in the direction of the target location. If not, will
-        generate a new zone in that direction."""
+        generate a new zone in that direction. Without add_zone, a new zone is not added to the story, and
+        it's up to the caller to do so (on the driver thread)."""
 
         direction = target_location.world_location.subtract(current_location.world_location)
         on_edge = current_zone.on_edge(current_location.world_location, direction)
@@ -118,7 +122,7 @@ class WorldBuilding():
                         zone = self.validate_zone(json_result, 
                                                   current_location.world_location.add(
                                                       direction.multiply(json_result.get('size', current_zone.size_z if direction.z != 0 else current_zone.size))))
-                        if zone and story.add_zone(zone):
+                        if zone and (story.add_zone(zone) if add_zone else not story.has_zone(zone.name)):
                             zone.level = (zone.level + 1) if random.random() < 0.5 else zone.level
                             return zone
         return current_zone
@@ -136,7 +140,7 @@ class WorldBuilding():
         })
         
         request_body = deepcopy(self.default_body)
-        result = self.io_util.synchronous_request(request_body, prompt=prompt, context=context.to_prompt_string())
+        result = self.io_util.synchronous_request(request_body, prompt=prompt, context=context)
         try:
             return json.loads(parse_utils.sanitize_json(result))
         except json.JSONDecodeError as exc:
@@ -197,7 +201,7 @@ class WorldBuilding():
         request_body = deepcopy(self.default_body)
         if self.json_grammar_key:
             request_body[self.json_grammar_key] = self.json_grammar
-        result = self.io_util.synchronous_request(request_body, prompt=prompt, context=context.to_prompt_string())
+        result = self.io_util.synchronous_request(request_body, prompt=prompt, context=context)
         try:
             json_result = json.loads(parse_utils.sanitize_json(result))
             return zone.from_json(json_result)
@@ -214,7 +218,7 @@ class WorldBuilding():
         if self.json_grammar_key:
             request_body[self.json_grammar_key] = self.json_grammar
 
-        result = self.io_util.synchronous_request(request_body, prompt=prompt, context=world_generation_context.to_prompt_string())
+        result = self.io_util.synchronous_request(request_body, prompt=prompt, context=world_generation_context)
         try:
             return WorldItemsResponse(json.loads(parse_utils.sanitize_json(result)))
             #return load_items.load_items(self._validate_items(json_result["items"]))
@@ -229,7 +233,7 @@ class WorldBuilding():
         if self.json_grammar_key:
             request_body[self.json_grammar_key] = self.json_grammar
 
-        result = self.io_util.synchronous_request(request_body, prompt=prompt, context=world_generation_context.to_prompt_string())
+        result = self.io_util.synchronous_request(request_body, prompt=prompt, context=world_generation_context)
         try:
             return WorldCreaturesResponse(json.loads(parse_utils.sanitize_json(result)))
         except json.JSONDecodeError as exc:
@@ -237,7 +241,15 @@ class WorldBuilding():
             return WorldCreaturesResponse()
     
     def generate_random_spawn(self, location: Location, context: WorldGenerationContext, zone_info: dict, world_creatures: list, world_items: list) -> bool:
-        location_info = {'name': location.title, 'description': location.look(short=True), 'exits': location.exits}
+        result = self.request_random_spawn(self.spawn_location_info(location), context, zone_info)
+        return self.add_random_spawn(location, result, world_creatures, world_items)
+
+    def spawn_location_info(self, location: Location) -> dict:
+        """ What the spawn prompt needs of the location, read on the driver thread."""
+        return {'name': location.title, 'description': location.look(short=True), 'exits': list(location.exits.keys())}
+
+    def request_random_spawn(self, location_info: dict, context: WorldGenerationContext, zone_info: dict) -> str:
+        """ Doesn't change the world, so it may run on an llm worker."""
         prompt = llm_config.params['PLAYER_ENTER_PROMPT'].format(context = '{context}',
                                                 npc_template=llm_config.params['NPC_TEMPLATE'],
                                                 zone_info=zone_info,
@@ -245,8 +257,10 @@ class WorldBuilding():
         request_body = deepcopy(self.default_body)
         if self.json_grammar_key:
             request_body[self.json_grammar_key] = self.json_grammar
-        
-        result = self.io_util.synchronous_request(request_body, prompt=prompt, context=context.to_prompt_string())
+        return self.io_util.synchronous_request(request_body, prompt=prompt, context=context)
+
+    def add_random_spawn(self, location: Location, result: str, world_creatures: list, world_items: list) -> bool:
+        """ Add the npcs and items of a spawn response to the location."""
         try:
             json_result = json.loads(parse_utils.sanitize_json(result))
             creatures = json_result["npcs"]
@@ -270,7 +284,7 @@ class WorldBuilding():
         prompt = llm_config.params['NOTE_LORE_PROMPT'].format(context = '{context}',
                                                 zone_info=zone_info)
         request_body = deepcopy(self.default_body)
-        result = self.io_util.synchronous_request(request_body, prompt=prompt, context=context.to_prompt_string())
+        result = self.io_util.synchronous_request(request_body, prompt=prompt, context=context)
         try:
             return parse_utils.trim_response(result)
         except Exception as exc:
@@ -279,11 +293,11 @@ class WorldBuilding():
         
     def generate_dungeon_locations(self, context: DungeonLocationsContext) -> LocationDescriptionResponse:
         """ Generate a list of descriptins for locations in a dungeon."""
-        prompt = llm_config.params['CREATE_DUNGEON_LOCATIONS'].format(context = context.to_prompt_string(), dungeon_location_template=llm_config.params['DUNGEON_LOCATION_TEMPLATE'])
+        prompt = llm_config.params['CREATE_DUNGEON_LOCATIONS'].format(context = '{context}', dungeon_location_template=llm_config.params['DUNGEON_LOCATION_TEMPLATE'])
         request_body = deepcopy(self.default_body)
         if self.json_grammar_key:
             request_body[self.json_grammar_key] = self.json_grammar
-        result = self.io_util.synchronous_request(request_body, prompt=prompt, context=context.to_prompt_string())
+        result = self.io_util.synchronous_request(request_body, prompt=prompt, context=context)
         try:
             parsed = json.loads(parse_utils.sanitize_json(result))
             return LocationDescriptionResponse(parsed)
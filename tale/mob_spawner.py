@@ -3,7 +3,6 @@ import random
 
 from tale import mud_context, parse_utils
 from tale.base import Container, Living, Location
-from tale.util import call_periodically
 
 class MobSpawner():
     def __init__(self, mob_type: dict , location: Location, spawn_rate: int, spawn_limit: int, drop_items: list = None, drop_item_probabilities: list = None):
@@ -16,7 +15,7 @@ class MobSpawner():
         self.randomize_gender = True
         self.randomize_stats = True
         self.time = 0
-        mud_context.driver.register_periodicals(self)
+        mud_context.driver.spawn_manager.add(self)
         self.drop_item_chance = 0.0
         if drop_items:
             self.drop_items = drop_items
@@ -27,12 +26,15 @@ class MobSpawner():
             self.drop_item_probabilities = None
             
 
-    @call_periodically(15)
     def spawn(self):
+        """ One spawn interval (15 seconds) has passed. The spawn manager does this for all spawners at once."""
         self.time += 15
         if self.time < self.spawn_rate:
             return
         self.time -= self.spawn_rate
+        return self.fire()
+
+    def fire(self):
         if self.max_spawns == 0:
             return None
         if self.spawned < self.spawn_limit:
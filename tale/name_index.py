@@ -0,0 +1,202 @@
+"""
+Name lookups for the things in a location or inventory.
+
+Every Location keeps a NameIndex of its livings and one of its items, every Living and
+Container one of its inventory. They map names, aliases and titles to the objects, and are
+kept up to date by insert and remove, and by the objects themselves when their name, title
+or aliases change. The parser, searches and tab completion ask them instead of looping over
+all the objects and their aliases.
+
+'Tale' mud driver, mudlib and interactive fiction framework
+Copyright by Irmen de Jong (irmen@razorvine.net)
+"""
+
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+from collections.abc import Mapping
+
+__all__ = ["NameIndex", "NameLookup", "AliasSet"]
+
+
+class AliasSet(set):
+    """
+    The aliases of a MudObject. Tells the object when it changes,
+    so that the NameIndex of whatever contains the object can be updated.
+    """
+    def __init__(self, aliases: Iterable[str] = (), owner: Any = None) -> None:
+        super().__init__(aliases)
+        self.owner = owner
+
+    def _changed(self) -> None:
+        if self.owner is not None:
+            self.owner._names_changed()
+
+    def add(self, alias: str) -> None:
+        if alias not in self:
+            super().add(alias)
+            self._changed()
+
+    def discard(self, alias: str) -> None:
+        if alias in self:
+            super().discard(alias)
+            self._changed()
+
+    def remove(self, alias: str) -> None:
+        super().remove(alias)
+        self._changed()
+
+    def pop(self) -> str:
+        alias = super().pop()
+        self._changed()
+        return alias
+
+    def clear(self) -> None:
+        super().clear()
+        self._changed()
+
+    def update(self, *others: Iterable[str]) -> None:
+        super().update(*others)
+        self._changed()
+
+    def difference_update(self, *others: Iterable[str]) -> None:
+        super().difference_update(*others)
+        self._changed()
+
+    def intersection_update(self, *others: Iterable[str]) -> None:
+        super().intersection_update(*others)
+        self._changed()
+
+    def symmetric_difference_update(self, other: Iterable[str]) -> None:
+        super().symmetric_difference_update(other)
+        self._changed()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __iand__(self, other):
+        self.intersection_update(other)
+        return self
+
+    def __isub__(self, other):
+        self.difference_update(other)
+        return self
+
+    def __ixor__(self, other):
+        self.symmetric_difference_update(other)
+        return self
+
+
+class NameIndex:
+    """
+    Objects by their name, aliases and (lowercase) title.
+    A name match goes before an alias or title match, like the searches always did.
+    """
+    def __init__(self, objects: Iterable[Any] = ()) -> None:
+        self._keys = {}     # type: Dict[Any, Tuple[str, frozenset, str]]
+        self._names = {}    # type: Dict[str, Dict[Any, None]]
+        self._aliases = {}  # type: Dict[str, Dict[Any, None]]
+        self._titles = {}   # type: Dict[str, Dict[Any, None]]
+        for obj in objects:
+            self.add(obj)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, obj: Any) -> bool:
+        return obj in self._keys
+
+    def add(self, obj: Any) -> None:
+        if obj in self._keys:
+            self.discard(obj)
+        name, aliases, title = keys = (obj.name, frozenset(obj.aliases), obj._title.lower())
+        self._keys[obj] = keys
+        self._names.setdefault(name, {})[obj] = None
+        for alias in aliases:
+            self._aliases.setdefault(alias, {})[obj] = None
+        self._titles.setdefault(title, {})[obj] = None
+
+    def discard(self, obj: Any) -> None:
+        keys = self._keys.pop(obj, None)
+        if keys:
+            name, aliases, title = keys
+            self._remove(self._names, name, obj)
+            for alias in aliases:
+                self._remove(self._aliases, alias, obj)
+            self._remove(self._titles, title, obj)
+
+    def update(self, obj: Any) -> None:
+        """Re-index an object that is in the index, after its names changed."""
+        if obj in self._keys:
+            self.add(obj)
+
+    def clear(self) -> None:
+        self._keys.clear()
+        self._names.clear()
+        self._aliases.clear()
+        self._titles.clear()
+
+    def find(self, name: str) -> Optional[Any]:
+        """The object with that name, or else the first with that alias or title. None if there's none."""
+        name = name.lower()
+        objects = self._names.get(name)
+        if objects:
+            return next(iter(objects))
+        objects = self._aliases.get(name)
+        if objects:
+            return next(iter(objects))
+        for obj in self._titles.get(name, ()):
+            if obj.title.lower() == name:   # hidden things have another title
+                return obj
+        return None
+
+    def get(self, name: str) -> Optional[Any]:
+        """The object with that name or alias (not title). None if there's none."""
+        objects = self._names.get(name) or self._aliases.get(name)
+        return next(iter(objects)) if objects else None
+
+    def keys(self) -> Iterator[str]:
+        """All names and aliases."""
+        yield from self._names
+        yield from self._aliases
+
+    @staticmethod
+    def _remove(index: Dict[str, Dict[Any, None]], key: str, obj: Any) -> None:
+        objects = index.get(key)
+        if objects is not None:
+            objects.pop(obj, None)
+            if not objects:
+                del index[key]
+
+
+class NameLookup(Mapping):
+    """
+    Read-only mapping of names and aliases to objects over one or more NameIndexes,
+    such as the items in a location and in the player's inventory.
+    When a name is in more than one of them, the last one wins.
+    """
+    def __init__(self, *indexes: NameIndex) -> None:
+        self.indexes = indexes
+
+    def __getitem__(self, name: str) -> Any:
+        for index in reversed(self.indexes):
+            obj = index.get(name)
+            if obj is not None:
+                return obj
+        raise KeyError(name)
+
+    def __contains__(self, name: Any) -> bool:
+        return any(index.get(name) is not None for index in self.indexes)
+
+    def __iter__(self) -> Iterator[str]:
+        seen = set()
+        for index in self.indexes:
+            for name in index.keys():
+                if name not in seen:
+                    seen.add(name)
+                    yield name
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __bool__(self) -> bool:
+        return any(len(index) for index in self.indexes)
@@ -1,4 +1,6 @@
 
+from tale import mud_context
+from tale.interest import Tier
 from tale.llm.LivingNpc import LivingNpc
 from tale.player import Player
 from tale.shop import ShopBehavior, Shopkeeper
@@ -13,13 +15,10 @@ class StationaryNpc(LivingNpc):
 
     @call_periodically(30, 60)
     def do_idle_action(self, ctx: Context) -> None:
-        """ Perform an idle action if a player is in the same location."""
+        """ Perform an idle action if a player is in the same location, or someone's listening in."""
         if not self.location or self.location.name == 'Limbo':
             return
-        player_names = ctx.driver.all_players.keys()
-        player_in_location = any(name == living.name for name in player_names for living in self.location.livings)
-        
-        if player_in_location or self.location.get_wiretap() or self.get_wiretap():
+        if ctx.driver.interest.tier(self.location) == Tier.ACTIVE or self.is_wiretapped():
             self.idle_action()
 
 class StationaryMob(LivingNpc):
@@ -33,15 +32,18 @@ class StationaryMob(LivingNpc):
     def do_idle_action(self, ctx: Context) -> None:
         if not self.location or self.location.name == 'Limbo':
             return
-        player_in_location = any(isinstance(living, Player) for living in self.location.livings)
-        if player_in_location and self.aggressive and not self.attacking:
-            for liv in self.location.livings:
-                if isinstance(liv, Player):
-                    self.start_attack(defender=liv)
-        elif player_in_location or self.location.get_wiretap() or self.get_wiretap():
+        if ctx.driver.interest.tier(self.location) != Tier.ACTIVE and not self.is_wiretapped():
+            return
+        players = [living for living in self.location.livings if isinstance(living, Player)]
+        if players and self.aggressive and not self.attacking:
+            for liv in players:
+                self.start_attack(defender=liv)
+        else:
             self.idle_action()
         
 class RoamingMob(StationaryMob):
+
+    _missed_moves = 0   # random moves skipped while nobody was around
     
     def __init__(self, name: str, gender: str, *,
                  title: str="", descr: str="", short_descr: str="", race: str="human", parse_occupation: bool = False):
@@ -52,10 +54,25 @@ class RoamingMob(StationaryMob):
     def do_random_move(self, ctx: Context) -> None:
         if not self.location or self.location.name == 'Limbo':
             return
+        if ctx.driver.interest.tier(self.location) == Tier.DORMANT:
+            if not self._missed_moves:
+                ctx.driver.interest.sleep(self)
+            self._missed_moves += 1
+            return
         direction = self.select_random_move()
         if direction:
             self.move(direction.target, self, direction_names=direction.names)
 
+    def wake_up(self) -> None:
+        """ A player came near. Quietly make up for (some of) the moves skipped meanwhile, but don't walk in on the player."""
+        moves, self._missed_moves = min(self._missed_moves, 3), 0
+        for _ in range(moves):
+            direction = self.select_random_move()
+            if not direction or mud_context.driver.interest.tier(direction.target) == Tier.ACTIVE:
+                break
+            self.location.remove(self, self)
+            direction.target.insert(self, self)
+
 class Trader(Shopkeeper):
     
     def __init__(self, name: str, gender: str, *, title: str = "", descr: str = "", short_descr: str = "", age: int, personality: str, occupation: str = "", race: str = "", parse_occupation: bool = False):
@@ -585,7 +585,7 @@ def save_npcs(creatures: list) -> dict:
             stored_npc['goal'] = npc.goal
             stored_npc['autonomous'] = npc.autonomous
             stored_npc['aggressive'] = npc.aggressive
-            stored_npc['planned_actions'] = npc.planned_actions
+            stored_npc['planned_actions'] = list(npc.planned_actions)
 
         
         npcs[npc.name.capitalize()] = stored_npc
@@ -5,11 +5,13 @@ Player code
 Copyright by Irmen de Jong (irmen@razorvine.net)
 """
 
+import collections
 import os
 import queue
+import sys
 import time
 from threading import Event
-from typing import Sequence, Set, Tuple, Optional, Union
+from typing import Callable, Deque, Sequence, Set, Tuple, Optional, Union
 
 from . import base
 from . import lang
@@ -21,6 +23,7 @@ from .story import GameMode
 from .tio import DEFAULT_SCREEN_WIDTH, DEFAULT_SCREEN_INDENT
 from .tio.iobase import strip_text_styles, IoAdapterBase
 from .vfs import VirtualFileSystem, Resource
+from tale.llm import llm_governor, llm_scheduler
 from tale.player_utils import TextBuffer
 from tale.util import call_periodically
 
@@ -52,8 +55,13 @@ class Player(base.Living, pubsub.Listener):
         # call this function after deserialization.
         self._input = queue.Queue()   # type: queue.Queue[str]
         self.input_is_available = Event()
+        self.input_listener = None  # type: Optional[Callable[[], None]]  # called when input is stored
         self.transcript = None   # type: Optional[IO[str]]
         self._output = TextBuffer()
+        # tells wait here while an evoke before them is generated, so they're shown in order.
+        # the evoke args are None for tells that aren't evoked.
+        self._tells = collections.deque()  # type: Deque[Tuple[Optional[dict], str, bool, bool]]
+        self._evoking = False
 
     def init_names(self, name: str, title: str, descr: str, short_descr: str) -> None:
         title = lang.capital(title or name)  # make sure the title of a player remains capitalized
@@ -76,18 +84,51 @@ class Player(base.Living, pubsub.Listener):
         and whitespace is untouched. Empty strings aren't outputted at all.
         The player object is returned so you can chain calls.
         """
+        evoke_args = None
         if evoke:
             if self.title in message:
                 message = message.replace(self.title, 'you')
-            msg, rolling_prompt = mud_context.driver.llm_util.evoke(message, 
-                                                                    short_len = short_len, 
-                                                                    rolling_prompt = self.rolling_prompt, 
-                                                                    alt_prompt = alt_prompt,
-                                                                    extra_context = extra_context)
-            self.rolling_prompt = rolling_prompt
-        else:
-            msg = str(message)
-        
+            governor = mud_context.driver.llm_util.governor
+            if governor.admit(llm_governor.KIND_EVOKE, self.location):
+                evoke_args = dict(short_len=short_len or governor.busy(llm_governor.KIND_EVOKE), alt_prompt=alt_prompt, extra_context=extra_context)
+            # else over budget, tell it as it is
+        if evoke_args is None and not self._tells and not self._evoking:
+            return self._tell_message(str(message), end=end, format=format)
+        self._tells.append((evoke_args, str(message), end, format))
+        self._next_tell()
+        return self
+
+    def _next_tell(self) -> None:
+        """ Tell what's waiting, up to the next evoke. One evoke is generated at a time,
+            so each gets the rolling prompt of the one before."""
+        while self._tells and not self._evoking:
+            evoke_args, message, end, format = self._tells.popleft()
+            if evoke_args is None:
+                self._tell_message(message, end=end, format=format)
+                continue
+            self._evoking = True
+            llm_util = mud_context.driver.llm_util
+            rolling_prompt = self.rolling_prompt
+            def evoke(message=message, rolling_prompt=rolling_prompt, evoke_args=evoke_args) -> Tuple[str, str]:
+                try:
+                    return llm_util.evoke(message, rolling_prompt=rolling_prompt, **evoke_args)
+                except Exception:
+                    print("\n* Exception while evoking:", file=sys.stderr)
+                    print("".join(util.format_traceback()), file=sys.stderr)
+                    return message, rolling_prompt
+            llm_util.scheduler.submit(llm_util.governor.wrap(llm_governor.KIND_EVOKE, evoke),
+                                      priority=llm_scheduler.PRIORITY_DIALOGUE,
+                                      owner=self,
+                                      on_complete=lambda result, end=end, format=format: self._tell_evoked(result, end=end, format=format))
+
+    def _tell_evoked(self, result: Tuple[str, str], *, end: bool, format: bool) -> base.Living:
+        msg, self.rolling_prompt = result
+        self._evoking = False
+        self._tell_message(msg, end=end, format=format)
+        self._next_tell()
+        return self
+
+    def _tell_message(self, msg: str, *, end: bool, format: bool) -> base.Living:
         super().tell(msg)
         if msg == "\n":
             self._output.p()
@@ -185,6 +226,8 @@ class Player(base.Living, pubsub.Listener):
             self.transcript.write("\n\n>> %s\n" % cmd)
         self.input_is_available.set()
         self.last_input_time = time.time()
+        if self.input_listener:
+            self.input_listener()
         
     @property
     def idle_time(self) -> float:
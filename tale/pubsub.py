@@ -33,11 +33,11 @@ Currently defined pubsub topics used by the Tale driver:
 import threading
 import time
 import weakref
-from typing import Dict, List, Tuple, Union, Optional, Set, Any
+from typing import Callable, Dict, List, Tuple, Union, Optional, Set, Any
 
 TopicNameType = Union[str, Tuple]
 
-__all__ = ["topic", "unsubscribe_all", "Listener"]
+__all__ = ["topic", "has_subscribers", "unsubscribe_all", "Listener"]
 
 all_topics = {}  # type: Dict[TopicNameType, Topic]
 __topic_lock = threading.Lock()
@@ -63,6 +63,7 @@ class Topic:
         self.subscribers = set()  # type: Set[weakref.ReferenceType[Listener]]
         self.events = []  # type: List[Any]
         self.last_event = time.time()  # type: float
+        self.notify = None  # type: Optional[Callable[[], None]]  # called when an event is sent, to wake up whoever syncs
 
     @property
     def idle_time(self) -> float:
@@ -86,6 +87,8 @@ class Topic:
     def send(self, event: Any, synchronous: bool=False) -> Optional[List[Any]]:
         self.events.append(event)
         self.last_event = time.time()
+        if self.notify:
+            self.notify()
         if synchronous:
             return self.sync()
         return None
@@ -119,6 +122,12 @@ def topic(name: TopicNameType) -> Topic:
         return instance
 
 
+def has_subscribers(name: TopicNameType) -> bool:
+    """Does the topic exist and have subscribers. Doesn't create the topic."""
+    instance = all_topics.get(name)
+    return bool(instance and instance.subscribers)
+
+
 def sync(topic: TopicNameType=None) -> List:
     """Sync all pending events (i.e. push them to the subscribers)"""
     if topic:
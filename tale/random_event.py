@@ -1,16 +1,23 @@
+from typing import List
+
+from tale.llm import llm_governor
 from tale.player import PlayerConnection
 from tale.util import call_periodically
 
 
 class RandomEvent:
 
-    def __init__(self, llm_util, player: PlayerConnection):
+    def __init__(self, llm_util, players: List[PlayerConnection]):
         self.llm_util = llm_util
-        self.player = player
+        self.players = players
 
     @call_periodically(300, 600)
     def _random_event(self):
         self.narrative_event()
 
     def narrative_event(self):
-        self.llm_util.generate_narrative_event(self.player.player.location)
+        """ Something happens where the players are, once per location."""
+        locations = {connection.player.location for connection in list(self.players)}
+        for location in locations:
+            if location and self.llm_util.governor.admit(llm_governor.KIND_NARRATIVE, location):
+                self.llm_util.generate_narrative_event(location)
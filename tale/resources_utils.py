@@ -1,5 +1,63 @@
 
 import os
+import threading
+import time
+from typing import Set
+
+
+class ResourceIndex:
+    """ The file names in the web resources folder, kept in memory so that checking for an avatar
+        doesn't touch the disk. The folder's modification time is polled, at most once every
+        poll_interval seconds, and the index is rebuilt when it changed. Files that Tale writes
+        there itself are added directly."""
+
+    def __init__(self, folder: str, poll_interval: float = 2.0) -> None:
+        self.folder = folder
+        self.poll_interval = poll_interval
+        self._names = set()  # type: Set[str]
+        self._mtime = None  # type: int
+        self._checked = None  # type: float
+        self._lock = threading.Lock()
+
+    def set_folder(self, folder: str) -> None:
+        if folder != self.folder:
+            self.folder = folder
+            self.refresh(force=True)
+
+    def refresh(self, force: bool = False) -> None:
+        """ Rebuild the index if the folder changed since it was last read, or always when forced."""
+        with self._lock:
+            self._checked = time.monotonic()
+            try:
+                mtime = os.stat(self.folder).st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime == self._mtime and not force:
+                return
+            names = set()
+            if mtime is not None:
+                with os.scandir(self.folder) as entries:
+                    names = {entry.name for entry in entries if entry.is_file()}
+            self._names = names
+            self._mtime = mtime
+
+    def add(self, file_name: str) -> None:
+        self._names.add(file_name)
+
+    def discard(self, file_name: str) -> None:
+        self._names.discard(file_name)
+
+    def exists(self, file_name: str) -> bool:
+        if self._checked is None or time.monotonic() - self._checked >= self.poll_interval:
+            self.refresh()
+        return file_name in self._names
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+resource_index = ResourceIndex(os.path.join('../../tale/web', 'resources')) # the game is run from the stories directory
+
 
 def pad_text_for_avatar(text: str, npc_name: str) -> str:
     """Pad text for NPC output."""
@@ -12,7 +70,6 @@ def unpad_text(text: str) -> str:
     return text.replace('<:>', ':')
 
 def check_file_exists_in_resources(file_name) -> str:
-    file_path = os.path.join(os.path.dirname('../../tale/web/resources/'), file_name + '.jpg')
-    if os.path.exists(file_path):
+    if resource_index.exists(file_name + '.jpg'):
         return file_name
     return None
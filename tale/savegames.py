@@ -1,7 +1,10 @@
 import datetime
+import hashlib
 import importlib
 import gzip
-from typing import Any, Tuple, List, Optional, Dict, Type, Sequence, Union
+import io
+import struct
+from typing import Any, BinaryIO, Iterable, Iterator, Tuple, List, Optional, Dict, Type, Sequence, Union
 
 from .base import Item, Location, Living, Exit, Door, MudObject, MudObjRegistry, Stats, _limbo
 from .story import StoryConfig, MoneyType, GameMode, TickMethod
@@ -42,8 +45,33 @@ def qual_baseclassname(obj: MudObject) -> str:
         raise ValueError("cannot determine Tale base class", obj)
 
 
+_XOR_KEY = 0x5c    # please do not hack the save files
+_XOR_TABLE = bytes(b ^ _XOR_KEY for b in range(256))
+_RECORD_LENGTH = struct.Struct(">I")
+SAVEGAME_SECTIONS = ("items", "livings", "locations", "exits")
+
+
+class _XorWriter:
+    """obfuscates everything written through it to the underlying stream"""
+    def __init__(self, stream: BinaryIO) -> None:
+        self.stream = stream
+
+    def write(self, data: bytes) -> int:
+        return self.stream.write(bytes(data).translate(_XOR_TABLE))
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+
 class TaleSerializer:
-    xor_key = 0x5c    # please do not hack the save files
+    """
+    Writes savegames as a stream of records, one per object, so the whole world never has to be
+    in memory as one big literal. A save is either a checkpoint of everything, or a delta that
+    only holds the objects that changed since the previous save by this serializer, and the ones
+    that are gone. Deltas are appended to the checkpoint; the deserializer replays them in order.
+    """
+    xor_key = _XOR_KEY
+    max_deltas = 20     # after this many deltas, the next save should be a full checkpoint again
 
     def __init__(self):
         serpent.register_class(Player, self.serialize_player)
@@ -55,47 +83,93 @@ class TaleSerializer:
         serpent.register_class(Exit, self.serialize_exit)
         serpent.register_class(Deferred, self.serialize_deferred)
         self.serializer = serpent.Serializer(indent=True, module_in_classname=True)
+        self.checkpoint = None  # type: Dict[str, Dict[int, bytes]]  # digests of the saved objects, by section and vnum
+        self.num_deltas = 0
+
+    @property
+    def can_save_delta(self) -> bool:
+        return self.checkpoint is not None and self.num_deltas < self.max_deltas
 
     def serialize(self, story: StoryConfig, player: Player, items: Sequence[Item], livings: Sequence[Living],
                   locations: Sequence[Location], exits: Sequence[Exit],
-                  deferreds: Sequence[Deferred], clock: GameDateTime):
+                  deferreds: Sequence[Deferred], clock: GameDateTime, delta: bool=False) -> bytes:
+        out = io.BytesIO()
+        self.serialize_to(out, story, player, items, livings, locations, exits, deferreds, clock, delta)
+        return out.getvalue()
+
+    def serialize_to(self, stream: BinaryIO, story: StoryConfig, player: Player, items: Sequence[Item], livings: Sequence[Living],
+                     locations: Sequence[Location], exits: Sequence[Exit],
+                     deferreds: Sequence[Deferred], clock: GameDateTime, delta: bool=False) -> int:
+        """
+        Write a save to the stream, object by object. With delta, it is to be appended to the
+        previous save, and only contains what changed since. Returns the number of objects written.
+        """
+        if delta and self.checkpoint is None:
+            raise ValueError("no checkpoint to save a delta against")
         # only serialize livings that are not the current player, and also not the dummy player used for new connections
         livings = [l for l in livings if l is not player and l.name != PlayerConnection.dummy_player_name]
         if _limbo not in locations:
             locations = list(locations)
             locations.append(_limbo)
-        if any(i not in items for i in player.inventory):
+        self.check_integrity(player, items, livings, locations, exits)
+        if not delta:
+            stream.write(b"TALESAVE2")
+        checkpoint = {}  # type: Dict[str, Dict[int, bytes]]
+        written = 0
+        with gzip.GzipFile(fileobj=_XorWriter(stream), mode="wb") as out:   # type: ignore
+            self._write_record(out, ("checkpoint", {"delta": delta}))
+            self._write_record(out, ("header", {"story_config": story, "clock": clock, "player": player}))
+            for section, objects in zip(SAVEGAME_SECTIONS, (items, livings, locations, exits)):
+                previous = self.checkpoint[section] if delta else {}
+                digests = checkpoint[section] = {}
+                for index, obj in enumerate(objects):
+                    key = getattr(obj, "vnum", index)
+                    record = self.serializer.serialize(("object", section, key, obj))
+                    digest = hashlib.blake2b(record, digest_size=16).digest()
+                    digests[key] = digest
+                    if previous.get(key) != digest:
+                        self._write_frame(out, record)
+                        written += 1
+                removed = [vnum for vnum in previous if vnum not in digests]
+                if removed:
+                    self._write_record(out, ("removed", section, removed))
+            self._write_record(out, ("deferreds", list(deferreds)))
+        self.checkpoint = checkpoint
+        self.num_deltas = self.num_deltas + 1 if delta else 0
+        return written
+
+    def check_integrity(self, player: Player, items: Sequence[Item], livings: Sequence[Living],
+                        locations: Sequence[Location], exits: Sequence[Exit]) -> None:
+        """every object that is referenced from the saved objects, must be saved as well"""
+        item_ids = {id(i) for i in items}
+        living_ids = {id(l) for l in livings}
+        location_ids = {id(loc) for loc in locations}
+        exit_ids = {id(e) for e in exits}
+        if any(id(i) not in item_ids for i in player.inventory):
             raise ValueError("missing item (from player inventory)")
-        if any(i not in items for living in livings for i in living.inventory):
+        if any(id(i) not in item_ids for living in livings for i in living.inventory):
             raise ValueError("missing item (from living inventory)")
-        if any(i not in items for loc in locations for i in loc.items):
+        if any(id(i) not in item_ids for loc in locations for i in loc.items):
             raise ValueError("missing item (from locations)")
-        if any(l is not player and l not in livings for loc in locations for l in loc.livings):
+        if any(l is not player and id(l) not in living_ids for loc in locations for l in loc.livings):
             raise ValueError("missing living (from locations)")
-        if any(living.location is not None and living.location not in locations for living in livings):
+        if any(living.location is not None and id(living.location) not in location_ids for living in livings):
             raise ValueError("missing location (from livings)")
-        if player.location is not None and player.location not in locations:
+        if player.location is not None and id(player.location) not in location_ids:
             raise ValueError("missing location (from player)")
-        if any(e not in exits for loc in locations for e in loc.exits.values()):
+        if any(id(e) not in exit_ids for loc in locations for e in loc.exits.values()):
             raise ValueError("missing exit (from location)")
-        data = {
-            # "story_version": story.version,
-            # "tale_version_required": story.requires_tale,
-            "story_config": story,
-            "clock": clock,
-            "items": items,
-            "livings": livings,
-            "locations": locations,
-            "exits": exits,
-            "deferreds": deferreds,
-            "player": player,
-        }
-        serialized = self.serializer.serialize(data)
-        return self.obfuscate(serialized)
+
+    def _write_record(self, out: BinaryIO, record: Tuple) -> None:
+        self._write_frame(out, self.serializer.serialize(record))
+
+    def _write_frame(self, out: BinaryIO, data: bytes) -> None:
+        out.write(_RECORD_LENGTH.pack(len(data)))
+        out.write(data)
 
     def obfuscate(self, data: bytes) -> bytes:
         data = gzip.compress(data)
-        return b"TALESAVE1" + bytes(b ^ self.xor_key for b in data)
+        return b"TALESAVE1" + data.translate(_XOR_TABLE)
 
     def add_basic_properties(self, state: Dict[str, Any], obj: MudObject) -> None:
         state["__class__"] = qual_classname(obj)
@@ -104,6 +178,9 @@ class TaleSerializer:
         state["descr"] = obj.description
         state["short_descr"] = obj.short_description
         state["extra_desc"] = obj.extra_desc
+        state["aliases"] = obj.aliases
+        state["visible"] = obj.visible
+        state["hidden"] = obj.hidden
 
     def add_inventory_property(self, state: Dict[str, Any], obj: MudObject) -> None:
         try:
@@ -150,7 +227,7 @@ class TaleSerializer:
         state = dict(vars(obj))
         # remove stuff we don't want to serialize at all
         unserialized_attrs = {"subjective", "possessive", "objective", "teleported_from", "soul",
-                              "input_is_available", "transcript", "last_input_time", "previous_commandline"}
+                              "input_is_available", "input_listener", "transcript", "last_input_time", "previous_commandline"}
         skipped_attrs = set()
         for name in list(state):
             if name.startswith("_"):
@@ -229,20 +306,65 @@ class TaleSerializer:
                 del state[name]
         self.add_basic_properties(state, obj)
         # livings and items, and the exits, present in this location:
-        state["livings"] = {mudobj_ref(l) for l in state["livings"]}
-        state["items"] = {mudobj_ref(i) for i in state["items"]}
+        state["livings"] = {mudobj_ref(l) for l in obj.livings}
+        state["items"] = {mudobj_ref(i) for i in obj.items}
         state["exits"] = {mudobj_ref(e) for e in state["exits"].values()}
         ser._serialize(state, out, indentlevel)
 
 
 class TaleDeserializer:
     def deserialize(self, data):
+        """The saved state, as literals. Checkpoint and delta saves are replayed into a single state."""
+        if data.startswith(b"TALESAVE2"):
+            return self.replay(self.read_records(data))
         return serpent.loads(self.deobfuscate(data))
 
     def deobfuscate(self, data: bytes) -> bytes:
         if not data.startswith(b"TALESAVE1"):
             return data
-        return gzip.decompress(bytes(b ^ TaleSerializer.xor_key for b in data[9:]))
+        return gzip.decompress(data[9:].translate(_XOR_TABLE))
+
+    def read_records(self, data: bytes) -> Iterator[Any]:
+        """the records of a streaming savegame, one at a time"""
+        with gzip.GzipFile(fileobj=io.BytesIO(data[9:].translate(_XOR_TABLE)), mode="rb") as stream:
+            while True:
+                try:
+                    length = stream.read(_RECORD_LENGTH.size)
+                    if not length:
+                        break
+                    size = _RECORD_LENGTH.unpack(length)[0]
+                    record = stream.read(size)
+                except (EOFError, struct.error):
+                    raise ValueError("savegame is truncated")
+                if len(record) < size:
+                    raise ValueError("savegame is truncated")
+                yield serpent.loads(record)
+
+    def replay(self, records: Iterable[Any]) -> Dict[str, Any]:
+        sections = {section: {} for section in SAVEGAME_SECTIONS}  # type: Dict[str, Dict[int, Any]]
+        state = {}  # type: Dict[str, Any]
+        for record in records:
+            kind = record[0]
+            if kind == "checkpoint":
+                if not record[1]["delta"]:
+                    for objects in sections.values():
+                        objects.clear()
+            elif kind == "header":
+                state.update(record[1])
+            elif kind == "object":
+                sections[record[1]][record[2]] = record[3]
+            elif kind == "removed":
+                for vnum in record[2]:
+                    sections[record[1]].pop(vnum, None)
+            elif kind == "deferreds":
+                state["deferreds"] = record[1]
+            else:
+                raise ValueError("invalid savegame record: " + str(kind))
+        if "player" not in state:
+            raise ValueError("savegame has no checkpoint")
+        for section, objects in sections.items():
+            state[section] = list(objects.values())
+        return state
 
     def recreate_classes(self, literal, existing_object_lookup):
         t = type(literal)
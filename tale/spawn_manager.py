@@ -0,0 +1,162 @@
+"""
+Runs all mob and item spawners of the world from the server tick.
+
+Spawners used to each have their own periodical deferred. Big worlds (dungeon levels, zones
+with a spawner in every other room) have thousands of them, which all woke up every 15
+seconds just to add 15 to a counter. The manager keeps the spawners in flat arrays and a
+wheel of tick slots, so that a tick only visits the spawners that are due. Spawners in zones
+with no player in them or next to them don't spawn, but catch up (a bit) when a player comes near.
+
+'Tale' mud driver, mudlib and interactive fiction framework
+Copyright by Irmen de Jong (irmen@razorvine.net)
+"""
+
+import datetime
+import sys
+from array import array
+from typing import Any, Dict, List, Optional
+
+from . import util
+from .interest import InterestManager
+
+__all__ = ["SpawnManager"]
+
+
+class SpawnManager:
+    """
+    Owns the spawners. Every interval (real time) seconds is one spawn tick, in which the due
+    spawners are fired. A spawner is due when its accumulated time reaches its spawn rate, like
+    it was when every spawner added the interval to its time itself.
+    """
+    interval = 15
+    max_catch_up = 3    # most spawns a spawner makes up for at once, after its zone was dormant
+
+    def __init__(self) -> None:
+        self.ticks = 0
+        self.next_tick = None   # type: Optional[datetime.datetime]   # in game time
+        self._spawners = []     # type: List[Any]
+        self._index = {}        # type: Dict[int, int]   # id(spawner) -> index in the arrays
+        self._due = array('q')  # tick at which the spawner fires next
+        self._since = array('q')    # tick up to which the spawner's time was accounted for
+        self._slots = {}        # type: Dict[int, List[Any]]   # tick -> spawners due then (removed ones are skipped)
+        self._zones = {}        # type: Dict[int, str]   # id(spawner) -> name of the zone it spawns in, once known
+        self._missed = {}       # type: Dict[int, int]   # id(spawner) -> spawns skipped while its zone was dormant
+        self._interest_generation = 0
+
+    def __len__(self) -> int:
+        return len(self._spawners)
+
+    def __contains__(self, spawner: Any) -> bool:
+        return id(spawner) in self._index
+
+    def add(self, spawner: Any) -> None:
+        if id(spawner) in self._index:
+            return
+        self._index[id(spawner)] = len(self._spawners)
+        self._spawners.append(spawner)
+        self._due.append(0)
+        self._since.append(self.ticks)
+        self._schedule(len(self._spawners) - 1)
+
+    def remove(self, spawner: Any) -> None:
+        index = self._index.pop(id(spawner), None)
+        if index is None:
+            return
+        self._zones.pop(id(spawner), None)
+        self._missed.pop(id(spawner), None)
+        last = len(self._spawners) - 1
+        if index != last:
+            # move the last spawner into the hole
+            moved = self._spawners[last]
+            self._spawners[index] = moved
+            self._due[index] = self._due[last]
+            self._since[index] = self._since[last]
+            self._index[id(moved)] = index
+        self._spawners.pop()
+        self._due.pop()
+        self._since.pop()
+
+    def clear(self) -> None:
+        self._spawners.clear()
+        self._index.clear()
+        self._due = array('q')
+        self._since = array('q')
+        self._slots.clear()
+        self._zones.clear()
+        self._missed.clear()
+
+    def _schedule(self, index: int) -> None:
+        spawner = self._spawners[index]
+        remaining = spawner.spawn_rate - spawner.time
+        ticks = max(1, -(-remaining // self.interval))
+        due = self._since[index] + ticks
+        self._due[index] = due
+        self._slots.setdefault(due, []).append(spawner)
+
+    def tick(self, game_clock: util.GameDateTime, interest: InterestManager = None) -> int:
+        """
+        Called every server tick. When the next spawn tick is reached, fires the spawners that are due.
+        Without an interest manager all spawners are active.
+        Returns the number of spawners fired.
+        """
+        if self.next_tick is None:
+            self.next_tick = game_clock.plus_realtime(datetime.timedelta(seconds=self.interval))
+            return 0
+        if game_clock.clock < self.next_tick:
+            return 0
+        self.next_tick = game_clock.plus_realtime(datetime.timedelta(seconds=self.interval))
+        self.ticks += 1
+        fired = 0
+        if interest and self._missed and interest.generation != self._interest_generation:
+            fired += self._catch_up(interest)
+        self._interest_generation = interest.generation if interest else 0
+        due = self._slots.pop(self.ticks, None)
+        if not due:
+            return fired
+        for spawner in due:
+            index = self._index.get(id(spawner))
+            if index is None or self._due[index] != self.ticks:
+                continue   # removed, or rescheduled
+            spawner.time += (self.ticks - self._since[index]) * self.interval - spawner.spawn_rate
+            self._since[index] = self.ticks
+            self._schedule(index)
+            if interest:
+                zone = self._zone_of(spawner, interest)
+                if zone and not interest.zone_active(zone):
+                    # nobody around to see it, spawn it when someone comes near
+                    self._missed[id(spawner)] = self._missed.get(id(spawner), 0) + 1
+                    continue
+            fired += self._fire(spawner, 1)
+        return fired
+
+    def _catch_up(self, interest: InterestManager) -> int:
+        """Fire the spawners that missed spawns while their zone was dormant, if it isn't anymore."""
+        fired = 0
+        for spawner_id, missed in list(self._missed.items()):
+            zone = self._zones.get(spawner_id)
+            if zone is None or interest.zone_active(zone):
+                del self._missed[spawner_id]
+                fired += self._fire(self._spawners[self._index[spawner_id]], min(missed, self.max_catch_up))
+        return fired
+
+    @staticmethod
+    def _fire(spawner: Any, times: int) -> int:
+        try:
+            for _ in range(times):
+                spawner.fire()
+            return times
+        except Exception:
+            print("\n* Exception while running spawner {0}:".format(spawner), file=sys.stderr)
+            print("".join(util.format_traceback()), file=sys.stderr)
+            return 0
+
+    def _zone_of(self, spawner: Any, interest: InterestManager) -> Optional[str]:
+        zone_name = self._zones.get(id(spawner))
+        if zone_name is None:
+            zone = getattr(spawner, "zone", None)
+            if zone is None and getattr(spawner, "location", None) is not None:
+                zone = interest.zone_of(spawner.location)
+            if zone is None:
+                return None
+            zone_name = self._zones[id(spawner)] = zone.name
+        return zone_name
@@ -78,7 +78,7 @@ class StoryBuilderBase:
                         target = random.choice(items),
                         reason="I need it",
                         giver=quest_npc)
-        quest_npc.quest = quest
+        quest_npc.set_quest(quest)
 
 class StoryExtrasBuilder():
 
@@ -0,0 +1,141 @@
+"""
+Timings of what the driver spends its time on.
+
+Each tick phase, deferred action, player command, llm request and generated image is
+recorded under a name such as "tick", "deferred:Wolf.do_wander" or "command:look". The
+most recent samples of every name are kept for percentiles; counts and totals are kept
+since the start. Ticks that take longer than the tick time are logged, naming the slowest
+deferred action that ran in them.
+
+'Tale' mud driver, mudlib and interactive fiction framework
+Copyright by Irmen de Jong (irmen@razorvine.net)
+"""
+
+import collections
+import contextlib
+import sys
+import threading
+import time
+from types import ModuleType
+from typing import Any, Callable, Deque, Dict, Iterator, List, Sequence, Tuple
+
+__all__ = ["TickProfiler", "SlowTick", "deferred_name"]
+
+
+SlowTick = collections.namedtuple("SlowTick", ["time", "duration", "culprit", "culprit_duration"])
+
+
+def deferred_name(deferred: Any) -> str:
+    """Owner class (or module) and action of a deferred, like Wolf.do_wander."""
+    owner = deferred.owner
+    if isinstance(owner, str):
+        owner = owner[7:] if owner.startswith("module:") else owner
+    elif isinstance(owner, ModuleType):
+        owner = owner.__name__
+    else:
+        owner = type(owner).__name__
+    return "%s.%s" % (owner, deferred.action)
+
+
+class TickProfiler:
+    """
+    Collects timings, in seconds, by name. Safe to record into from any thread.
+    Gauges are functions that are called to get their current value, such as a queue depth.
+    """
+    def __init__(self, samples: int = 1000, slow_ticks: int = 50) -> None:
+        self.max_samples = samples
+        self._lock = threading.Lock()
+        self._samples = {}  # type: Dict[str, Deque[float]]
+        self._counts = collections.Counter()  # type: collections.Counter
+        self._totals = collections.defaultdict(float)  # type: Dict[str, float]
+        self._gauges = {}  # type: Dict[str, Callable[[], float]]
+        self.slow_ticks = collections.deque(maxlen=slow_ticks)  # type: Deque[SlowTick]
+        self.num_slow_ticks = 0
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = collections.deque(maxlen=self.max_samples)
+            samples.append(seconds)
+            self._counts[name] += 1
+            self._totals[name] += seconds
+
+    @contextlib.contextmanager
+    def measure(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def gauge(self, name: str, value: Callable[[], float]) -> None:
+        self._gauges[name] = value
+
+    def gauges(self) -> Dict[str, float]:
+        values = {}
+        for name, value in list(self._gauges.items()):
+            try:
+                values[name] = float(value())
+            except Exception:
+                pass   # a gauge of something that isn't there (anymore)
+        return values
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return sorted(self._samples)
+
+    def count(self, name: str) -> int:
+        return self._counts[name]
+
+    def total(self, name: str) -> float:
+        return self._totals.get(name, 0.0)
+
+    def percentiles(self, name: str, percents: Sequence[float] = (50, 90, 99)) -> List[float]:
+        """Percentiles (nearest rank) of the recent samples of name. Zeros if there are none."""
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if not samples:
+            return [0.0] * len(percents)
+        return [samples[min(len(samples) - 1, max(0, int(len(samples) * p / 100.0 + 0.5) - 1))] for p in percents]
+
+    def tick_done(self, duration: float, budget: float, culprit: Tuple[str, float]) -> None:
+        """Record a server tick. If it took longer than budget, it goes in the slow tick log,
+        with the slowest deferred (name, duration) that ran in it."""
+        self.record("tick", duration)
+        if budget and duration > budget:
+            slow_tick = SlowTick(time.time(), duration, culprit[0], culprit[1])
+            self.slow_ticks.append(slow_tick)
+            self.num_slow_ticks += 1
+            print("Slow tick: %.3f sec (budget %.3f), slowest deferred: %s %.3f sec" %
+                  (duration, budget, culprit[0] or "none", culprit[1]), file=sys.stderr)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+            self._totals.clear()
+        self.slow_ticks.clear()
+        self.num_slow_ticks = 0
+
+    def prometheus(self, prefix: str = "tale") -> str:
+        """All timings and gauges in the Prometheus text exposition format."""
+        lines = ["# HELP %s_seconds Time spent by the driver, by phase." % prefix,
+                 "# TYPE %s_seconds summary" % prefix]
+        for name in self.names():
+            label = 'phase="%s"' % _escape_label(name)
+            for quantile, value in zip((0.5, 0.9, 0.99), self.percentiles(name, (50, 90, 99))):
+                lines.append('%s_seconds{%s,quantile="%s"} %.6f' % (prefix, label, quantile, value))
+            lines.append("%s_seconds_sum{%s} %.6f" % (prefix, label, self.total(name)))
+            lines.append("%s_seconds_count{%s} %d" % (prefix, label, self.count(name)))
+        lines.append("# HELP %s_slow_ticks_total Ticks that took longer than the tick time." % prefix)
+        lines.append("# TYPE %s_slow_ticks_total counter" % prefix)
+        lines.append("%s_slow_ticks_total %d" % (prefix, self.num_slow_ticks))
+        for name, value in sorted(self.gauges().items()):
+            lines.append("# TYPE %s_%s gauge" % (prefix, name))
+            lines.append("%s_%s %s" % (prefix, name, value))
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
@@ -0,0 +1,192 @@
+"""
+Serves the server-sent event streams of all web players from a single thread.
+
+The wsgi server hands over the socket of an eventsource request once the response
+headers have been sent. From then on the hub multiplexes all streams with a selector,
+so a connected browser no longer ties up a request thread.
+
+'Tale' mud driver, mudlib and interactive fiction framework
+Copyright by Irmen de Jong (irmen@razorvine.net)
+"""
+
+import selectors
+import socket
+import ssl
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Set
+
+from .. import util
+from ..player import PlayerConnection
+
+__all__ = ["EventStreamHub"]
+
+
+class EventStream:
+    """One browser's event stream: the socket, and what's still to be written to it."""
+    def __init__(self, sock: socket.socket, conn: PlayerConnection) -> None:
+        self.sock = sock
+        self.conn = conn
+        self.pending = bytearray()
+        self.last_sent = time.time()
+        self.listener = None  # type: Callable[[], None]
+
+
+class EventStreamHub:
+    """
+    Multiplexes event streams on one thread. Output for a player is rendered with
+    render(conn), which returns the pending server-sent events, when the player's io
+    signals new output. Sockets are non-blocking; a slow browser only delays itself.
+    """
+    max_pending = 1024 * 1024   # a browser that falls this far behind is disconnected
+
+    def __init__(self, render: Callable[[PlayerConnection], bytes], keepalive: bytes, keepalive_interval: float = 15.0) -> None:
+        self.render = render
+        self.keepalive = keepalive
+        self.keepalive_interval = keepalive_interval
+        self._selector = selectors.DefaultSelector()
+        self._lock = threading.Lock()
+        self._added = []  # type: List[EventStream]
+        self._ready = set()  # type: Set[EventStream]
+        self._streams = {}  # type: Dict[socket.socket, EventStream]
+        self._wakeup_receive, self._wakeup_send = socket.socketpair()
+        self._wakeup_receive.setblocking(False)
+        self._wakeup_send.setblocking(False)
+        self._selector.register(self._wakeup_receive, selectors.EVENT_READ)
+        self._thread = None  # type: threading.Thread
+        self._running = False
+
+    @property
+    def num_streams(self) -> int:
+        return len(self._streams) + len(self._added)
+
+    def start(self) -> None:
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(name="eventstreams", target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        self._wakeup()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def add(self, sock: socket.socket, conn: PlayerConnection) -> None:
+        """Take over a socket whose response headers have been sent, to stream the player's output to."""
+        sock.setblocking(False)
+        stream = EventStream(sock, conn)
+        stream.listener = lambda: self._output_available(stream)
+        conn.io.output_listener = stream.listener
+        with self._lock:
+            self._added.append(stream)
+            self._ready.add(stream)   # send anything that was output before the browser connected
+        self.start()
+        self._wakeup()
+
+    def _output_available(self, stream: EventStream) -> None:
+        with self._lock:
+            self._ready.add(stream)
+        self._wakeup()
+
+    def _wakeup(self) -> None:
+        try:
+            self._wakeup_send.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass   # a wakeup is already pending
+
+    def _loop(self) -> None:
+        while self._running:
+            for key, events in self._selector.select(timeout=1.0):
+                if key.fileobj is self._wakeup_receive:
+                    try:
+                        while self._wakeup_receive.recv(4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                    continue
+                stream = key.data
+                if events & selectors.EVENT_READ and not self._receive(stream):
+                    continue
+                if events & selectors.EVENT_WRITE:
+                    self._flush(stream)
+            with self._lock:
+                added, self._added = self._added, []
+                ready, self._ready = self._ready, set()
+            for stream in added:
+                self._streams[stream.sock] = stream
+                self._selector.register(stream.sock, selectors.EVENT_READ, stream)
+            for stream in ready:
+                if stream.sock in self._streams:
+                    self._send_output(stream)
+            now = time.time()
+            for stream in list(self._streams.values()):
+                if now - stream.last_sent >= self.keepalive_interval:
+                    self._send(stream, self.keepalive)
+        for stream in list(self._streams.values()):
+            self._close(stream)
+
+    def _send_output(self, stream: EventStream) -> None:
+        conn = stream.conn
+        if not conn.io or not conn.player:
+            self._close(stream)   # the player has quit or was disconnected
+            return
+        try:
+            output = self.render(conn)
+        except Exception:
+            print("\n* Exception while rendering output for event stream:", file=sys.stderr)
+            print("".join(util.format_traceback()), file=sys.stderr)
+            self._close(stream)
+            return
+        if output:
+            self._send(stream, output)
+
+    def _send(self, stream: EventStream, data: bytes) -> None:
+        stream.pending.extend(data)
+        if len(stream.pending) > self.max_pending:
+            self._close(stream)
+            return
+        stream.last_sent = time.time()
+        self._flush(stream)
+
+    def _flush(self, stream: EventStream) -> None:
+        if stream.pending:
+            try:
+                sent = stream.sock.send(stream.pending)
+                del stream.pending[:sent]
+            except (BlockingIOError, ssl.SSLWantWriteError, ssl.SSLWantReadError):
+                pass
+            except OSError:
+                self._close(stream)
+                return
+        events = selectors.EVENT_READ | selectors.EVENT_WRITE if stream.pending else selectors.EVENT_READ
+        if self._selector.get_key(stream.sock).events != events:
+            self._selector.modify(stream.sock, events, stream)
+
+    def _receive(self, stream: EventStream) -> bool:
+        """Browsers don't send anything on an event stream; readable means it went away."""
+        try:
+            if stream.sock.recv(4096):
+                return True
+        except (BlockingIOError, ssl.SSLWantReadError, ssl.SSLWantWriteError):
+            return True
+        except OSError:
+            pass
+        self._close(stream)
+        return False
+
+    def _close(self, stream: EventStream) -> None:
+        if self._streams.pop(stream.sock, None) is None:
+            return
+        self._selector.unregister(stream.sock)
+        if stream.conn.io and stream.conn.io.output_listener is stream.listener:
+            stream.conn.io.output_listener = None
+        try:
+            stream.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        stream.sock.close()
@@ -11,7 +11,7 @@ from socketserver import ThreadingMixIn
 from email.utils import formatdate, parsedate
 from hashlib import md5
 from html import escape as html_escape
-from threading import Lock, Event
+from threading import Event, RLock
 from typing import Iterable, Sequence, Tuple, Any, Optional, Dict, Callable, List
 from urllib.parse import parse_qs
 from wsgiref.simple_server import make_server, WSGIRequestHandler, WSGIServer
@@ -29,6 +29,14 @@ __all__ = ["HttpIo", "TaleWsgiApp", "TaleWsgiAppBase", "WsgiStartResponseType"]
 
 WsgiStartResponseType = Callable[..., None]
 
+EVENTSOURCE_HEADERS = [('Content-Type', 'text/event-stream; charset=utf-8'),
+                       ('Cache-Control', 'no-cache'),
+                       # ('Transfer-Encoding', 'chunked'),    not allowed by wsgi
+                       ('X-Accel-Buffering', 'no')   # nginx
+                       ]
+EVENTSOURCE_PADDING = (":" + ' ' * 2050 + "\n\n").encode("utf-8")   # padding for older browsers
+EVENTSOURCE_KEEPALIVE = "data: keepalive\n\n".encode("utf-8")
+
 
 style_tags_html = {
     "<dim>": ("<span class='txt-dim'>", "</span>"),
@@ -66,27 +74,33 @@ class HttpIo(iobase.IoAdapterBase):
         self.wsgi_server = wsgi_server
         self.__html_to_browser = []    # type: List[str]   # the lines that need to be displayed in the player's browser
         self.__html_special = []       # type: List[str]   # special out of band commands (such as 'clear')
-        self.__html_to_browser_lock = Lock()
+        self.__html_to_browser_lock = RLock()   # streamed llm text is written from the llm workers
         self.__new_html_available = Event()
         self.__data_to_browser = []
+        self.output_listener = None    # type: Optional[Callable[[], None]]   # called when there's new output, by the event stream serving this player
 
     def destroy(self) -> None:
+        self._new_output()
+
+    def _new_output(self) -> None:
         self.__new_html_available.set()
+        if self.output_listener:
+            self.output_listener()
 
     def append_html_to_browser(self, text: str) -> None:
         with self.__html_to_browser_lock:
             self.__html_to_browser.append(text)
-            self.__new_html_available.set()
+            self._new_output()
 
     def append_html_special(self, text: str) -> None:
         with self.__html_to_browser_lock:
             self.__html_special.append(text)
-            self.__new_html_available.set()
+            self._new_output()
 
     def append_data_to_browser(self, data: str) -> None:
         with self.__html_to_browser_lock:
             self.__data_to_browser.append(data)
-            self.__new_html_available.set()
+            self._new_output()
 
     def get_html_to_browser(self) -> List[str]:
         with self.__html_to_browser_lock:
@@ -158,7 +172,7 @@ class HttpIo(iobase.IoAdapterBase):
                     self.__html_to_browser.append("<p>" + text + "</p>\n")
                 else:
                     self.__html_to_browser.append("<pre>" + text + "</pre>\n")
-            self.__new_html_available.set()
+            self._new_output()
         return ""    # the output is pushed to the browser via a buffer, rather than printed to a screen
 
     def output(self, *lines: str) -> None:
@@ -166,18 +180,19 @@ class HttpIo(iobase.IoAdapterBase):
         with self.__html_to_browser_lock:
             for line in lines:
                 self.output_no_newline(line)
-            self.__new_html_available.set()
+            self._new_output()
 
     def output_no_newline(self, text: str, new_paragraph = True) -> None:
         super().output_no_newline(text, new_paragraph)
         text = self.convert_to_html(text)
         if text == "\n":
             text = "<br>"
-        if new_paragraph:
-            self.__html_to_browser.append("<p>" + text + "</p>\n")
-        else:
-            self.__html_to_browser.append(text.replace("\\n", "<br>"))
-        self.__new_html_available.set()
+        with self.__html_to_browser_lock:
+            if new_paragraph:
+                self.__html_to_browser.append("<p>" + text + "</p>\n")
+            else:
+                self.__html_to_browser.append(text.replace("\\n", "<br>"))
+            self._new_output()
 
     def convert_to_html(self, line: str) -> str:
         """Convert style tags to html"""
@@ -351,51 +366,48 @@ class TaleWsgiAppBase:
         conn = session.get("player_connection")
         if not conn:
             return self.wsgi_internal_server_error_json(start_response, "not logged in")
-        start_response('200 OK', [('Content-Type', 'text/event-stream; charset=utf-8'),
-                                  ('Cache-Control', 'no-cache'),
-                                  # ('Transfer-Encoding', 'chunked'),    not allowed by wsgi
-                                  ('X-Accel-Buffering', 'no')   # nginx
-                                  ])
-        yield (":" + ' ' * 2050 + "\n\n").encode("utf-8")   # padding for older browsers
+        start_response('200 OK', list(EVENTSOURCE_HEADERS))
+        yield EVENTSOURCE_PADDING
         while self.driver.is_running():
             if conn.io and conn.player:
                 conn.io.wait_html_available(timeout=15)   # keepalives every 15 sec
             if not conn.io or not conn.player:
                 break
-            html = conn.io.get_html_to_browser()
-            special = conn.io.get_html_special()
-            data = conn.io.get_data_to_browser()
-            if html or special:
-                location = conn.player.location # type : Optional[Location]
-                if conn.io.dont_echo_next_cmd:
-                    special.append("noecho")
-                npc_names = ''
-                items = ''
-                exits = ''
-                if location:
-                    npc_names = ','.join([l.name for l in location.livings if l.alive and l.visible and l != conn.player])
-                    items = ','.join([i.name for i in location.items if i.visible])
-                    exits = ','.join(list(set([e.name for e in location.exits.values() if e.visible])))
-                response = {
-                    "text": "\n".join(html),
-                    "special": special,
-                    "turns": conn.player.turns,
-                    "location": location.title if location else "???",
-                    "location_image": location.avatar if location and location.avatar else "",
-                    "npcs": npc_names if location else '',
-                    "items": items if location else '',
-                    "exits": exits if location else '',
-                }
-                result = "event: text\nid: {event_id}\ndata: {data}"\
-                    .format(event_id=str(time.time()), data=json.dumps(response))
-                yield (result + "\n\n"+ ' ' * 150 + "\n\n").encode("utf-8")
-            elif data:
-                for d in data:
-                    result = "event: data\nid: {event_id}\ndata: {data}\n\n"\
-                        .format(event_id=str(time.time()), data=d)
-                    yield result.encode("utf-8")
-            else:
-                yield "data: keepalive\n\n".encode("utf-8")
+            yield self.eventsource_message(conn) or EVENTSOURCE_KEEPALIVE
+
+    def eventsource_message(self, conn: PlayerConnection) -> bytes:
+        """The pending output for the player as server-sent events. Empty if there's nothing to send."""
+        html = conn.io.get_html_to_browser()
+        special = conn.io.get_html_special()
+        data = conn.io.get_data_to_browser()
+        events = []
+        if html or special:
+            location = conn.player.location # type : Optional[Location]
+            if conn.io.dont_echo_next_cmd:
+                special.append("noecho")
+            npc_names = ''
+            items = ''
+            exits = ''
+            if location:
+                npc_names = ','.join([l.name for l in location.livings if l.alive and l.visible and l != conn.player])
+                items = ','.join([i.name for i in location.items if i.visible])
+                exits = ','.join(list(set([e.name for e in location.exits.values() if e.visible])))
+            response = {
+                "text": "\n".join(html),
+                "special": special,
+                "turns": conn.player.turns,
+                "location": location.title if location else "???",
+                "location_image": location.avatar if location and location.avatar else "",
+                "npcs": npc_names if location else '',
+                "items": items if location else '',
+                "exits": exits if location else '',
+            }
+            events.append("event: text\nid: {event_id}\ndata: {data}\n\n"
+                          .format(event_id=str(time.time()), data=json.dumps(response)))
+        for d in data:
+            events.append("event: data\nid: {event_id}\ndata: {data}\n\n"
+                          .format(event_id=str(time.time()), data=d))
+        return "".join(events).encode("utf-8")
 
     def wsgi_handle_tabcomplete(self, environ: Dict[str, Any], parameters: Dict[str, str],
                                 start_response: WsgiStartResponseType) -> Iterable[bytes]:
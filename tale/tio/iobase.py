@@ -8,6 +8,7 @@ import sys
 from typing import Union, Sequence, Any, Tuple, Optional, List
 import smartypants
 from .. import verbdefs
+from ..name_index import NameLookup
 from ..util import format_traceback
 
 
@@ -131,12 +132,8 @@ class IoAdapterBase:
         prefix = prefix.lower()
         player = self.player_connection.player
         verbs = {verb for verb in driver.current_verbs(player) if verb.startswith(prefix)}
-        livings = {living.name for living in player.location.livings if living.name.startswith(prefix)}
-        livings_aliases = {alias for living in player.location.livings for alias in living.aliases if alias.startswith(prefix)}
-        items = {item.name for item in player.location.items if item.name.startswith(prefix)}
-        items_aliases = {alias for item in player.location.items for alias in item.aliases if alias.startswith(prefix)}
+        names = NameLookup(player.location.living_names, player.location.item_names, player.inventory_names)
+        things = {name for name in names if name.startswith(prefix)}
         exits = {xt for xt in player.location.exits if xt.startswith(prefix)}
-        inventory = {item.name for item in player.inventory if item.name.startswith(prefix)}
-        inventory_aliases = {alias for item in player.inventory for alias in item.aliases if alias.startswith(prefix)}
         emotes = {verb for verb in verbdefs.VERBS if verb.startswith(prefix)}
-        return list(sorted(verbs | livings | items | exits | inventory | emotes | livings_aliases | items_aliases | inventory_aliases))
+        return list(sorted(verbs | things | exits | emotes))
@@ -13,13 +13,16 @@ import time
 import socket
 from html import escape as html_escape
 from socketserver import ThreadingMixIn
-from typing import Dict, Iterable, Any, List, Tuple
+from typing import Callable, Dict, Iterable, Any, List, Set, Tuple
 from wsgiref.simple_server import make_server, WSGIServer, WSGIRequestHandler
 
+from threading import Lock
 from .. import vfs
-from .if_browser_io import HttpIo, TaleWsgiAppBase, WsgiStartResponseType
+from .event_stream import EventStreamHub
+from .if_browser_io import HttpIo, TaleWsgiAppBase, WsgiStartResponseType, EVENTSOURCE_HEADERS, EVENTSOURCE_KEEPALIVE, EVENTSOURCE_PADDING
 from .. import __version__ as tale_version_str
 from ..driver import Driver
+from ..llm import llm_config
 from ..player import PlayerConnection
 
 __all__ = ["MudHttpIo", "TaleMudWsgiApp"]
@@ -77,6 +80,7 @@ class TaleMudWsgiApp(TaleWsgiAppBase):
     """
     def __init__(self, driver: Driver, use_ssl: bool, ssl_certs: Tuple[str, str, str]) -> None:
         super().__init__(driver)
+        self.event_streams = EventStreamHub(self.eventsource_message, EVENTSOURCE_KEEPALIVE)
         CustomWsgiServer.use_ssl = use_ssl
         if use_ssl and ssl_certs:
             CustomWsgiServer.ssl_cert_locations = ssl_certs
@@ -89,6 +93,18 @@ class TaleMudWsgiApp(TaleWsgiAppBase):
                                   handler_class=CustomRequestHandler, server_class=CustomWsgiServer)
         return wsgi_server
 
+    def __call__(self, environ: Dict[str, Any], start_response: WsgiStartResponseType) -> Iterable[bytes]:
+        if environ.get('PATH_INFO', '') == "/metrics" and llm_config.params.get("METRICS_ENDPOINT", True):
+            return self.wsgi_handle_metrics(environ, start_response)
+        return super().__call__(environ, start_response)
+
+    def wsgi_handle_metrics(self, environ: Dict[str, Any], start_response: WsgiStartResponseType) -> Iterable[bytes]:
+        # tick timings and queue depths, for prometheus to scrape
+        if environ.get("REQUEST_METHOD") != "GET":
+            return self.wsgi_invalid_request(start_response)
+        start_response("200 OK", [('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')])
+        return [self.driver.profiler.prometheus().encode("utf-8")]
+
     def wsgi_handle_story(self, environ: Dict[str, Any], parameters: Dict[str, str],
                           start_response: WsgiStartResponseType) -> Iterable[bytes]:
         session = environ["wsgi.session"]
@@ -106,7 +122,16 @@ class TaleMudWsgiApp(TaleWsgiAppBase):
             return self.wsgi_internal_server_error_json(start_response, "not logged in")
         if not conn or not conn.player or not conn.io:
             raise SessionMiddleware.CloseSession("{\"error\": \"no longer a valid connection\"}", "application/json")
-        return super().wsgi_handle_eventsource(environ, parameters, start_response)
+        detach_socket = environ.get("tale.detach_socket")
+        if not detach_socket:
+            return super().wsgi_handle_eventsource(environ, parameters, start_response)
+        start_response('200 OK', list(EVENTSOURCE_HEADERS))
+        return self._hand_over_eventsource(detach_socket, conn)
+
+    def _hand_over_eventsource(self, detach_socket: Callable[[], socket.socket], conn: PlayerConnection) -> Iterable[bytes]:
+        # the headers and padding go out through the wsgi server, after that the event stream hub takes the socket
+        yield EVENTSOURCE_PADDING
+        self.event_streams.add(detach_socket(), conn)
 
     def wsgi_handle_quit(self, environ: Dict[str, Any], parameters: Dict[str, str],
                          start_response: WsgiStartResponseType) -> Iterable[bytes]:
@@ -149,10 +174,20 @@ class TaleMudWsgiApp(TaleWsgiAppBase):
 
 
 class CustomRequestHandler(WSGIRequestHandler):
-    """A wsgi request handler that doesn't spam the log."""
+    """A wsgi request handler that doesn't spam the log, and can hand its socket over to the app."""
     def log_message(self, format: str, *args: Any):
         pass
 
+    def get_environ(self) -> Dict[str, Any]:
+        environ = super().get_environ()
+        environ["tale.detach_socket"] = self.detach_socket
+        return environ
+
+    def detach_socket(self) -> socket.socket:
+        """Keep the connection open after the request is done; the caller takes over the socket."""
+        self.server.detach(self.connection)
+        return self.connection
+
 
 class CustomWsgiServer(ThreadingMixIn, WSGIServer):
     """
@@ -164,6 +199,8 @@ class CustomWsgiServer(ThreadingMixIn, WSGIServer):
     ssl_cert_locations = ("./certs/localhost_cert.pem", "./certs/localhost_key.pem", "")    # certfile, keyfile, certpassword
 
     def __init__(self, server_address, rh_class):
+        self.detached = set()   # type: Set[socket.socket]
+        self.detached_lock = Lock()
         self.address_family = socket.AF_INET
         if server_address[0][0] == '[' and server_address[0][-1] == ']':
             self.address_family = socket.AF_INET6
@@ -179,6 +216,17 @@ class CustomWsgiServer(ThreadingMixIn, WSGIServer):
             self.socket = ctx.wrap_socket(self.socket, server_side=True)
         return super().server_bind()
 
+    def detach(self, request: socket.socket) -> None:
+        with self.detached_lock:
+            self.detached.add(request)
+
+    def shutdown_request(self, request: socket.socket) -> None:
+        with self.detached_lock:
+            if request in self.detached:
+                self.detached.remove(request)
+                return   # handed over, not ours to close
+        super().shutdown_request(request)
+
 
 class SessionMiddleware:
     """Wsgi middleware that injects session cookie logic."""
@@ -1,6 +1,8 @@
 import os
 import shutil
 
+from tale.resources_utils import resource_index
+
 
 dialogue_splitter = ' &lt;:&gt; '
 
@@ -72,6 +74,7 @@ def _find_image(image_name: str) -> str:
 def copy_web_resources(gamepath: str):
     # copy the resources folder to the resources folder in the web folder
     shutil.copytree(os.path.join(gamepath, resource_folder), os.path.join(web_resources_path, resource_folder), dirs_exist_ok=True)
+    resource_index.refresh(force=True)
     
 def clear_resources():
     resource_path = os.path.join(web_resources_path, resource_folder)
@@ -83,14 +86,17 @@ def clear_resources():
         
         if os.path.isfile(item_path):
             os.remove(item_path)
+    resource_index.refresh(force=True)
 
 def copy_single_image(gamepath: str, image_name: str) -> str:
     from_path = os.path.join(gamepath, resource_folder, image_name)
     if not os.path.exists(from_path):
         return
     to_path = os.path.join(web_resources_path, resource_folder)
-    return shutil.copy(from_path, to_path)
+    copied = shutil.copy(from_path, to_path)
+    resource_index.add(image_name)
+    return copied
 
 def _check_file_exists(filename: str) -> bool:
-    check_path = os.path.join(web_resources_path, resource_folder, filename)
-    return os.path.exists(check_path)
\ No newline at end of file
+    resource_index.set_folder(os.path.join(web_resources_path, resource_folder))
+    return resource_index.exists(filename)
\ No newline at end of file
@@ -1,3 +1,5 @@
+import random
+
 from tale.base import Location
 from tale.coord import Coord
 
@@ -7,6 +9,8 @@ class Zone():
     def __init__(self, name: str, description: str = '') -> None:
         self.description = description
         self.locations = dict()  # type: dict[str, Location]
+        self._location_list = [] # type: list[Location] # the locations again, for random picks
+        self._locations_seen = 0 # size of the locations dict when _location_list was last updated
         self.level = 1 # average level of the zone
         self.races = [] # type list[str] # common races to be encountered in the zone
         self.items = [] # type list[str] # common items to find in the zone
@@ -23,6 +27,8 @@ class Zone():
         if location.name in self.locations:
             return False
         self.locations[location.name] = location
+        self._location_list.append(location)
+        self._locations_seen = len(self.locations)
         return True
     
     def remove_location(self, name: str) -> bool:
@@ -30,8 +36,19 @@ class Zone():
         if name not in self.locations:
             return False
         self.locations[name] = None
+        self._update_location_list()
         return True
 
+    def random_location(self) -> Location:
+        """ A random location of the zone. Raises IndexError if the zone has none."""
+        if len(self.locations) != self._locations_seen:
+            self._update_location_list()   # locations were put in the dict directly
+        return random.choice(self._location_list)
+
+    def _update_location_list(self) -> None:
+        self._location_list = [location for location in self.locations.values() if location]
+        self._locations_seen = len(self.locations)
+
     def get_location(self, name: str) -> Location:
         return self.locations.get(name, None)
     
@@ -39,8 +56,8 @@ class Zone():
         return {"description":self.description,
                 "level":self.level,
                 "mood":self.mood,
-                "races":self.races,
-                "items":self.items,
+                "races":list(self.races),
+                "items":list(self.items),
                 "size":self.size,
                 "center":self.center.as_tuple(),
                 "lore":self.lore,
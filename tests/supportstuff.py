@@ -33,6 +33,22 @@ class FakeDriver(driver.Driver):
         assert len(self.commands.get([])) > 0
 
 
+class PendingActionsListener(pubsub.Listener):
+    """ Executes pending actions like the driver does. Subscribe it in setup, and unsubscribe it in teardown.
+        While subscribed it's the only one running them, and not the drivers that other tests keep around."""
+    topic = pubsub.topic("driver-pending-actions")
+
+    def subscribe(self) -> None:
+        self._others, self.topic.subscribers = self.topic.subscribers, set()
+        self.topic.subscribe(self)
+
+    def unsubscribe(self) -> None:
+        self.topic.subscribers = self._others
+
+    def pubsub_event(self, topicname, event):
+        event()
+
+
 class Wiretap(pubsub.Listener):
     def __init__(self, target: base.Living) -> None:
         self.msgs = []  # type: List[Any]
@@ -62,6 +78,22 @@ class MsgTraceNPC(base.Living):
         self.messages.append(message)
         return self
 
+class QueuedScheduler():
+    """ Runs the submitted jobs when asked to, like workers finishing later."""
+    is_async = True
+    pending = 0
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, task, *, priority, owner=None, on_complete=None):
+        self.jobs.append((task, on_complete))
+
+    def run_next(self):
+        task, on_complete = self.jobs.pop(0)
+        result = task()
+        return on_complete(result) if on_complete else result
+
 class FakeIoUtil(IoUtil):
     def __init__(self, response: list = []) -> None:
         super().__init__()
@@ -0,0 +1,103 @@
+from tale.base import Location
+from tale.llm import llm_governor
+from tale.llm.action_batcher import ActionBatcher
+from tale.llm.llm_governor import LlmGovernor
+
+
+class FakeClock():
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeScheduler():
+    is_async = True
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, task, *, priority, owner=None, on_complete=None):
+        self.jobs.append((priority, owner))
+        on_complete(task())
+
+
+class FakeLlmUtil():
+    def __init__(self):
+        self.scheduler = FakeScheduler()
+        self.governor = LlmGovernor()
+        self.requests = []
+
+    def perform_idle_action(self, **args):
+        self.requests.append([args['character_name']])
+        return args['character_name'] + ' idles'
+
+    def perform_reaction(self, **args):
+        self.requests.append([args['character_name']])
+        return args['character_name'] + ' reacts\n'
+
+    def perform_group_actions(self, location, requests):
+        self.requests.append([request['character_name'] for request in requests])
+        return {request['character_name'].lower(): request['character_name'] + ' acts' for request in requests}
+
+
+class FakeNpc():
+    def __init__(self, name, location):
+        self.name = name.lower()
+        self.location = location
+        self.results = []
+
+
+class TestActionBatcher():
+
+    def setup_method(self):
+        self.clock = FakeClock()
+        self.llm_util = FakeLlmUtil()
+        self.batcher = ActionBatcher(self.llm_util, window=2, clock=self.clock)
+        self.tavern = Location('tavern')
+
+    def add(self, npc, kind=llm_governor.KIND_IDLE, location=None):
+        args = dict(character_name=npc.name.capitalize(), location=location or npc.location)
+        self.batcher.add(npc, kind, args, npc.results.append)
+
+    def test_batch_per_location(self):
+        bob, alice = FakeNpc('Bob', self.tavern), FakeNpc('Alice', self.tavern)
+        street = Location('street')
+        carl = FakeNpc('Carl', street)
+        self.add(bob)
+        self.add(alice, llm_governor.KIND_REACTION)
+        self.add(carl)
+        assert self.batcher.flush() == 0, "window isn't over yet"
+        self.clock.now += 2
+        assert self.batcher.flush() == 2
+        assert self.llm_util.requests == [['Bob', 'Alice'], ['Carl']]
+        assert bob.results == ['Bob acts']
+        assert alice.results == ['Alice acts\n'], "reactions end with a newline, like perform_reaction's"
+        assert carl.results == ['Carl idles'], "a single npc gets the usual request"
+        assert self.batcher.batches == 1
+        assert self.batcher.pending == 0
+
+    def test_moved_away(self):
+        bob, alice = FakeNpc('Bob', self.tavern), FakeNpc('Alice', self.tavern)
+        self.add(bob)
+        self.add(alice)
+        alice.location = Location('street')
+        self.batcher.flush(force=True)
+        assert self.llm_util.requests == [['Bob']]
+        assert alice.results == []
+
+    def test_latest_only_and_max_batch(self):
+        self.batcher.max_batch = 3
+        bob = FakeNpc('Bob', self.tavern)
+        self.add(bob)
+        self.add(bob)
+        assert self.batcher.pending == 1
+        self.add(FakeNpc('Alice', self.tavern))
+        self.add(FakeNpc('Carl', self.tavern))
+        assert self.llm_util.requests == [['Bob', 'Alice', 'Carl']], "sent right away when full"
+
+    def test_enabled(self):
+        assert self.batcher.enabled
+        self.llm_util.scheduler.is_async = False
+        assert not self.batcher.enabled
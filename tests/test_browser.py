@@ -1,10 +1,15 @@
 
 
+import json
+import socket
+import threading
+import time
 from os import getcwd
 from wsgiref.simple_server import WSGIServer
-from tale.player import PlayerConnection
-from tale.tio.if_browser_io import HttpIo, TaleWsgiApp
-from tale.tio.mud_browser_io import TaleMudWsgiApp
+from tale.player import Player, PlayerConnection
+from tale.tio.event_stream import EventStreamHub
+from tale.tio.if_browser_io import HttpIo, TaleWsgiApp, EVENTSOURCE_KEEPALIVE
+from tale.tio.mud_browser_io import CustomRequestHandler, CustomWsgiServer, MemorySessionFactory, MudHttpIo, SessionMiddleware, TaleMudWsgiApp
 from tests.supportstuff import FakeDriver
 
 
@@ -28,6 +33,22 @@ class TestHttpIo:
         assert http_io.get_html_to_browser()[0] == "<p>Hello World!</p>\n"
 
 
+    def test_streamed_output_from_other_threads(self):
+        http_io = HttpIo(player_connection=self.player_conn, wsgi_server=self.wsgi_server)
+        def stream():
+            for _ in range(2000):
+                http_io.output_no_newline("x", new_paragraph=False)
+        workers = [threading.Thread(target=stream) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        received = []
+        while any(worker.is_alive() for worker in workers):
+            received.extend(http_io.get_html_to_browser())
+        for worker in workers:
+            worker.join()
+        received.extend(http_io.get_html_to_browser())
+        assert len(received) == 8000, 'no chunk is lost while the output is taken'
+
     def test_render_output_dialogue_token(self):
         http_io = HttpIo(player_connection=self.player_conn, wsgi_server=self.wsgi_server)
 
@@ -70,5 +91,102 @@ class TestHttpIo:
         http_io.send_data('{"test": "test"}')
 
         assert http_io.get_data_to_browser()[0] == '{"test": "test"}'
-        
 
+    def test_metrics(self):
+        driver = FakeDriver()
+        driver.profiler.record('tick', 0.01)
+        wsgi_app = SessionMiddleware(TaleMudWsgiApp(driver=driver, use_ssl=False, ssl_certs=None), MemorySessionFactory())
+        responses = []
+        body = wsgi_app({'PATH_INFO': '/metrics', 'REQUEST_METHOD': 'GET'}, lambda status, headers: responses.append((status, headers)))
+        status, headers = responses[0]
+        assert status == '200 OK'
+        assert dict(headers)['Content-Type'].startswith('text/plain; version=0.0.4')
+        text = b''.join(body).decode('utf-8')
+        assert 'tale_seconds_count{phase="tick"} 1' in text
+        assert 'tale_deferreds 0.0' in text
+        assert not any(name == 'Set-Cookie' for name, _ in headers), 'scraping must not create sessions'
+
+
+class TestEventStreams:
+
+    def _read_until(self, sock: socket.socket, marker: bytes, timeout: float = 5) -> bytes:
+        sock.settimeout(timeout)
+        received = b""
+        while marker not in received:
+            chunk = sock.recv(65536)
+            assert chunk, "connection closed before " + str(marker)
+            received += chunk
+        return received
+
+    def _connection(self) -> PlayerConnection:
+        conn = PlayerConnection()
+        conn.player = Player("julie", "f")
+        conn.io = MudHttpIo(conn)
+        return conn
+
+    def test_hub_streams_output(self):
+        conn = self._connection()
+        hub = EventStreamHub(TaleMudWsgiApp(driver=FakeDriver(), use_ssl=False, ssl_certs=None).eventsource_message, EVENTSOURCE_KEEPALIVE)
+        server_side, browser = socket.socketpair()
+        try:
+            conn.io.output("before connecting")
+            hub.add(server_side, conn)
+            assert b"before connecting" in self._read_until(browser, b"\n\n")
+            conn.io.send_data('{"test": "data"}')
+            event = self._read_until(browser, b"\n\n").decode("utf-8")
+            assert event.startswith("event: data\n")
+            assert '{"test": "data"}' in event
+            assert hub.num_streams == 1
+            browser.close()
+            for _ in range(50):
+                if hub.num_streams == 0:
+                    break
+                time.sleep(0.02)
+            assert hub.num_streams == 0
+            assert conn.io.output_listener is None
+        finally:
+            hub.stop()
+            browser.close()
+
+    def test_hub_keepalive(self):
+        conn = self._connection()
+        hub = EventStreamHub(lambda conn: b"", EVENTSOURCE_KEEPALIVE, keepalive_interval=0.1)
+        server_side, browser = socket.socketpair()
+        try:
+            hub.add(server_side, conn)
+            assert self._read_until(browser, EVENTSOURCE_KEEPALIVE, timeout=3)
+        finally:
+            hub.stop()
+            browser.close()
+
+    def test_eventsource_handed_over(self):
+        conn = self._connection()
+        app = TaleMudWsgiApp(driver=FakeDriver(), use_ssl=False, ssl_certs=None)
+        sessions = MemorySessionFactory()
+        sessions.storage["test-session"] = {"id": "test-session", "player_connection": conn}
+        server = CustomWsgiServer(("127.0.0.1", 0), CustomRequestHandler)
+        server.set_app(SessionMiddleware(app, sessions))
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        browser = socket.create_connection(server.server_address)
+        try:
+            browser.sendall(b"GET /tale/eventsource HTTP/1.1\r\nHost: localhost\r\nCookie: tale_session_id=test-session\r\n\r\n")
+            headers = self._read_until(browser, b"\r\n\r\n")
+            assert b"200 OK" in headers
+            assert b"text/event-stream" in headers
+            for _ in range(50):
+                if app.event_streams.num_streams == 1 and not server.detached:
+                    break   # the wsgi server lets go of the socket after the handler returns
+                time.sleep(0.02)
+            assert app.event_streams.num_streams == 1
+            assert len(server.detached) == 0
+            conn.io.output("Hello through the hub")
+            event = self._read_until(browser, b"Hello through the hub").decode("utf-8")
+            assert "event: text" in event
+            data = event[event.index("event: text"):].split("data: ", 1)[1].split("\n")[0]
+            assert json.loads(data)["text"] == "<p>Hello through the hub</p>\n"
+        finally:
+            browser.close()
+            app.event_streams.stop()
+            server.shutdown()
+            server.server_close()
@@ -2,6 +2,7 @@
 
 from tale.base import Living, Location
 from tale.llm.contexts.ActionContext import ActionContext
+from tale.llm.contexts.CombatContext import CombatContext
 from tale.llm.contexts.DungeonLocationsContext import DungeonLocationsContext
 from tale.llm.contexts.EvokeContext import EvokeContext
 from tale.llm.contexts.FollowContext import FollowContext
@@ -111,4 +112,33 @@ class TestPromptContexts():
         assert location.name in result
         assert location.description in result
         assert story_context in result
-        assert story_type in result
\ No newline at end of file
+        assert story_type in result
+
+    def test_evoke_context_budget(self):
+        context = EvokeContext(story_context='context', history='old events. ' * 50 + 'latest event', time_of_day='night')
+        context.budget = 20
+        result = context.to_prompt_string()
+        assert result.startswith('Story context:context; History:')
+        assert 'latest event; Time of day:night;' in result
+        assert len(result) <= 80
+
+    def test_world_generation_context_location(self):
+        context = WorldGenerationContext(story_context='context', story_type='type', world_info='info', world_mood=1, location='Hall, ' + 'a long hall. ' * 50)
+        assert context.to_prompt_string().startswith('Story context:context; Story type:type; World info:info; World mood: slightly friendly;Location:Hall, a long hall.')
+        context.budget = 25
+        result = context.to_prompt_string()
+        assert 'Story type:type; ' in result
+        assert len(result) <= 100, 'the location is trimmed first'
+
+    def test_evoke_context_with_combat_context(self):
+        attacker = Living(name='attacker', gender='f')
+        defender = Living(name='defender', gender='m')
+        combat = CombatContext(attackers=[attacker], defenders=[defender], location_description='a long hall. ' * 50)
+        context = EvokeContext(story_context='context', history='', extra_context=combat)
+        assert 'Attackers: ' in context.to_prompt_string()
+        context.budget = 40
+        result = context.to_prompt_string()
+        assert 'attacker: Health:' in result
+        assert 'defender: Health:' in result
+        assert len(result) <= 160
+
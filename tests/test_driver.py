@@ -8,6 +8,8 @@ Copyright by Irmen de Jong (irmen@razorvine.net)
 import datetime
 import heapq
 import os
+import threading
+import time
 import unittest
 from tale import story
 
@@ -18,8 +20,11 @@ import tale.driver_if
 import tale.driver_mud
 from tale.player import Player, PlayerConnection
 import tale.util
+from tale.deferred_queue import DeferredQueue
 from tale.cmds import cmd, wizcmd, disabled_in_gamemode
+from tale.llm.dynamic_story import DynamicStory
 from tale.story import GameMode, StoryBase
+from tale.zone import Zone
 from tests.supportstuff import Thing, FakeDriver
 
 
@@ -64,6 +69,32 @@ class TestDriverCreation(unittest.TestCase):
         self.assertIsNone(d.user_resources)
 
 
+class TestMudMainLoop(unittest.TestCase):
+    def test_pending_action_wakes_up_loop(self):
+        d = tale.driver_mud.MudDriver()
+        d.story = StoryBase()
+        d.story.config.server_tick_time = 10.0
+        ticks = []
+        d._server_tick = lambda: ticks.append(time.time())
+        loop = threading.Thread(target=d.main_loop, args=(None,), daemon=True)
+        d._stop_mainloop = False
+        loop.start()
+        try:
+            time.sleep(0.1)
+            self.assertEqual(1, len(ticks), "first tick is immediate, the next one is 10 seconds away")
+            done = threading.Event()
+            sent = time.time()
+            tale.driver.topic_pending_actions.send(lambda: done.set())
+            self.assertTrue(done.wait(2.0))
+            self.assertLess(time.time() - sent, 1.0)
+            self.assertEqual(1, len(ticks))
+        finally:
+            d._stop_mainloop = True
+            d.wakeup.set()
+            loop.join(2.0)
+        self.assertFalse(loop.is_alive())
+
+
 class TestDeferreds(unittest.TestCase):
     def testSortable(self):
         t1 = datetime.datetime(1995, 1, 1)
@@ -88,7 +119,7 @@ class TestDeferreds(unittest.TestCase):
         with self.assertRaises(ValueError):
             driver.defer("blerp", thing.move)
         driver.defer(3601, thing.move)
-        deferred = driver.deferreds[0]
+        deferred = list(driver.deferreds)[0]
         after = deferred.due_gametime - now
         self.assertEqual(3601, after.seconds)
 
@@ -99,7 +130,7 @@ class TestDeferreds(unittest.TestCase):
         driver.game_clock = tale.util.GameDateTime(now, 1)
         due = driver.game_clock.plus_realtime(datetime.timedelta(seconds=3601))
         driver.defer(due, thing.move)
-        deferred = driver.deferreds[0]
+        deferred = list(driver.deferreds)[0]
         after = deferred.due_gametime - now
         self.assertEqual(3601, after.seconds)
 
@@ -193,6 +224,70 @@ class TestDeferreds(unittest.TestCase):
         self.assertTrue(d.owner.startswith("module:"))
         self.assertEqual((2, 3), d.periodical)
 
+    def test_queue_pop_due(self):
+        t = datetime.datetime(2000, 1, 1)
+        queue = DeferredQueue(resolution=1.0)
+        d1 = tale.driver.Deferred(t + datetime.timedelta(seconds=2.5), os.getcwd, None, None)
+        d2 = tale.driver.Deferred(t + datetime.timedelta(seconds=0.5), os.getcwd, None, None)
+        d3 = tale.driver.Deferred(t + datetime.timedelta(seconds=2.7), os.getcwd, None, None)
+        d4 = tale.driver.Deferred(t + datetime.timedelta(seconds=60), os.getcwd, None, None)
+        for d in (d1, d2, d3, d4):
+            queue.add(d)
+        queue.add(d1)
+        self.assertEqual(4, len(queue))
+        self.assertEqual(d2.due_gametime, queue.next_due())
+        self.assertEqual([], queue.pop_due(t))
+        due = queue.pop_due(t + datetime.timedelta(seconds=2.6))
+        self.assertEqual([d2, d1], due)
+        self.assertTrue(d1 is due[1])
+        self.assertNotIn(d1, queue)
+        self.assertIn(d3, queue)
+        self.assertEqual(d3.due_gametime, queue.next_due())
+        self.assertEqual([d3], queue.pop_due(t + datetime.timedelta(seconds=3)))
+        self.assertTrue(queue.cancel(d4))
+        self.assertFalse(queue.cancel(d4))
+        self.assertEqual(0, len(queue))
+        self.assertIsNone(queue.next_due())
+        self.assertEqual([], queue.pop_due(t + datetime.timedelta(hours=1)))
+
+    def test_queue_remove_owner(self):
+        t = datetime.datetime(2000, 1, 1)
+        thing1 = Thing()
+        thing2 = Thing()
+        queue = DeferredQueue()
+        for seconds in range(5):
+            queue.add(tale.driver.Deferred(t + datetime.timedelta(seconds=seconds), thing1.append, [seconds], None))
+            queue.add(tale.driver.Deferred(t + datetime.timedelta(seconds=seconds), thing2.append, [seconds], None))
+        self.assertEqual(5, queue.remove_owner(thing1))
+        self.assertEqual(0, queue.remove_owner(thing1))
+        self.assertEqual(5, len(queue))
+        self.assertTrue(all(d.owner is thing2 for d in queue.pop_due(t + datetime.timedelta(seconds=10))))
+
+    def test_periodicals_fire_in_order(self):
+        thing = Thing()
+        driver = FakeDriver()
+        driver.game_clock = tale.util.GameDateTime(datetime.datetime(2000, 1, 1), 1)
+        driver.story = StoryBase()
+        driver.story.config.server_tick_time = 1.0
+        previous_driver = tale.driver.mud_context.driver
+        tale.driver.mud_context.driver = driver
+        self.addCleanup(setattr, tale.driver.mud_context, "driver", previous_driver)
+        driver.defer(2.5, thing.append, "b")
+        driver.defer(2.2, thing.append, "a")
+        driver.defer(10, thing.append, "c")
+        periodical = driver.defer((1, 3, 3), thing.append, "p")
+        driver._server_tick()
+        driver._server_tick()
+        self.assertEqual(["p"], thing.x)
+        driver._server_tick()
+        self.assertEqual(["p", "a", "b"], thing.x)
+        self.assertTrue(driver.cancel_deferred(periodical))
+        for _ in range(10):
+            driver._server_tick()
+        self.assertEqual(["p", "a", "b", "c"], thing.x)
+        self.assertEqual(0, len(driver.deferreds))
+
+
 @cmd("test1")
 @disabled_in_gamemode(GameMode.IF)
 def func1(player, parsed, ctx):
@@ -245,6 +340,44 @@ class TestCommands(unittest.TestCase):
         self.assertEqual({"verb2"}, set(wiz.keys()))
 
 
+class TestLocationGeneration(unittest.TestCase):
+
+    class FakeResponse():
+        def __init__(self, exits):
+            self.new_locations = [exit.target for exit in exits]
+            self.exits = exits
+            self.npcs = []
+            self.items = []
+
+    def test_prepared_on_driver_thread(self):
+        driver = FakeDriver()
+        story = DynamicStory()
+        driver.story = story
+        zone = Zone('zone')
+        story.add_zone(zone)
+        hall = tale.base.Location('hall')
+        cellar = tale.base.Location('cellar')
+        cellar.built = False
+        story.add_location(hall, 'zone')
+        story.add_location(cellar, 'zone')
+        story.catalogue.add_creature({'name': 'rat'})
+        requests = []
+        def build_location(**args):
+            requests.append(args)
+            return self.FakeResponse([tale.base.Exit('down', tale.base.Location('crypt'), 'stairs down')]), None
+        driver.llm_util.build_location = build_location
+        driver.llm_util.get_neighbor_or_generate_zone = lambda **args: zone
+        task = driver._prepare_target_location(zone, hall, cellar)
+        story.catalogue.add_creature({'name': 'bat'})   # meanwhile, on the driver thread
+        result = task()
+        assert [creature['name'] for creature in requests[0]['world_creatures']] == ['rat']
+        assert not cellar.built, "nothing is added until it's committed"
+        assert driver._commit_generated_location(cellar, zone, result)
+        assert cellar.built
+        assert 'down' in cellar.exits
+        assert not driver._commit_generated_location(cellar, zone, result), 'only once'
+
+
 if __name__ == "__main__":
     # import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
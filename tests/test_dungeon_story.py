@@ -67,6 +67,7 @@ class TestDungeonStory():
                            config=parse_utils.load_story_config(parse_utils.load_json(f'tests/files/empty_world/story_config.json')))
         self.llm_util.set_story(self.story)
         self.story.init(driver=driver)
+        self.layout_generator = mock_layout_generator
 
         test_zone = list(self.story._zones.values())[0]
         assert len(test_zone.locations) == 5
@@ -80,6 +81,32 @@ class TestDungeonStory():
         assert len(world_json["mob_spawners"]) == 1
         assert len(world_json["item_spawners"]) == 1
 
+    def test_pregenerate_level(self):
+        self.test_load_story()
+        self.llm_util.io_util.set_response(['{"rooms": [' + ', '.join(['{"index": %d, "name": "Cave %d", "description": "A cave"}' % (i, i) for i in range(5)]) + ']}'])
+        next_level = Zone('level 2')
+        future = self.story.pregenerate_level(next_level)
+        assert future.done()
+        assert 'level 2' in self.story._prepared_levels
+        generated_layouts = self.layout_generator.generate.call_count
+
+        assert self.story.add_zone(next_level)
+        assert self.layout_generator.generate.call_count == generated_layouts, 'the prepared level is used'
+        assert 'level 2' not in self.story._prepared_levels
+        assert len(next_level.locations) == 5
+        assert next_level.get_location('Cave 4').description == 'A cave'
+
+    def test_one_layout_at_a_time(self):
+        self.test_load_story()
+        layout = self.get_layout()
+        def generate():
+            assert self.story._layout_lock.locked()
+            return layout
+        self.layout_generator.generate.side_effect = generate
+        self.llm_util.io_util.set_response(['{"rooms": [' + ', '.join(['{"index": %d, "name": "Cave %d", "description": "A cave"}' % (i, i) for i in range(5)]) + ']}'])
+        assert self.story._prepare_level(Zone('level 2'))[0] == layout
+        assert not self.story._layout_lock.locked()
+
     def get_layout(self) -> Layout:
 
         layout = Layout(Coord(0, 0, 0))
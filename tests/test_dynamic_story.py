@@ -1,7 +1,9 @@
 from tale.base import Location
 from tale.coord import Coord
-from tale.llm.dynamic_story import DynamicStory
+from tale.llm import llm_config
+from tale.llm.dynamic_story import Catalogue, DynamicStory
 from tale.zone import Zone
+from tests.supportstuff import FakeDriver
 
 
 class TestDynamicStory():
@@ -44,6 +46,56 @@ class TestDynamicStory():
         story.add_location(test_location, 'zone')
         assert(story.find_location('test') == test_location)
 
+    def test_find_zone(self):
+        story = DynamicStory()
+        test_location = Location('test')
+        zone1 = Zone('zone1')
+        zone2 = Zone('zone2')
+        story.add_zone(zone1)
+        story.add_zone(zone2)
+        story.add_location(test_location, 'zone2')
+        assert(story.find_zone('test') == zone2)
+        assert(story.zone_info(location='test') == zone2.get_info())
+        assert(story.find_zone('missing') == None)
+        assert(story.find_location('missing') == None)
+
+    def test_find_zone_added_directly(self):
+        """ locations added to a zone without going through the story are still found"""
+        story = DynamicStory()
+        zone = Zone('zone')
+        story.add_zone(zone)
+        test_location = Location('test')
+        zone.add_location(test_location)
+        assert(story.find_zone('test') == zone)
+        assert(story.find_location('test') == test_location)
+        moved_to = Zone('zone2')
+        story.add_zone(moved_to)
+        zone.remove_location('test')
+        moved_to.add_location(test_location)
+        assert(story.find_zone('test') == moved_to)
+
+    def test_add_zone_indexes_locations(self):
+        story = DynamicStory()
+        zone = Zone('zone')
+        test_location = Location('test')
+        zone.add_location(test_location)
+        story.add_zone(zone)
+        assert(story._location_zones['test'] == zone)
+
+    def test_locations_within(self):
+        story = DynamicStory()
+        for x in range(-3, 4):
+            for y in range(-3, 4):
+                location = Location(f'loc_{x}_{y}')
+                location.world_location = Coord(x, y, 0)
+                story.add_location(location)
+        names = sorted([location.name for location in story.locations_within(Coord(0, 0, 0), 1)])
+        assert(names == ['loc_-1_0', 'loc_0_-1', 'loc_0_0', 'loc_0_1', 'loc_1_0'])
+        assert(len(story.locations_within(Coord(0, 0, 0), 2)) == 13)
+        assert(len(story.locations_within(Coord(3, 3, 0), 1)) == 3)
+        # radius large enough to take the scan path
+        assert(len(story.locations_within(Coord(0, 0, 0), 12)) == 49)
+
     def test_neighbors_for_location(self):
         story = DynamicStory()
         story._locations = dict()
@@ -78,3 +130,45 @@ class TestDynamicStory():
         assert(story.check_setting('steampunk') == '')
         assert(story.check_setting('cyberpunk') == '')
         assert(story.check_setting('western') == '')
+
+    def test_autosave(self):
+        driver = FakeDriver()
+        story = DynamicStory()
+        story.config.day_night = False
+        story.config.random_events = False
+        story.config.context = ''
+        story.init(driver)
+        assert not [d for d in driver.deferreds if d.action == 'autosave']
+        interval = llm_config.params.get('AUTOSAVE_INTERVAL', 0)
+        llm_config.params['AUTOSAVE_INTERVAL'] = 300
+        try:
+            story.init(driver)
+        finally:
+            llm_config.params['AUTOSAVE_INTERVAL'] = interval
+        autosaves = [d for d in driver.deferreds if d.action == 'autosave']
+        assert len(autosaves) == 1
+        assert autosaves[0].owner is story
+        assert autosaves[0].periodical == (300, 300)
+
+
+class TestCatalogue():
+
+    def test_add_and_get(self):
+        catalogue = Catalogue()
+        assert(catalogue.add_item({'name': 'sword', 'value': 1}))
+        assert(not catalogue.add_item({'name': 'sword', 'value': 2}))
+        assert(catalogue.add_creature({'name': 'rat'}))
+        assert(not catalogue.add_creature({'name': 'rat'}))
+        assert(catalogue.get_item('sword')['value'] == 1)
+        assert(catalogue.get_creature('rat') == {'name': 'rat'})
+        assert(catalogue.get_item('shield') == None)
+        assert(len(catalogue.get_items()) == 1)
+
+    def test_set_lists(self):
+        catalogue = Catalogue()
+        catalogue.items = [{'name': 'sword'}, {'name': 'shield'}]
+        catalogue.creatures = [{'name': 'rat'}]
+        assert(catalogue.get_item('shield') == {'name': 'shield'})
+        assert(catalogue.get_creature('rat') == {'name': 'rat'})
+        assert(not catalogue.add_item({'name': 'sword'}))
+        assert(catalogue._items == [{'name': 'sword'}, {'name': 'shield'}])
@@ -1,23 +1,33 @@
 import base64
 import json
+import os
+import threading
 import responses
+from tale import pubsub
 from tale.image_gen.automatic1111 import Automatic1111
 from tale.image_gen.comfyui import ComfyUi
+from tale.image_gen.image_queue import ImageQueue
 from tale.llm.LivingNpc import LivingNpc
 from tale.llm.llm_utils import LlmUtil
 from tale.thread_utils import do_in_background
-from tests.supportstuff import FakeIoUtil
+from tests.supportstuff import FakeIoUtil, PendingActionsListener
+
 
 
 class TestAutomatic():
 
     def setup_method(self):
+        self.listener = PendingActionsListener()
+        self.listener.subscribe()
         with open('./tests/files/response_content.json', 'r') as file:
             response = file.read()
         responses.add(responses.POST, 'http://127.0.0.1:7860/sdapi/v1/txt2img',
                   json=json.loads(response), status=200)
         self.image_generator = Automatic1111()
 
+    def teardown_method(self):
+        self.listener.unsubscribe()
+
     def test_image_gen_config(self):
         image_generator = Automatic1111()
         assert image_generator.config['ALWAYS_PROMPT'] == 'closeup'
@@ -72,8 +82,11 @@ class TestAutomatic():
         npc = LivingNpc('test', 'f', age=30)
         assert npc.avatar == None
         result = llm_util.generate_image(description='test prompt', name='test name', save_path='./tests/files', copy_file=False, target=npc)
-        assert npc.avatar == 'test_name.jpg'
         assert result == True
+        assert llm_util._image_gen.queue.join(5.0)
+        assert npc.avatar == None, 'the avatar is set on the driver thread'
+        pubsub.sync("driver-pending-actions")
+        assert npc.avatar == 'test_name.jpg'
 
 class TestAutomaticError():
 
@@ -138,4 +151,97 @@ class TestComfyUi():
         assert npc.avatar == None
         result = llm_util.generate_image(description='test prompt', name='test name2', save_path='./tests/files', copy_file=False, target=npc)
         assert npc.avatar == 'test_name2.jpg'
-        assert result == True
\ No newline at end of file
+        assert result == True
+
+class FakeImageGenerator():
+
+    def __init__(self, result: bool = True) -> None:
+        self.result = result
+        self.generated = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def generate_image(self, prompt: str, save_path: str, image_name: str) -> bool:
+        self.release.wait(5.0)
+        self.generated.append(image_name)
+        return self.result
+
+
+class TestImageQueue():
+
+    pending_file = './tests/files/test_image_jobs.json'
+
+    def setup_method(self):
+        self.listener = PendingActionsListener()
+        self.listener.subscribe()
+
+    def teardown_method(self):
+        self.listener.unsubscribe()
+        if os.path.exists(self.pending_file):
+            os.remove(self.pending_file)
+
+    def test_submit_returns_before_generating(self):
+        generator = FakeImageGenerator()
+        generator.release.clear()
+        image_queue = ImageQueue(generator)
+        completed = []
+        assert image_queue.submit('prompt', './', 'image', lambda: completed.append(threading.current_thread().name))
+        assert generator.generated == []
+        generator.release.set()
+        assert image_queue.join(5.0)
+        pubsub.sync("driver-pending-actions")
+        assert generator.generated == ['image']
+        assert completed == [threading.current_thread().name]
+
+    def test_dedupe_by_image_name(self):
+        generator = FakeImageGenerator()
+        generator.release.clear()
+        image_queue = ImageQueue(generator)
+        completed = []
+        image_queue.submit('prompt', './', 'first', lambda: completed.append('first'))
+        image_queue.submit('prompt', './', 'second', lambda: completed.append('second'))
+        image_queue.submit('other prompt', './', 'second', lambda: completed.append('second again'))
+        assert image_queue.pending == 2
+        generator.release.set()
+        assert image_queue.join(5.0)
+        pubsub.sync("driver-pending-actions")
+        assert generator.generated == ['first', 'second']
+        assert completed == ['first', 'second', 'second again']
+
+    def test_bounded(self):
+        generator = FakeImageGenerator()
+        generator.release.clear()
+        image_queue = ImageQueue(generator, max_pending=1)
+        assert image_queue.submit('prompt', './', 'first')
+        assert not image_queue.submit('prompt', './', 'second')
+        generator.release.set()
+        assert image_queue.join(5.0)
+
+    def test_failed_image_not_completed(self):
+        image_queue = ImageQueue(FakeImageGenerator(result=False))
+        completed = []
+        image_queue.submit('prompt', './', 'image', lambda: completed.append('image'))
+        assert image_queue.join(5.0)
+        pubsub.sync("driver-pending-actions")
+        assert completed == []
+
+    def test_pending_jobs_persisted_and_resumed(self):
+        generator = FakeImageGenerator()
+        generator.release.clear()
+        image_queue = ImageQueue(generator, pending_file=self.pending_file)
+        image_queue.submit('prompt', './', 'first')
+        image_queue.submit('prompt 2', './', 'second')
+        with open(self.pending_file) as file:
+            assert [job['image_name'] for job in json.load(file)] == ['first', 'second']
+
+        resumed_generator = FakeImageGenerator()
+        resumed_queue = ImageQueue(resumed_generator, pending_file=self.pending_file)
+        resumed = []
+        assert resumed_queue.resume(lambda image_name: resumed.append(image_name)) == 2
+        assert resumed_queue.join(5.0)
+        pubsub.sync("driver-pending-actions")
+        assert sorted(resumed_generator.generated) == ['first', 'second']
+        assert sorted(resumed) == ['first', 'second']
+        assert not os.path.exists(self.pending_file)
+        generator.release.set()
+        assert image_queue.join(5.0)
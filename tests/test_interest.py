@@ -0,0 +1,84 @@
+import datetime
+
+from tale import mud_context, util
+from tale.base import Exit, Location
+from tale.interest import InterestManager, Tier
+from tale.npc_defs import RoamingMob, StationaryNpc
+from tale.player import Player
+from tale.zone import Zone
+from tests.supportstuff import FakeDriver
+
+
+class TestInterest():
+
+    def setup_method(self):
+        self.previous_driver = mud_context.driver
+        self.driver = FakeDriver()
+        self.driver.game_clock = util.GameDateTime(datetime.datetime(year=2023, month=1, day=1), 1)
+        mud_context.driver = self.driver
+        self.hall = Location('hall')
+        self.kitchen = Location('kitchen')
+        self.cellar = Location('cellar')
+        self.attic = Location('attic')
+        Exit.connect(self.hall, 'kitchen', '', None, self.kitchen, 'hall', '', None)
+        Exit.connect(self.kitchen, 'cellar', '', None, self.cellar, 'kitchen', '', None)
+        Exit.connect(self.cellar, 'attic', '', None, self.attic, 'cellar', '', None)
+
+    def teardown_method(self):
+        mud_context.driver = self.previous_driver
+
+    def test_tiers(self):
+        interest = InterestManager()
+        assert interest.update([self.hall])
+        assert not interest.update([self.hall])
+        assert interest.tier(self.hall) == Tier.ACTIVE
+        assert interest.tier(self.kitchen) == Tier.NEARBY
+        assert interest.tier(self.cellar) == Tier.DORMANT
+        zone = Zone('house')
+        zone.add_location(self.hall)
+        zone.add_location(self.cellar)
+        zones = {'hall': zone, 'cellar': zone}
+        interest.update([self.hall], zones.get)
+        assert interest.tier(self.cellar) == Tier.NEARBY, "same zone"
+        assert interest.tier(self.attic) == Tier.DORMANT
+        assert interest.zone_active('house')
+        assert not interest.zone_active('forest')
+
+    def test_wiretapped(self):
+        interest = InterestManager()
+        interest.update([])
+        assert interest.tier(self.cellar) == Tier.DORMANT
+        wizard = Player('wizard', 'f')
+        wizard.privileges.add('wizard')
+        wizard.create_wiretap(self.cellar)
+        assert interest.tier(self.cellar) == Tier.ACTIVE
+        wizard.clear_wiretaps()
+
+    def test_idle_action_only_with_players(self):
+        npc = StationaryNpc('bob', 'm', age=30, personality='')
+        self.cellar.insert(npc, None)
+        actions = []
+        npc.idle_action = lambda: actions.append(npc)
+        ctx = util.Context(self.driver, self.driver.game_clock, None, None)
+        self.driver.interest.update([self.hall])
+        npc.do_idle_action(ctx)
+        assert actions == []
+        self.driver.interest.update([self.cellar])
+        npc.do_idle_action(ctx)
+        assert actions == [npc]
+
+    def test_roaming_mob_sleeps(self):
+        rat = RoamingMob('rat', 'n')
+        self.attic.insert(rat, None)
+        ctx = util.Context(self.driver, self.driver.game_clock, None, None)
+        interest = self.driver.interest
+        interest.update([self.hall])
+        rat.do_random_move(ctx)
+        rat.do_random_move(ctx)
+        assert rat.location == self.attic
+        assert rat._missed_moves == 2
+        interest.update([self.kitchen])
+        assert rat._missed_moves == 2, "still nobody next door"
+        interest.update([self.cellar])
+        assert rat._missed_moves == 0, "woke up when a player came near"
+        assert rat.location == self.attic, "doesn't walk in on the player"
@@ -1,5 +1,6 @@
 
 import datetime
+import json
 import os
 import shutil
 from tale.coord import Coord
@@ -90,13 +91,16 @@ class TestJsonStory():
         assert(location.name == 'Cave entrance')
 
     def test_save_story(self):
-        self.story.save()
+        assert self.story.save().result(timeout=10) >= 2
+        with open('world.json') as fp:
+            assert json.load(fp)['story']['name'] == self.story.config.name
 
     def test_save_story_as(self):
         old_dir = os.getcwd()
         os.chdir(os.getcwd() + '/stories/test_story/')
-        self.story.save('test_story2')
+        self.story.save('test_story2').result(timeout=10)
         assert os.path.exists('../test_story2')
+        assert os.path.exists('../test_story2/story.py')
         shutil.rmtree('../test_story2', ignore_errors=True)
         assert not os.path.exists('../test_story2')
         os.chdir(old_dir)
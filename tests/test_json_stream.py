@@ -0,0 +1,81 @@
+from tale.llm.json_stream import JsonFieldStream, TextStream
+
+
+class TestJsonFieldStream():
+
+    def _feed(self, text: str, size: int, fields: list) -> dict:
+        received = {field: [] for field in fields}
+        parser = JsonFieldStream({field: received[field].append for field in fields})
+        for i in range(0, len(text), size):
+            parser.feed(text[i:i + size])
+        return parser, {field: ''.join(parts) for field, parts in received.items()}
+
+    def test_streams_field_in_chunks(self):
+        text = '{"response": "Hello there, traveller.", "sentiment": "friendly"}'
+        for size in (1, 3, 7, len(text)):
+            parser, received = self._feed(text, size, ['response'])
+            assert received['response'] == 'Hello there, traveller.'
+            assert parser.done
+            assert parser.text == text
+
+    def test_streams_while_incomplete(self):
+        received = []
+        parser = JsonFieldStream({'response': received.append})
+        parser.feed('{"response": "Hello')
+        assert ''.join(received) == 'Hello'
+        assert not parser.done
+        parser.feed(' you"}')
+        assert ''.join(received) == 'Hello you'
+        assert parser.done
+
+    def test_escapes(self):
+        text = '{"description": "A \\"dark\\" room.\\nIt\'s cold \\u00e9t\\u00E9."}'
+        _, received = self._feed(text, 2, ['description'])
+        assert received['description'] == 'A "dark" room.\nIt\'s cold été.'
+
+    def test_only_top_level_fields(self):
+        text = '{"items": [{"description": "a sword"}], "npcs": {"response": "no"}, "description": "A hall, [with] {braces}."}'
+        _, received = self._feed(text, 4, ['description', 'response'])
+        assert received['description'] == 'A hall, [with] {braces}.'
+        assert received['response'] == ''
+
+    def test_several_fields(self):
+        text = '{"name": "Hall", "description": "Big", "exits": []}'
+        _, received = self._feed(text, 5, ['name', 'description'])
+        assert received == {'name': 'Hall', 'description': 'Big'}
+
+    def test_text_after_done(self):
+        received = []
+        parser = JsonFieldStream({'response': received.append})
+        parser.feed('{"response": "hi"} {"response": "again"}')
+        assert ''.join(received) == 'hi'
+        assert parser.text == '{"response": "hi"} {"response": "again"}'
+
+
+class FakeConnection():
+
+    def __init__(self) -> None:
+        self.written = []
+
+    def output_no_newline(self, line: str, new_paragraph = True) -> None:
+        assert not new_paragraph
+        self.written.append(line)
+
+
+class TestTextStream():
+
+    def test_writes_prefix_once(self):
+        conn = FakeConnection()
+        stream = TextStream(conn, 'Norhardt : ')
+        assert not stream.written
+        stream('  Hello')
+        stream(' there')
+        assert stream.written
+        stream.end()
+        assert ''.join(conn.written) == 'Norhardt : Hello there\n'
+
+    def test_end_without_text(self):
+        conn = FakeConnection()
+        stream = TextStream(conn, 'Norhardt : ')
+        stream.end()
+        assert conn.written == []
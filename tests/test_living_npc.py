@@ -11,6 +11,7 @@ from tale.llm.dynamic_story import DynamicStory
 from tale.llm.llm_io import IoUtil
 from tale.llm.llm_utils import LlmUtil
 from tale.player import Player
+from tale.quest import Quest, QuestType
 from tale.skills.magic import MagicType
 from tale.skills.skills import SkillType
 from tale.skills.weapon_type import WeaponType
@@ -83,6 +84,43 @@ class TestLivingNpc():
         assert(eval(json_card['wielding']) == npc.stats.unarmed_attack.to_dict())
 
 
+    def test_character_card_cached(self):
+        npc = LivingNpc(name='test', gender='m', age=42, personality='grumpy')
+        card = npc.character_card
+        assert npc.character_card is card
+        npc.insert(Item("rope"), npc)
+        assert '"rope"' in npc.character_card
+        npc.insert(Item("apple"), npc)
+        assert json.loads(npc.character_card)['items'] == ['apple', 'rope'], 'items are sorted to keep the card stable'
+        card = npc.character_card
+        npc.set_goal('find the rope')
+        assert npc.character_card != card
+        assert json.loads(npc.character_card)['goal'] == 'find the rope'
+        npc.set_quest(Quest(name='rope', type=QuestType.GIVE, target='rope'))
+        assert json.loads(npc.character_card)['quest'].startswith('Quest: rope')
+        npc.personality = 'cheerful'
+        assert json.loads(npc.character_card)['personality'] == 'cheerful'
+        npc.occupation = 'baker'
+        npc.age = 12
+        npc.example_voice = 'Fresh bread!'
+        card = json.loads(npc.character_card)
+        assert (card['occupation'], card['age'], card['example_voice']) == ('baker', 12, 'Fresh bread!')
+        npc.load_memory({'goal': 'bake bread'})
+        assert json.loads(npc.character_card)['goal'] == 'bake bread'
+        npc.description = 'A cheerful man.'
+        assert json.loads(npc.character_card)['appearance'] == 'A cheerful man.'
+        knife = Weapon("knife", "knife", descr="A sharp knife.")
+        npc.insert(knife, npc)
+        npc.wielding = knife
+        card = npc.character_card
+        assert eval(json.loads(card)['wielding']) == knife.to_dict()
+        npc.move(Location("kitchen"), silent=True)
+        assert npc.character_card != card, 'the wielded weapon is somewhere else now'
+        assert eval(json.loads(npc.character_card)['wielding']) == knife.to_dict()
+        hat = Item("hat", "hat", descr="A big hat.")
+        npc.set_wearable(hat, wear_location=WearLocation.HEAD)
+        assert '"wearing":""hat""' in npc.character_card
+
     def test_wearing(self):
         npc = LivingNpc(name='test', gender='m', age=42, personality='')
         hat = Item("hat", "hat", descr="A big hat.")
@@ -211,6 +249,25 @@ class TestLivingNpcActions():
         assert(len(self.npc._observed_events) == 2)
         assert ["test : Hello there, how can I assist you today?\n\n"] == self.msg_trace_npc.messages
 
+    def test_streamed_dialogue(self):
+        player = Player(name='player', gender='m')
+        self.location.insert(player, None)
+        self.npc._handle_dialogue(("Hello there", None, "kind"), player, streamed=True)
+        assert self.npc.sentiments[player.title] == 'kind'
+        assert ["test : Hello there\n\n"] == self.msg_trace_npc.messages
+        assert 'Hello there' not in ''.join(player.test_get_output_paragraphs())   # seen while it streamed
+
+    def test_dialogue_avatar_set_when_image_done(self):
+        requested = []
+        llm_util = mud_context.driver.llm_util
+        llm_util.generate_image = lambda name, description='', target=None, **kwargs: requested.append(target) or True
+        try:
+            self.npc._handle_dialogue(("Hello there", None, "kind"), self.npc2)
+        finally:
+            del llm_util.generate_image
+        assert requested == [self.npc]
+        assert not self.npc.avatar   # queued, not done
+
     @responses.activate
     def test_idle_action(self):
         mud_context.config.server_tick_method = 'TIMER'
@@ -71,7 +71,121 @@ class TestLlmCache():
         hash = llm_cache.cache_event(True)
         assert llm_cache.get_events([hash]) == "True"
 
-    
-
-
-    
\ No newline at end of file
+    def test_lru_eviction(self):
+        """ Test that the least recently used entry is evicted """
+        cache = llm_cache.LlmCache('test', max_entries=2)
+        cache.put(1, 'one')
+        cache.put(2, 'two')
+        assert cache.get(1) == 'one'
+        cache.put(3, 'three')
+        assert cache.get(2) == None
+        assert cache.get(1) == 'one'
+        assert cache.get(3) == 'three'
+        assert cache.stats() == {'entries': 2, 'bytes': 8, 'hits': 3, 'misses': 1, 'evictions': 1}
+
+    def test_byte_limit(self):
+        """ Test that entries are evicted when over the byte limit """
+        cache = llm_cache.LlmCache('test', max_bytes=10)
+        cache.put(1, '12345')
+        cache.put(2, '12345')
+        cache.put(3, '123')
+        assert len(cache) == 2
+        assert cache.get(1) == None
+        cache.put(4, 'way more than ten bytes')
+        assert len(cache) == 1
+        assert cache.get(4) == 'way more than ten bytes'
+
+    def test_store(self, tmp_path):
+        """ Test that evicted entries are read back from the store, and only new entries are flushed """
+        store = llm_cache.CacheStore(str(tmp_path / 'llm_cache.sqlite'))
+        cache = llm_cache.LlmCache('test', max_entries=1)
+        cache.store = store
+        cache.put(1, 'one')
+        cache.put(2, 'two')
+        assert cache.get(1) == 'one' # not yet flushed
+        cache.flush()
+        assert dict(store.items('test')) == {1: 'one', 2: 'two'}
+        assert cache.get(2) == 'two'
+        cache.put(3, 'three')
+        cache.flush()
+        assert store.get('test', 3) == 'three'
+        assert cache.to_dict() == {1: 'one', 2: 'two', 3: 'three'}
+        assert dict(store.items('other')) == {}
+        store.close()
+
+    def test_save_and_attach(self, tmp_path):
+        """ Test saving the caches to disk and attaching them again """
+        path = str(tmp_path / 'llm_cache.sqlite')
+        event_hash = llm_cache.cache_event("saved event")
+        look_hash = llm_cache.cache_look("saved look")
+        try:
+            llm_cache.save(path)
+            llm_cache.detach()
+            llm_cache.load({})
+            assert llm_cache.get_events([event_hash]) == ""
+            assert llm_cache.attach(path)
+            assert llm_cache.get_events([event_hash]) == "saved event"
+            assert llm_cache.get_looks([look_hash]) == "saved look"
+            assert not llm_cache.attach(str(tmp_path / 'missing.sqlite'))
+        finally:
+            llm_cache.detach()
+
+    def test_attach_leaves_save_unchanged(self, tmp_path):
+        """ Test that a loaded save is only written to when it's saved over """
+        path = str(tmp_path / 'llm_cache.sqlite')
+        other_path = str(tmp_path / 'other.sqlite')
+        old_hash = llm_cache.cache_event("old event")
+        try:
+            llm_cache.save(path)
+            llm_cache.detach()
+            assert llm_cache.attach(path)
+            new_hash = llm_cache.cache_event("new event")
+            for cache in llm_cache._caches:
+                cache.use_store(llm_cache._temporary_store())
+                cache.flush()
+            with open(path, 'rb') as f:
+                saved = f.read()
+            llm_cache.save(other_path)
+            with open(path, 'rb') as f:
+                assert f.read() == saved
+            other = llm_cache.CacheStore(other_path)
+            assert other.get('events', old_hash) == 'old event'
+            assert other.get('events', new_hash) == 'new event'
+            other.close()
+            llm_cache.save(other_path)
+            llm_cache.detach()
+            llm_cache.load({})
+            assert llm_cache.attach(other_path)
+            assert llm_cache.get_events([old_hash, new_hash]) == "old event<break>new event"
+        finally:
+            llm_cache.detach()
+
+    def test_evicted_before_save(self):
+        """ Test that entries evicted before the game is saved can be read back """
+        max_entries = llm_cache.event_cache.max_entries
+        llm_cache.event_cache.max_entries = 1
+        try:
+            llm_cache.load({})
+            first = llm_cache.cache_event("first event")
+            llm_cache.cache_event("second event")
+            assert len(llm_cache.event_cache) == 1
+            assert llm_cache.get_events([first]) == "first event"
+        finally:
+            llm_cache.event_cache.max_entries = max_entries
+            llm_cache.detach()
+
+    def test_caching_is_not_a_miss(self):
+        """ Test that adding an entry doesn't count as a lookup """
+        llm_cache.load({})
+        before = llm_cache.stats()['events']
+        event_hash = llm_cache.cache_event("counted event")
+        llm_cache.cache_event("counted event")
+        after = llm_cache.stats()['events']
+        assert (after['hits'], after['misses']) == (before['hits'], before['misses'])
+        assert llm_cache.get_events([event_hash]) == "counted event"
+        assert llm_cache.stats()['events']['hits'] == before['hits'] + 1
+
+    def test_load_converts_keys(self):
+        """ Test that keys from json are loaded as ints """
+        llm_cache.load({"events": {"1234": "loaded event"}, "looks": {}})
+        assert llm_cache.get_events([1234]) == "loaded event"
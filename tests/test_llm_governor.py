@@ -0,0 +1,104 @@
+from tale import mud_context
+from tale.base import Location
+from tale.llm import llm_governor
+from tale.llm.LivingNpc import LivingNpc
+from tale.llm.llm_governor import LlmGovernor
+from tale.player import Player
+from tale.zone import Zone
+from tests.supportstuff import FakeDriver
+
+
+class FakeClock():
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLlmGovernor():
+
+    def setup_method(self):
+        self.clock = FakeClock()
+
+    def test_rate_limit(self):
+        governor = LlmGovernor(rate_limits={'idle': 2}, clock=self.clock)
+        assert governor.admit('idle')
+        assert governor.admit('idle')
+        assert not governor.admit('idle')
+        assert governor.admit('reaction'), "no limit for reactions"
+        self.clock.now += governor.window
+        assert governor.admit('idle'), "a minute later"
+        stats = governor.stats()['kinds']['idle']
+        assert stats['admitted'] == 3
+        assert stats['refused'] == 1
+        assert stats['requests_per_minute'] == 1
+
+    def test_essential_kinds(self):
+        governor = LlmGovernor(max_concurrent=1, rate_limits={llm_governor.KIND_DIALOGUE: 1}, clock=self.clock)
+        governor.queue_depth = lambda: 5
+        assert not governor.admit(llm_governor.KIND_IDLE)
+        assert governor.admit(llm_governor.KIND_DIALOGUE)
+        assert governor.admit(llm_governor.KIND_DIALOGUE), "a player is waiting"
+
+    def test_concurrency(self):
+        governor = LlmGovernor(max_concurrent=2, clock=self.clock)
+        assert not governor.busy('evoke')
+        def task():
+            assert governor.in_flight == 1
+            assert governor.busy('evoke')
+            assert governor.admit('evoke')
+            governor.queue_depth = lambda: 1
+            return not governor.admit('evoke')
+        assert governor.wrap('evoke', task)()
+        assert governor.in_flight == 0
+
+    def test_token_limit(self):
+        governor = LlmGovernor(token_limits={'narrative': 10}, clock=self.clock)
+        governor.record('not counted', 'outside a wrapped task')
+        assert governor.admit('narrative')
+        governor.wrap('narrative', lambda: governor.record('x' * 40, 'y' * 40))()
+        assert governor.stats()['kinds']['narrative']['tokens'] == 20
+        assert not governor.admit('narrative')
+        self.clock.now += governor.window
+        assert governor.admit('narrative')
+
+    def test_zone_limit(self):
+        forest = Zone('forest')
+        glade = Location('glade')
+        forest.add_location(glade)
+        governor = LlmGovernor(zone_rate_limit=1, clock=self.clock)
+        governor.find_zone = {'glade': forest}.get
+        assert governor.admit('reaction', glade)
+        assert not governor.admit('idle', glade)
+        assert governor.admit('idle', Location('road')), "not in a zone"
+        assert governor.stats()['zones'] == {'forest': 1}
+
+    def test_stale(self):
+        governor = LlmGovernor(stale_after=10, clock=self.clock)
+        fresh = governor.wrap('reaction', lambda: 'reaction', drop_stale=True)
+        assert fresh() == 'reaction'
+        stale = governor.wrap('reaction', lambda: 'reaction', drop_stale=True)
+        self.clock.now += 11
+        assert stale() is None
+        assert governor.wrap('idle', lambda: 'idle')() == 'idle', "only dropped when asked"
+        assert governor.stats()['kinds']['reaction']['stale'] == 1
+
+    def test_canned_idle_action(self):
+        previous = mud_context.driver
+        mud_context.driver = FakeDriver()
+        try:
+            governor = mud_context.driver.llm_util.governor
+            governor.rate_limits = {'idle': 1}
+            governor.admit('idle')
+            hall = Location('hall')
+            npc = LivingNpc(name='bob', gender='m', age=30, personality='')
+            hall.insert(npc, None)
+            player = Player('julie', 'f')
+            player.move(hall)
+            player.test_get_output_paragraphs()
+            assert npc.idle_action() is None
+            output = ''.join(player.test_get_output_paragraphs())
+            assert output.startswith('Bob '), "an emote"
+        finally:
+            mud_context.driver = previous
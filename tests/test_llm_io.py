@@ -1,12 +1,17 @@
 
 
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import json
 import os
+import threading
 from aioresponses import aioresponses
 import responses
 
 import yaml
+from tale.llm.contexts.EvokeContext import EvokeContext
+from tale.llm.io_adapters import KoboldCppAdapter
 from tale.llm.llm_io import IoUtil
+from tale.llm.llm_transport import HttpTransport
 from tale.player import Player, PlayerConnection
 from tale.tio.iobase import IoAdapterBase
 
@@ -104,6 +109,24 @@ class TestLlmIo():
         response = io_util.synchronous_request(request_body=json.loads(backend_config['DEFAULT_BODY']), prompt='test evoke', context='')
         assert(response == '')
 
+    @responses.activate
+    def test_context_fits_window(self):
+        config_file = self._load_config()
+        config_file['BACKEND'] = 'kobold_cpp'
+        backend_config = self._load_backend_config('kobold_cpp')
+        responses.add(responses.POST, backend_config['URL'] + backend_config['ENDPOINT'],
+                    json={'results':[{'text':'fitted'}]}, status=200)
+        io_util = IoUtil(config=config_file, backend_config=backend_config)
+        request_body = json.loads(backend_config['DEFAULT_BODY'])
+        request_body['max_context_length'] = 200
+        request_body['max_length'] = 100
+        context = EvokeContext(story_context='story', history='old event. ' * 500 + 'latest event', time_of_day='')
+        response = io_util.synchronous_request(request_body=request_body, prompt='<context>{context}</context> test evoke', context=context)
+        assert response == 'fitted'
+        sent_prompt = json.loads(responses.calls[0].request.body)['prompt']
+        assert 'latest event' in sent_prompt
+        assert len(sent_prompt) < 100 * 4
+
     @responses.activate
     def test_openai_grammar(self):
         config_file = self._load_config()
@@ -182,6 +205,21 @@ class TestLlmIo():
             result = io_util.stream_request(request_body=json.loads(backend_config['DEFAULT_BODY']), prompt='test evoke', context='', io = IoAdapterBase(conn))
             assert(result == 'stream test')
 
+    def test_stream_kobold_cpp_one_at_a_time(self):
+        class Transport():
+            def __init__(self):
+                self.text = ''
+            def run(self, coroutine):
+                coroutine.close()
+                return True
+            def post(self, url):
+                assert adapter._stream_lock.locked(), 'another stream would read this text'
+                self.text = self.text or 'stream test'
+                return type('Response', (), {'text': json.dumps({'results':[{'text':self.text}]})})
+        adapter = KoboldCppAdapter('http://localhost:5001', '/stream', '/check', '', '', transport=Transport())
+        assert adapter.stream_request({}, {}, wait=True) == 'stream test'
+        assert not adapter._stream_lock.locked()
+
     def test_stream_llama_cpp(self):
         config = {'BACKEND':'llama_cpp', 'USER_START':'', 'USER_END':''}
         with open(os.path.realpath(os.path.join(os.path.dirname(__file__), f"../backend_llama_cpp.yaml")), "r") as stream:
@@ -200,3 +238,138 @@ class TestLlmIo():
                                  body='data: {"choices":[{"delta":{"content":"stream test"}}]}')
             result = io_util.stream_request(request_body=json.loads(backend_config['DEFAULT_BODY']), prompt='test evoke', context='', io = IoAdapterBase(conn))
             assert(result == 'stream test')
+
+    def test_stream_json_request(self):
+        config = {'BACKEND':'llama_cpp', 'USER_START':'', 'USER_END':''}
+        backend_config = self._load_backend_config('llama_cpp')
+        io_util = IoUtil(config=config, backend_config=backend_config) # type: IoUtil
+        io_util.stream = True
+        chunks = ['{"resp', 'onse": "Hel', 'lo \\"you\\"', '", "sentiment": "kind"}']
+        body = ''.join('data: ' + json.dumps({'choices':[{'delta':{'content':chunk}}]}) + '\n' for chunk in chunks)
+        received = []
+        with aioresponses() as mocked_responses:
+            mocked_responses.post(backend_config['URL'] + backend_config['STREAM_ENDPOINT'], status=200, body=body)
+            result = io_util.stream_json_request(request_body=json.loads(backend_config['DEFAULT_BODY']), prompt='test dialogue', fields={'response': received.append})
+        assert json.loads(result) == {'response': 'Hello "you"', 'sentiment': 'kind'}
+        assert ''.join(received) == 'Hello "you"'
+
+    @responses.activate
+    def test_stream_json_request_not_streaming(self):
+        config = {'BACKEND':'kobold_cpp', 'USER_START':'', 'USER_END':''}
+        backend_config = self._load_backend_config('kobold_cpp')
+        io_util = IoUtil(config=config, backend_config=backend_config) # type: IoUtil
+        io_util.stream = False
+        responses.add(responses.POST, backend_config['URL'] + backend_config['ENDPOINT'],
+                    json={'results':[{'text':'{"response": "Hello"}'}]}, status=200)
+        received = []
+        result = io_util.stream_json_request(request_body=json.loads(backend_config['DEFAULT_BODY']), prompt='test dialogue', fields={'response': received.append})
+        assert result == '{"response": "Hello"}'
+        assert received == []
+
+    def test_transport_shared_with_adapter(self):
+        config_file = self._load_config()
+        config_file['BACKEND'] = 'kobold_cpp'
+        config_file['HTTP_POOL_SIZE'] = 3
+        backend_config = self._load_backend_config('kobold_cpp')
+        io_util = IoUtil(config=config_file, backend_config=backend_config)
+        assert io_util.io_adapter.transport is io_util.transport
+        assert io_util.transport.pool_size == 3
+
+    def test_transport_stream_timeout(self):
+        transport = HttpTransport(timeout=5)
+        try:
+            timeout = transport.run(transport.session()).timeout
+            assert timeout.total is None, 'a long stream is not cut off'
+            assert timeout.sock_read == 5
+            assert timeout.sock_connect == 5
+        finally:
+            transport.close()
+
+    def test_transport_reuses_connection(self):
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers['Content-Length']))
+                body = json.dumps({'results':[{'text':'pooled'}]}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            config_file = self._load_config()
+            config_file['BACKEND'] = 'kobold_cpp'
+            backend_config = self._load_backend_config('kobold_cpp')
+            backend_config['URL'] = 'http://127.0.0.1:%d' % server.server_address[1]
+            io_util = IoUtil(config=config_file, backend_config=backend_config)
+            for _ in range(3):
+                response = io_util.synchronous_request(request_body=json.loads(backend_config['DEFAULT_BODY']), prompt='test evoke', context='')
+                assert response == 'pooled'
+            stats = io_util.transport.stats()
+            assert stats['requests'] == 3
+            assert stats['connections_opened'] == 1
+            assert stats['connections_reused'] == 2
+            io_util.transport.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_coalesce_identical_requests(self):
+        release = threading.Event()
+        received = []
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                prompt = json.loads(self.rfile.read(int(self.headers['Content-Length'])))['prompt']
+                received.append(prompt)
+                release.wait(5)
+                body = json.dumps({'results':[{'text':'answer to %s' % prompt}]}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            config_file = self._load_config()
+            config_file['BACKEND'] = 'kobold_cpp'
+            backend_config = self._load_backend_config('kobold_cpp')
+            backend_config['URL'] = 'http://127.0.0.1:%d' % server.server_address[1]
+            io_util = IoUtil(config=config_file, backend_config=backend_config)
+            results = {}
+            def request(name, prompt):
+                results[name] = io_util.synchronous_request(request_body=json.loads(backend_config['DEFAULT_BODY']), prompt=prompt, context='')
+            threads = [threading.Thread(target=request, args=(i, 'same look')) for i in range(3)]
+            threads.append(threading.Thread(target=request, args=('other', 'other look')))
+            for t in threads:
+                t.start()
+            for _ in range(100):
+                if io_util.coalescer.coalesced == 2 and len(received) == 2:
+                    break
+                release.wait(0.05)
+            release.set()
+            for t in threads:
+                t.join(5)
+            assert len(received) == 2
+            assert results[0] == results[1] == results[2]
+            assert results['other'] != results[0]
+            assert io_util.coalescer.stats() == {'requests': 2, 'coalesced': 2}
+            assert io_util.coalescer.in_flight == 0
+            io_util.transport.close()
+        finally:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,93 @@
+import threading
+from concurrent.futures import CancelledError
+
+import pytest
+
+from tale import pubsub
+from tale.llm import llm_scheduler
+from tale.llm.llm_scheduler import LlmScheduler
+from tests.supportstuff import PendingActionsListener
+
+
+class TestLlmScheduler():
+
+    def setup_method(self):
+        self.listener = PendingActionsListener()
+        self.listener.subscribe()
+
+    def teardown_method(self):
+        self.listener.unsubscribe()
+
+    def _wait_for_delivery(self, future, timeout=5.0):
+        """ Delivery happens on the 'driver thread', which syncs the pending actions topic."""
+        for _ in range(int(timeout / 0.01)):
+            pubsub.sync("driver-pending-actions")
+            if future.done():
+                return
+            threading.Event().wait(0.01)
+
+    def test_inline(self):
+        scheduler = LlmScheduler()
+        results = []
+        future = scheduler.submit(lambda: 'response', on_complete=lambda result: results.append(result) or 'handled')
+        assert future.done()
+        assert future.result() == 'handled'
+        assert results == ['response']
+
+    def test_inline_exception_propagates(self):
+        scheduler = LlmScheduler()
+        with pytest.raises(ValueError):
+            scheduler.submit(lambda: int('not a number'))
+
+    def test_async_delivers_on_sync(self):
+        scheduler = LlmScheduler(workers=1)
+        try:
+            delivered = []
+            future = scheduler.submit(lambda: threading.current_thread().name,
+                                      on_complete=lambda result: delivered.append((result, threading.current_thread().name)))
+            self._wait_for_delivery(future)
+            assert future.done()
+            worker_thread, delivery_thread = delivered[0]
+            assert worker_thread.startswith('llm-worker')
+            assert delivery_thread == threading.current_thread().name
+        finally:
+            scheduler.shutdown()
+
+    def test_priority_order(self):
+        scheduler = LlmScheduler(workers=1)
+        try:
+            blocker = threading.Event()
+            started = threading.Event()
+            order = []
+            scheduler.submit(lambda: started.set() or blocker.wait(5))
+            started.wait(5)
+            scheduler.submit(lambda: order.append('idle'), priority=llm_scheduler.PRIORITY_IDLE)
+            scheduler.submit(lambda: order.append('world'), priority=llm_scheduler.PRIORITY_WORLD)
+            scheduler.submit(lambda: order.append('dialogue'), priority=llm_scheduler.PRIORITY_DIALOGUE)
+            assert scheduler.pending == 3
+            blocker.set()
+            idle = scheduler.submit(lambda: None, priority=llm_scheduler.PRIORITY_IDLE + 1)
+            self._wait_for_delivery(idle)
+            assert order == ['dialogue', 'world', 'idle']
+        finally:
+            scheduler.shutdown()
+
+    def test_cancel_owner(self):
+        scheduler = LlmScheduler(workers=1)
+        try:
+            blocker = threading.Event()
+            started = threading.Event()
+            owner = object()
+            delivered = []
+            running = scheduler.submit(lambda: started.set() or blocker.wait(5), owner=owner, on_complete=delivered.append)
+            started.wait(5)
+            queued = scheduler.submit(lambda: 'queued', owner=owner, on_complete=delivered.append)
+            assert scheduler.cancel(owner) == 2
+            blocker.set()
+            assert queued.cancelled()
+            self._wait_for_delivery(running)
+            with pytest.raises(CancelledError):
+                running.result()
+            assert delivered == []
+        finally:
+            scheduler.shutdown()
@@ -1,5 +1,6 @@
 import datetime
 import json
+import threading
 
 from tale.image_gen.automatic1111 import Automatic1111
 from tale.llm.contexts.CharacterContext import CharacterContext
@@ -17,11 +18,12 @@ from tale.llm.responses.ActionResponse import ActionResponse
 from tale.llm.responses.FollowResponse import FollowResponse
 from tale.player import Player, PlayerConnection
 from tale.races import UnarmedAttack
+from tale.random_event import RandomEvent
 from tale.story import MoneyType
 from tale.story_context import StoryContext
 from tale.tio.console_io import ConsoleIo
 from tale.zone import Zone
-from tests.supportstuff import FakeIoUtil
+from tests.supportstuff import FakeIoUtil, MsgTraceNPC, QueuedScheduler
 import tale.parse_utils as parse_utils
 from tale.driver_if import IFDriver
 
@@ -76,6 +78,17 @@ class TestLlmUtils():
         actions = self.llm_util.perform_idle_action(character_name='Norhardt', location = location, character_card= '{}', sentiments= {}, last_action= '')
         assert(actions == 'Walk to the left')
 
+    def test_perform_group_actions(self):
+        self.llm_util.set_story(self.story)
+        self.llm_util._character.io_util.response = '[{"name": "Norhardt", "action": "Norhardt waves."}, {"name": "Arto", "action": "Arto frowns."}, {"name": "Arto"}]'
+        location = Location(name='Test Location')
+        requests = [dict(character_name='Norhardt', location=location, character_card='{}', sentiments={}, last_action=''),
+                    dict(character_name='Arto', location=location, character_card='{}', action='waves', acting_character_name='Norhardt', sentiment='')]
+        actions = self.llm_util.perform_group_actions(location, requests)
+        assert actions == {'norhardt': 'Norhardt waves.', 'arto': 'Arto frowns.'}
+        self.llm_util._character.io_util.response = 'not json'
+        assert self.llm_util.perform_group_actions(location, requests) == {}
+
     def test_perform_travel_action(self):
         # mostly testing that prompt works
         self.llm_util._character.io_util.response = 'West'
@@ -173,10 +186,41 @@ class TestLlmUtils():
         pc = PlayerConnection(player, ConsoleIo(None))
         self.llm_util.io_util.response = 'shadows lengthen as the sun dips below the horizon, casting a golden glow over the landscape. The air grows cooler, and the sounds of nocturnal creatures begin to fill the night.'
         self.llm_util.set_story(self.story)
-        result = self.llm_util.describe_day_cycle_transition(pc, 'day', 'dusk')
+        result = self.llm_util.describe_day_cycle_transition(pc, 'day', 'dusk').result()
         assert(result.startswith('shadows lengthen'))
         assert('shadows lengthen' in pc.get_output())
 
+    def test_random_event_per_player_location(self):
+        player = Player("test_player", "m")
+        other = Player("other_player", "f")
+        Location(name='Test Location').init_inventory([player, other])
+        narrated = []
+        self.llm_util.generate_narrative_event = narrated.append
+        try:
+            RandomEvent(self.llm_util, [PlayerConnection(player), PlayerConnection(other)]).narrative_event()
+        finally:
+            del self.llm_util.generate_narrative_event
+        assert narrated == [player.location]
+
+    def test_narrative_event_told_when_done(self):
+        self.llm_util.io_util = FakeIoUtil(response='a raven lands on the sill')
+        self.llm_util.set_story(self.story)
+        scheduler, self.llm_util.scheduler = self.llm_util.scheduler, QueuedScheduler()
+        try:
+            location = Location(name='Test Location')
+            listener = MsgTraceNPC('fritz', 'm', race='human')
+            location.init_inventory([listener])
+            in_flight = []
+            request = self.llm_util.io_util.synchronous_request
+            self.llm_util.io_util.synchronous_request = lambda *args, **kwargs: in_flight.append(self.llm_util.governor.in_flight) or request(*args, **kwargs)
+            self.llm_util.generate_narrative_event(location)
+            assert listener.messages == [], 'the driver thread does not wait for the model'
+            self.llm_util.scheduler.run_next()
+            assert listener.messages == ['a raven lands on the sill']
+            assert in_flight == [1], 'counted by the governor while it runs'
+        finally:
+            self.llm_util.scheduler = scheduler
+
 
 class TestWorldBuilding():
 
@@ -434,6 +478,16 @@ class TestWorldBuilding():
         assert(location.search_living('grumpy') is not None)
         assert(location.search_living('wolf') is not None)
 
+    def test_random_spawn_added_when_done(self):
+        location = Location(name='Outside')
+        self.llm_util._world_building.io_util.response = '{"items":[], "npcs":[{"name": "grumpy dwarf", "level":10, "race": "dwarf"}], "mobs":[]}'
+        self.llm_util.set_story(self.story)
+        self.llm_util.scheduler = QueuedScheduler()
+        self.llm_util.generate_random_spawn(location, zone.from_json(json.loads(self.generated_zone)).get_info())
+        assert location.search_living('grumpy') is None
+        assert self.llm_util.scheduler.run_next()
+        assert location.search_living('grumpy') is not None
+
     def test_generate_random_spawn_empty_world_lists(self):
         mud_context.driver.moneyfmt = util.MoneyFormatter.create_for(MoneyType.MODERN)
         # will not generate anything if world lists are empty, for now.
@@ -530,6 +584,39 @@ class TestWorldBuilding():
         assert len(result.location_descriptions) == 19
 
 
+    def test_describe_dungeon_rooms(self):
+        class DungeonIoUtil(FakeIoUtil):
+            """ Describes the rooms it's asked for. The first time, it fails the slice with room 12 and leaves out room 3."""
+            def __init__(self) -> None:
+                super().__init__()
+                self.lock = threading.Lock()
+                self.requests = []
+                self.threads = set()
+
+            def synchronous_request(self, request_body: dict, prompt: str = None, context = '') -> str:
+                rooms = [json.loads(room) for room in context.rooms]
+                with self.lock:
+                    self.requests.append([room['index'] for room in rooms])
+                    self.threads.add(threading.current_thread().name)
+                if 12 in [room['index'] for room in rooms] and len(self.requests) <= 2:
+                    return 'not json'
+                described = [{'index': room['index'], 'name': room['name'], 'description': 'room %d' % room['index']} for room in rooms
+                             if room['index'] != 3 or len(self.requests) > 2]
+                return json.dumps({'rooms': described})
+
+        io_util = DungeonIoUtil()
+        llm_util = LlmUtil(io_util) # type: LlmUtil
+        llm_util.set_story(self.story)
+        rooms = ['{"index": %d, "name": "Room"}' % index for index in range(15)]
+        result = llm_util.describe_dungeon_rooms(zone_info={}, rooms=rooms, depth=1, max_depth=2, slice_size=10)
+        assert [room.index for room in result] == list(range(15))
+        assert result[12].description == 'room 12'
+        assert sorted(io_util.requests[:2]) == [list(range(10)), list(range(10, 15))]
+        # only the failed slice, and the missing room, are asked for again
+        assert io_util.requests[2:] == [[3, 10, 11, 12, 13, 14]]
+        assert len(io_util.requests) == 3
+        assert all([name.startswith('dungeon-rooms') for name in io_util.threads])
+
 
 class TestQuestBuilding():
 
@@ -0,0 +1,133 @@
+import threading
+
+from tale import pubsub
+from tale.base import Exit, Location
+from tale.errors import ActionRefused
+from tale.llm.llm_scheduler import LlmScheduler
+from tale.llm.location_prebuilder import LocationPrebuilder
+from tale.zone import Zone
+from tests.supportstuff import PendingActionsListener
+
+
+class FakePlayer():
+
+    def __init__(self) -> None:
+        self.messages = []
+
+    def tell(self, message: str) -> None:
+        self.messages.append(message)
+
+
+class TestLocationPrebuilder():
+
+    def setup_method(self):
+        self.listener = PendingActionsListener()
+        self.listener.subscribe()
+        self.zone = Zone('zone')
+        self.location = Location('hall')
+        self.north = Location('north room')
+        self.north.built = False
+        self.south = Location('south room')
+        self.south.built = False
+        self.location.add_exits([Exit('north', self.north, 'a door'), Exit('south', self.south, 'a gate')])
+        self.release = threading.Event()
+        self.release.set()
+        self.generated = []
+        self.committed = []
+        self.scheduler = LlmScheduler(workers=1)
+
+    def teardown_method(self):
+        self.listener.unsubscribe()
+        self.release.set()
+        self.scheduler.shutdown()
+
+    def _prepare(self, zone, from_location, target):
+        return lambda: self._generate(zone, from_location, target)
+
+    def _prepare_fail(self, zone, from_location, target):
+        return lambda: self._fail(zone, from_location, target)
+
+    def _generate(self, zone, from_location, target):
+        self.release.wait(5.0)
+        self.generated.append(target)
+        return zone, ('response', None)
+
+    def _fail(self, zone, from_location, target):
+        return zone, None
+
+    def _commit(self, target, zone, result):
+        _, generated = result
+        if not generated or target.built:
+            return False
+        target.built = True
+        self.committed.append(target)
+        return True
+
+    def _wait_until(self, predicate, timeout=5.0):
+        for _ in range(int(timeout / 0.01)):
+            pubsub.sync("driver-pending-actions")
+            if predicate():
+                return True
+            threading.Event().wait(0.01)
+        return False
+
+    def test_prebuild_and_hit(self):
+        prebuilder = LocationPrebuilder(self.scheduler, self._prepare, self._commit, budget=2)
+        assert prebuilder.prebuild(self.location, self.zone) == 2
+        assert prebuilder.prebuild(self.location, self.zone) == 0, 'already in flight'
+        assert self._wait_until(lambda: prebuilder.stats()['built'] == 2)
+        assert self.north.built and self.south.built
+        prebuilder.entered(self.north)
+        prebuilder.entered(self.north)
+        stats = prebuilder.stats()
+        assert stats['hits'] == 1
+        assert stats['unvisited'] == 1
+        assert stats['hit_rate'] == 1.0
+
+    def test_budget(self):
+        self.release.clear()
+        prebuilder = LocationPrebuilder(self.scheduler, self._prepare, self._commit, budget=1)
+        assert prebuilder.prebuild(self.location, self.zone) == 1
+        assert prebuilder.stats()['in_flight'] == 1
+        self.release.set()
+        assert self._wait_until(lambda: prebuilder.stats()['in_flight'] == 0)
+        assert len(self.generated) == 1
+
+    def test_claim_in_flight(self):
+        self.release.clear()
+        prebuilder = LocationPrebuilder(self.scheduler, self._prepare, self._commit, budget=2)
+        prebuilder.prebuild(self.location, self.zone)
+        entered = []
+        assert prebuilder.claim(self.north, FakePlayer(), lambda result: entered.append(result))
+        self.release.set()
+        assert self._wait_until(lambda: len(entered) == 1)
+        assert entered[0] == (self.zone, ('response', None))
+        assert self.generated.count(self.north) == 1
+        stats = prebuilder.stats()
+        assert stats['hits'] == 1
+        assert stats['unvisited'] == 1, 'only the south room is waiting for a visitor'
+
+    def test_miss(self):
+        prebuilder = LocationPrebuilder(self.scheduler, self._prepare, self._commit, budget=2)
+        assert not prebuilder.claim(self.north, FakePlayer(), lambda result: None)
+        assert prebuilder.stats()['misses'] == 1
+        assert prebuilder.stats()['hit_rate'] == 0.0
+
+    def test_failed_build_is_wasted(self):
+        prebuilder = LocationPrebuilder(self.scheduler, self._prepare_fail, self._commit, budget=1)
+        player = FakePlayer()
+
+        def enter(result):
+            raise ActionRefused('no way')
+
+        prebuilder.prebuild(self.location, self.zone)
+        prebuilder.claim(self.north, player, enter) or prebuilder.claim(self.south, player, enter)
+        assert self._wait_until(lambda: prebuilder.stats()['wasted'] == 1)
+        assert player.messages == ['no way']
+        assert self.committed == []
+
+    def test_disabled_without_workers(self):
+        prebuilder = LocationPrebuilder(LlmScheduler(), self._prepare, self._commit, budget=2)
+        assert not prebuilder.enabled
+        assert prebuilder.prebuild(self.location, self.zone) == 0
+        assert self.generated == []
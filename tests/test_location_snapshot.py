@@ -0,0 +1,29 @@
+from tale.base import Exit, Item, Living, Location
+from tale.llm.location_snapshot import LocationSnapshot
+
+
+class TestLocationSnapshot():
+
+    def test_copies_location(self):
+        hall = Location('hall', descr='A big hall.')
+        cellar = Location('cellar')
+        hall.add_exits([Exit('down', cellar, 'stairs down')])
+        hidden = Living('ghost', gender='n')
+        hidden.hidden = True
+        invisible = Item('draft', 'cold draft')
+        invisible.visible = False
+        hall.init_inventory([Living('bob', gender='m', short_descr='a tall man'), hidden, Item('sword', 'sharp sword'), invisible])
+        snapshot = LocationSnapshot(hall)
+        hall.insert(Living('alice', gender='f'), None)
+        hall.insert(Item('shield', 'round shield'), None)
+        assert snapshot.name == 'hall'
+        assert snapshot.description == 'A big hall.'
+        assert snapshot.exits == ['down']
+        assert snapshot.items == ['sword']
+        assert sorted([(c.name, c.short_description, c.hidden) for c in snapshot.characters]) == [('bob', 'a tall man', False), ('ghost', '', True)]
+
+    def test_of(self):
+        hall = Location('hall')
+        snapshot = LocationSnapshot.of(hall)
+        assert isinstance(snapshot, LocationSnapshot)
+        assert LocationSnapshot.of(snapshot) is snapshot
@@ -84,6 +84,37 @@ class TestLocations(unittest.TestCase):
         expected = ["[Main hall]", "Exits: door, east, up", "You see: key, two magazines, and table", "Present here: fly, julie, and two rats"]
         self.assertEqual(expected, strip_text_styles(self.hall.look(exclude_living=self.player, short=True)))
 
+    def test_look_cached(self):
+        first = self.hall.look()
+        self.assertEqual(first, self.hall.look())
+        self.assertIsNot(first, self.hall.look(), "callers get their own list")
+        self.assertEqual(self.hall.look(), self.hall.look(exclude_living=Living("bob", "m")), "excluding someone who isn't here")
+        generation = self.hall._look_generation
+        self.rat.hidden = True
+        self.assertGreater(self.hall._look_generation, generation)
+        self.assertIn("Player, attractive Julie, and rat are here.", strip_text_styles(self.hall.look())[3])
+        self.hall.remove(self.julie, None)
+        self.assertIn("Player and rat are here.", strip_text_styles(self.hall.look())[3])
+        self.key.short_description = "A key lies here."
+        self.assertIn("rusty key: A key lies here.", strip_text_styles(self.hall.look())[3])
+        self.hall.description = "A dusty hall."
+        self.assertEqual("A dusty hall.", self.hall.look()[1])
+        self.hall.add_exits([Exit("down", self.street, "A trapdoor leads down.")])
+        self.assertEqual(["[Main hall]", "Exits: door, down, east, up"], strip_text_styles(self.hall.look(short=True))[:2])
+
+    def test_look_cached_exits(self):
+        self.assertIn("A ladder leads up.", self.hall.look()[2])
+        self.hall.exits["up"].short_description = "A rope ladder leads up."
+        self.assertIn("A rope ladder leads up.", self.hall.look()[2])
+        self.hall.exits["up"].unbind(self.hall)
+        self.assertNotIn("up", self.hall.exits)
+        self.assertNotIn("ladder", self.hall.look()[2])
+        self.assertEqual(["[Main hall]", "Exits: door, east"], strip_text_styles(self.hall.look(short=True))[:2])
+        door, _ = Door.connect(self.hall, "trapdoor", "A trapdoor leads down.", "", self.attic, "trapdoor", "", "")
+        self.assertIn("A trapdoor leads down.", self.hall.look()[2])
+        door.short_description = "A hidden trapdoor leads down."
+        self.assertIn("A hidden trapdoor leads down.", self.hall.look()[2])
+
     def test_search_living(self):
         self.assertEqual(None, self.hall.search_living("<notexisting>"))
         self.assertEqual(None, self.attic.search_living("<notexisting>"))
@@ -92,11 +123,18 @@ class TestLocations(unittest.TestCase):
         self.assertEqual(self.julie, self.hall.search_living("attractive julie"))
         self.assertEqual(self.julie, self.hall.search_living("chick"))
         self.assertEqual(None, self.hall.search_living("bloke"))
+        self.fly.name = "mosquito"
+        self.assertEqual(self.fly, self.hall.search_living("mosquito"))
 
     def test_search_item(self):
         # almost identical to locate_item so only do a few basic tests
         self.assertEqual(None, self.player.search_item("<notexisting>"))
         self.assertEqual(self.pencil, self.player.search_item("pencil"))
+        self.pencil.name = "quill"
+        self.assertEqual(self.pencil, self.player.search_item("quill"))
+        self.table.name = "desk"
+        self.assertEqual(self.table, self.hall.search_item("desk"))
+        self.assertIn("name", vars(self.table), "savegames see the name")
 
     def test_locate_item(self):
         item, container = self.player.locate_item("<notexisting>")
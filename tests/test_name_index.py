@@ -0,0 +1,92 @@
+import unittest
+
+from tale import mud_context
+from tale.base import Container, Item, Living, Location
+from tale.name_index import NameIndex, NameLookup
+from tale.player import Player
+from tests.supportstuff import FakeDriver
+
+
+class TestNameIndex(unittest.TestCase):
+
+    def setUp(self):
+        previous = mud_context.driver
+        mud_context.driver = FakeDriver()
+        self.addCleanup(setattr, mud_context, "driver", previous)
+
+    def test_find(self):
+        sword = Item("sword", "rusty sword")
+        sword.aliases = {"blade"}
+        index = NameIndex([sword])
+        self.assertIs(sword, index.find("sword"))
+        self.assertIs(sword, index.find("Blade"))
+        self.assertIs(sword, index.find("rusty sword"))
+        self.assertIsNone(index.find("axe"))
+        index.discard(sword)
+        self.assertIsNone(index.find("sword"))
+        self.assertEqual(0, len(index))
+
+    def test_name_before_alias(self):
+        knife = Item("knife")
+        knife.aliases = {"dagger"}
+        dagger = Item("dagger")
+        index = NameIndex([knife, dagger])
+        self.assertIs(dagger, index.find("dagger"))
+
+    def test_hidden_title(self):
+        rat = Living("rat", "n", title="grey rat")
+        index = NameIndex([rat])
+        rat.hidden = True
+        self.assertIsNone(index.find("grey rat"))
+        self.assertIs(rat, index.find("rat"))
+
+    def test_location_follows_changes(self):
+        hall = Location("hall")
+        rat = Living("rat", "n")
+        hall.insert(rat, None)
+        self.assertIs(rat, hall.search_living("rat"))
+        rat.aliases.add("vermin")
+        self.assertIs(rat, hall.search_living("vermin"))
+        rat.aliases = {"rodent"}
+        self.assertIsNone(hall.search_living("vermin"))
+        self.assertIs(rat, hall.search_living("rodent"))
+        rat.title = "big rat"
+        self.assertIs(rat, hall.search_living("big rat"))
+        hall.remove(rat, None)
+        self.assertIsNone(hall.search_living("rat"))
+        self.assertIsNone(hall.search_living("rodent"))
+
+    def test_locate_item(self):
+        julie = Player("julie", "f")
+        hall = Location("hall")
+        julie.move(hall)
+        coin = Item("coin")
+        bag = Container("bag")
+        bag.insert(coin, julie)
+        julie.insert(bag, julie)
+        rock = Item("rock")
+        hall.insert(rock, None)
+        self.assertEqual((coin, bag), julie.locate_item("coin"))
+        self.assertEqual((rock, hall), julie.locate_item("rock"))
+        coin.aliases.add("money")
+        self.assertEqual((coin, bag), julie.locate_item("money"))
+        bag.remove(coin, julie)
+        self.assertEqual((None, None), julie.locate_item("coin"))
+
+    def test_lookup(self):
+        hall = Location("hall")
+        julie = Player("julie", "f")
+        julie.move(hall)
+        rock = Item("rock")
+        rock.aliases = {"stone"}
+        hall.insert(rock, None)
+        pebble = Item("pebble")
+        pebble.aliases = {"stone"}
+        julie.insert(pebble, julie)
+        items = NameLookup(hall.item_names, julie.inventory_names)
+        self.assertIs(pebble, items["stone"], "the inventory goes last, like when the names were collected in a dict")
+        self.assertIs(rock, items["rock"])
+        self.assertNotIn("rusty", items)
+        self.assertEqual({"rock", "stone", "pebble"}, set(items))
+        self.assertTrue(items)
+        self.assertFalse(NameLookup(Location("void").living_names))
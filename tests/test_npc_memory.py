@@ -0,0 +1,54 @@
+from tale import parse_utils
+from tale.base import Location
+from tale.llm import llm_cache
+from tale.llm.LivingNpc import LivingNpc
+from tale.llm.npc_memory import IMPORTANCE_INVOLVED, NpcMemory
+from tests.supportstuff import FakeDriver
+
+
+class TestNpcMemory():
+
+    def test_render(self):
+        memory = NpcMemory([llm_cache.cache_event('first'), llm_cache.cache_event('second')], budget=100)
+        memory.append(llm_cache.cache_event('third'))
+        assert memory.render() == 'first<break>second<break>third'
+        assert memory.render(2) == 'second<break>third'
+        assert len(memory) == 3
+        assert list(memory) == [llm_cache.generate_hash('first'), llm_cache.generate_hash('second'), llm_cache.generate_hash('third')]
+        assert memory[-1] == llm_cache.generate_hash('third')
+
+    def test_forget_oldest(self):
+        memory = NpcMemory(budget=50, keep_recent=1)
+        for i in range(10):
+            memory.append(llm_cache.cache_event('event %d' % i))
+        assert len(memory.render()) <= 50
+        assert memory.render().endswith('event 9')
+        assert 'event 0' not in memory.render()
+
+    def test_keep_important(self):
+        memory = NpcMemory(budget=80, keep_recent=2)
+        memory.append(llm_cache.cache_event('player says hello'), IMPORTANCE_INVOLVED)
+        for i in range(5):
+            memory.append(llm_cache.cache_event('a bird sings %d' % i))
+        assert memory.render().startswith('player says hello')
+        assert memory.render().endswith('a bird sings 3<break>a bird sings 4')
+
+    def test_keep_recent_over_budget(self):
+        memory = NpcMemory(budget=10, keep_recent=2)
+        memory.append(llm_cache.cache_event('a very long event'))
+        memory.append(llm_cache.cache_event('another very long event'))
+        assert len(memory) == 2
+
+    def test_reload_before_cache(self):
+        FakeDriver()
+        location = Location('hall')
+        npc = LivingNpc(name='bertha', gender='f', age=30, personality='')
+        location.insert(npc, None)
+        npc._observed_events.append(llm_cache.cache_event('bertha says hi'))
+        npc._observed_events.append(llm_cache.cache_event('a dog barks'))
+        saved_npcs = parse_utils.save_npcs([npc])
+        saved_cache = llm_cache.json_dump()
+        llm_cache.load({})   # a new game, loading a save: npcs first, then the cache
+        npcs = parse_utils.load_npcs(saved_npcs.values())
+        llm_cache.load(saved_cache)
+        assert npcs['Bertha']._observed_events.render() == 'bertha says hi<break>a dog barks'
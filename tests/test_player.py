@@ -24,7 +24,7 @@ from tale.skills.skills import Skills
 from tale.story import *
 from tale.tio.console_io import ConsoleIo
 from tale.tio.iobase import IoAdapterBase
-from tests.supportstuff import FakeDriver, MsgTraceNPC
+from tests.supportstuff import FakeDriver, MsgTraceNPC, QueuedScheduler
 
 
 class TestPlayer(unittest.TestCase):
@@ -34,6 +34,27 @@ class TestPlayer(unittest.TestCase):
         tale.mud_context.config.server_mode = GameMode.IF
         tale.mud_context.resources = tale.mud_context.driver.resources
 
+    def test_evoke_in_order(self):
+        llm_util = tale.mud_context.driver.llm_util
+        llm_util.scheduler = scheduler = QueuedScheduler()
+        llm_util.evoke = lambda message, rolling_prompt, **args: ("evoked " + message, rolling_prompt + "|" + message)
+        player = Player("fritz", "m")
+        Location("hall").insert(player, player)
+        player.tell("first", evoke=True, end=True)
+        player.tell("second", evoke=False, end=True)
+        player.tell("third", evoke=True, end=True)
+        player.tell("fourth", evoke=False, end=True)
+        self.assertEqual(1, len(scheduler.jobs), "one evoke at a time")
+        self.assertEqual([], player.test_get_output_paragraphs())
+        scheduler.run_next()
+        self.assertEqual(["evoked first\n", "second\n"], player.test_get_output_paragraphs())
+        self.assertEqual(1, len(scheduler.jobs))
+        scheduler.run_next()
+        self.assertEqual(["evoked third\n", "fourth\n"], player.test_get_output_paragraphs())
+        self.assertEqual("|first|third", player.rolling_prompt, "each evoke sees the memory of the one before")
+        player.tell("fifth", evoke=False, end=True)
+        self.assertEqual(["fifth\n"], player.test_get_output_paragraphs())
+
     def test_init(self):
         player = Player("fritz", "m")
         player.title = "Fritz the great"
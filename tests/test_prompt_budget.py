@@ -0,0 +1,49 @@
+from tale.llm import prompt_budget
+from tale.llm.prompt_budget import PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_REQUIRED, Section
+
+
+class TestPromptBudget():
+
+    def test_count_tokens(self):
+        assert prompt_budget.count_tokens('') == 0
+        assert prompt_budget.count_tokens('abcd') == 1
+        assert prompt_budget.count_tokens('abcde') == 2
+
+    def test_pluggable_tokenizer(self):
+        prompt_budget.set_tokenizer(lambda text: len(text.split()))
+        try:
+            assert prompt_budget.count_tokens('three small words') == 3
+            assert prompt_budget.truncate('one two three four', 2).split() == ['one', 'two']
+        finally:
+            prompt_budget.set_tokenizer(None)
+
+    def test_truncate(self):
+        assert prompt_budget.truncate('0123456789', 1) == '0123'
+        assert prompt_budget.truncate('0123456789', 1, keep_end=True) == '6789'
+        assert prompt_budget.truncate('0123456789', 0) == ''
+
+    def test_context_budget(self):
+        assert prompt_budget.context_budget({'max_context_length': 100, 'max_length': 20}, 'x' * 40) == 70
+        assert prompt_budget.context_budget({'max_tokens': 20}, 'x' * 40) == 0
+        assert prompt_budget.context_budget({'max_tokens': 20}, 'x' * 40, context_window=100) == 70
+
+    def test_fit_unlimited(self):
+        sections = [Section('A:', 'a' * 100), Section('B:', 'b', end=';')]
+        assert prompt_budget.fit(sections, 0) == 'A:' + 'a' * 100 + '; B:b;'
+
+    def test_fit_trims_low_priority_first(self):
+        sections = [Section('Card:', 'c' * 40, priority=PRIORITY_REQUIRED),
+                    Section('Location:', 'l' * 40, priority=PRIORITY_HIGH),
+                    Section('History:', 'old' + 'h' * 80 + 'new', end=';', priority=PRIORITY_LOW, keep_end=True)]
+        result = prompt_budget.fit(sections, 40)
+        assert prompt_budget.count_tokens(result) <= 40
+        assert 'c' * 40 in result
+        assert 'l' * 40 in result
+        assert result.endswith('new;')
+        assert 'old' not in result
+
+    def test_fit_drops_sections(self):
+        sections = [Section('Card:', 'c' * 40, priority=PRIORITY_REQUIRED),
+                    Section('Story:', 's' * 400),
+                    Section('History:', 'h' * 400, priority=PRIORITY_LOW)]
+        assert prompt_budget.fit(sections, 15) == 'Card:' + 'c' * 40 + '; '
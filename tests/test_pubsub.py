@@ -104,6 +104,14 @@ class TestPubsub(unittest.TestCase):
         s.send("event", True)
         self.assertEqual([], subber.messages)
 
+    def test_notify(self):
+        s = topic("notifytest")
+        notified = []
+        s.notify = lambda: notified.append(len(s.events))
+        s.send("event1")
+        s.send("event2")
+        self.assertEqual([1, 2], notified)
+
     def test_weakrefs(self):
         s = topic("test222")
         subber = Subber("sub1")
@@ -2,7 +2,8 @@
 
 
 import os
-from tale.resources_utils import check_file_exists_in_resources, pad_text_for_avatar, unpad_text
+from tale import resources_utils
+from tale.resources_utils import ResourceIndex, check_file_exists_in_resources, pad_text_for_avatar, unpad_text
 import shutil
 
 
@@ -35,6 +36,41 @@ class TestResourceUtils:
         test_text2 = "Test <:> text"
         assert unpad_text(test_text2) == "Test : text"
 
+    def test_resource_index(self, tmp_path):
+        (tmp_path / "wolf.jpg").write_bytes(b"")
+        index = ResourceIndex(str(tmp_path), poll_interval=0)
+        assert index.exists("wolf.jpg")
+        assert not index.exists("cat.jpg")
+        (tmp_path / "cat.jpg").write_bytes(b"")
+        index.refresh(force=True)
+        assert index.exists("cat.jpg")
+        assert len(index) == 2
+
+    def test_resource_index_polls(self, tmp_path):
+        index = ResourceIndex(str(tmp_path), poll_interval=3600)
+        assert not index.exists("wolf.jpg")
+        (tmp_path / "wolf.jpg").write_bytes(b"")
+        assert not index.exists("wolf.jpg"), "no disk access until the poll interval passed"
+        index.add("wolf.jpg")
+        assert index.exists("wolf.jpg")
+        index.discard("wolf.jpg")
+        assert not index.exists("wolf.jpg")
+
+    def test_resource_index_missing_folder(self, tmp_path):
+        index = ResourceIndex(str(tmp_path / "missing"), poll_interval=0)
+        assert not index.exists("wolf.jpg")
+        assert len(index) == 0
+
+    def test_check_file_exists_in_resources(self, tmp_path):
+        folder = resources_utils.resource_index.folder
+        (tmp_path / "test.jpg").write_bytes(b"")
+        try:
+            resources_utils.resource_index.set_folder(str(tmp_path))
+            assert check_file_exists_in_resources("test") == "test"
+            assert check_file_exists_in_resources("wolf") is None
+        finally:
+            resources_utils.resource_index.set_folder(folder)
+
     # def test_check_file_exists_in_resources(self):
     #     """Test checking file exists in resources."""
     #     shutil.copyfile("./tests/files/test.jpg", "./tale/web/resources/test.jpg")
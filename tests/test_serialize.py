@@ -4,6 +4,7 @@ Unit tests for serialization
 'Tale' mud driver, mudlib and interactive fiction framework
 Copyright by Irmen de Jong (irmen@razorvine.net)
 """
+import io
 import os
 import unittest
 import datetime
@@ -364,5 +365,76 @@ class TestSerializing(unittest.TestCase):
         assert x["dummy"] == "dummyvalue"
 
 
+class TestStreamingSavegames(unittest.TestCase):
+    def setUp(self):
+        mud_context.driver = FakeDriver()
+        self.player = player.Player("julie", "f")
+        self.hall = base.Location("hall")
+        self.garden = base.Location("garden")
+        self.exit = base.Exit("garden", self.garden, "the garden")
+        self.hall.add_exits([self.exit])
+        self.lamp = base.Item("lamp")
+        self.key = base.Item("key")
+        self.hall.insert(self.lamp, None)
+        self.hall.insert(self.key, None)
+        self.hall.insert(self.player, None)
+
+    def save(self, serializer, delta=False):
+        return serializer.serialize(None, self.player, [self.lamp, self.key], [], [self.hall, self.garden], [self.exit],
+                                    [], None, delta=delta)
+
+    def test_checkpoint(self):
+        serializer = TaleSerializer()
+        data = self.save(serializer)
+        assert data.startswith(b"TALESAVE2")
+        state = TaleDeserializer().deserialize(data)
+        assert [i["name"] for i in state["items"]] == ["lamp", "key"]
+        assert len(state["locations"]) == 3, "limbo is always saved"
+        assert state["player"]["name"] == "julie"
+        assert state["deferreds"] == []
+        assert serializer.can_save_delta
+
+    def test_deltas(self):
+        serializer = TaleSerializer()
+        data = self.save(serializer)
+        self.assertEqual(0, serializer.num_deltas)
+        out = io.BytesIO()
+        self.assertEqual(0, serializer.serialize_to(out, None, self.player, [self.lamp, self.key], [], [self.hall, self.garden],
+                                                    [self.exit], [], None, delta=True), "nothing changed")
+        data += out.getvalue()
+        self.key.name = "golden key"
+        self.hall.remove(self.lamp, None)
+        self.player.move(self.garden)
+        out = io.BytesIO()
+        written = serializer.serialize_to(out, None, self.player, [self.key], [], [self.hall, self.garden], [self.exit],
+                                          [], None, delta=True)
+        self.assertEqual(3, written, "the key and both locations")
+        self.assertEqual(2, serializer.num_deltas)
+        data += out.getvalue()
+        state = TaleDeserializer().deserialize(data)
+        self.assertEqual(["golden key"], [i["name"] for i in state["items"]])
+        self.assertEqual(self.garden.vnum, state["player"]["location"][0])
+        hall = [loc for loc in state["locations"] if loc["vnum"] == self.hall.vnum][0]
+        self.assertEqual({(self.key.vnum, "golden key", "tale.base.Item", "tale.base.Item")}, hall["items"])
+
+    def test_delta_needs_checkpoint(self):
+        with self.assertRaises(ValueError):
+            self.save(TaleSerializer(), delta=True)
+
+    def test_integrity(self):
+        with self.assertRaises(ValueError):
+            TaleSerializer().serialize(None, self.player, [self.lamp], [], [self.hall], [self.exit], [], None)
+
+    def test_truncated(self):
+        data = self.save(TaleSerializer())
+        with self.assertRaises(ValueError):
+            TaleDeserializer().deserialize(data[:len(data) // 2])
+
+    def test_old_format(self):
+        serializer = TaleSerializer()
+        data = serializer.obfuscate(serializer.serializer.serialize({"player": "julie", "items": []}))
+        self.assertEqual({"player": "julie", "items": []}, TaleDeserializer().deserialize(data))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,83 @@
+import datetime
+
+from tale import util
+from tale.base import Location
+from tale.interest import InterestManager
+from tale.spawn_manager import SpawnManager
+from tale.zone import Zone
+
+
+class CountingSpawner:
+    def __init__(self, spawn_rate: int, zone: Zone = None):
+        self.spawn_rate = spawn_rate
+        self.time = 0
+        self.zone = zone
+        self.fired = 0
+
+    def fire(self):
+        self.fired += 1
+
+
+class TestSpawnManager():
+
+    def setup_method(self):
+        self.clock = util.GameDateTime(datetime.datetime(year=2023, month=1, day=1), 1)
+        self.manager = SpawnManager()
+        self.manager.tick(self.clock)
+
+    def run_ticks(self, ticks: int, *args) -> None:
+        for _ in range(ticks):
+            self.clock.add_realtime(datetime.timedelta(seconds=SpawnManager.interval))
+            self.manager.tick(self.clock, *args)
+
+    def test_spawn_rate(self):
+        fast = CountingSpawner(15)
+        slow = CountingSpawner(40)
+        self.manager.add(fast)
+        self.manager.add(slow)
+        self.run_ticks(8)
+        assert fast.fired == 8
+        assert slow.fired == 3, "fires at 45, 90 and 120 seconds, like when it added 15 seconds at a time"
+        assert slow.time == 0
+
+    def test_waits_for_the_interval(self):
+        spawner = CountingSpawner(15)
+        self.manager.add(spawner)
+        self.clock.add_realtime(datetime.timedelta(seconds=10))
+        self.manager.tick(self.clock)
+        assert spawner.fired == 0
+        self.clock.add_realtime(datetime.timedelta(seconds=5))
+        self.manager.tick(self.clock)
+        assert spawner.fired == 1
+
+    def test_remove(self):
+        spawners = [CountingSpawner(15) for _ in range(3)]
+        for spawner in spawners:
+            self.manager.add(spawner)
+        self.manager.remove(spawners[0])
+        assert len(self.manager) == 2
+        assert spawners[0] not in self.manager
+        self.run_ticks(2)
+        assert [s.fired for s in spawners] == [0, 2, 2]
+
+    def test_dormant_zones(self):
+        here = Zone('here')
+        hall = Location('hall')
+        here.add_location(hall)
+        next_door = Zone('next door')
+        here.neighbors['east'] = next_door
+        far_away = Zone('far away')
+        far_away.add_location(Location('cave'))
+        zones = {'hall': here, 'cave': far_away}
+        interest = InterestManager()
+        interest.update([hall], zones.get)
+        spawners = [CountingSpawner(15, here), CountingSpawner(15, next_door), CountingSpawner(15, far_away)]
+        for spawner in spawners:
+            self.manager.add(spawner)
+        self.run_ticks(5, interest)
+        assert [s.fired for s in spawners] == [5, 5, 0]
+        interest.update([far_away.get_location('cave')], zones.get)
+        self.run_ticks(1, interest)
+        assert [s.fired for s in spawners] == [5, 5, 1 + SpawnManager.max_catch_up], "catches up on a few missed spawns"
+        self.run_ticks(1)
+        assert [s.fired for s in spawners] == [6, 6, 2 + SpawnManager.max_catch_up], "without interest all spawners are active"
@@ -0,0 +1,58 @@
+import os
+import threading
+import tempfile
+
+from tale.llm import story_saver
+
+
+class TestStorySaver():
+
+    def setup_method(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.folder.name, 'source')
+        self.destination = os.path.join(self.folder.name, 'destination')
+        os.makedirs(os.path.join(self.source, 'images'))
+        for name in ('a.txt', os.path.join('images', 'b.jpg')):
+            with open(os.path.join(self.source, name), 'w') as fp:
+                fp.write(name)
+
+    def teardown_method(self):
+        self.folder.cleanup()
+
+    def test_write_atomic(self):
+        path = os.path.join(self.folder.name, 'world.json')
+        story_saver.write_atomic(path, '{"old": 1}')
+        story_saver.write_atomic(path, '{"new": 2}')
+        with open(path) as fp:
+            assert fp.read() == '{"new": 2}'
+        assert not os.path.exists(path + '.tmp')
+
+    def test_sync_tree_skips_unchanged(self):
+        assert story_saver.sync_tree(self.source, self.destination) == 2
+        assert os.path.exists(os.path.join(self.destination, 'images', 'b.jpg'))
+        assert story_saver.sync_tree(self.source, self.destination) == 0
+        with open(os.path.join(self.source, 'a.txt'), 'w') as fp:
+            fp.write('changed, and longer')
+        assert story_saver.sync_tree(self.source, self.destination) == 1
+
+    def test_submit_serializes_on_save_thread(self):
+        threads = []
+        def dumps():
+            threads.append(threading.current_thread())
+            return '{"serialized": true}'
+        save_path = os.path.join(self.folder.name, 'save')
+        assert story_saver.submit(save_path, {'world.json': dumps}).result(timeout=10) == 1
+        assert threads and threads[0] is not threading.current_thread()
+        with open(os.path.join(save_path, 'world.json')) as fp:
+            assert fp.read() == '{"serialized": true}'
+
+    def test_submit(self):
+        done = []
+        save_path = os.path.join(self.folder.name, 'save')
+        future = story_saver.submit(save_path, {'world.json': '{}'}, [(self.source, os.path.join(save_path, 'resources')),
+                                                                      (os.path.join(self.source, 'missing.py'), os.path.join(save_path, 'story.py'))],
+                                    after=lambda: done.append(True))
+        assert future.result(timeout=10) == 3
+        assert done == [True]
+        assert os.path.exists(os.path.join(save_path, 'resources', 'a.txt'))
+        assert not os.path.exists(os.path.join(save_path, 'story.py'))
@@ -0,0 +1,67 @@
+import datetime
+
+from tale.driver import Deferred
+from tale.tick_profiler import TickProfiler, deferred_name
+from tests.supportstuff import Thing
+
+
+def module_level_func():
+    pass
+
+
+class TestTickProfiler():
+
+    def test_percentiles(self):
+        profiler = TickProfiler(samples=100)
+        for ms in range(1, 101):
+            profiler.record('tick', ms / 1000)
+        assert profiler.percentiles('tick') == [0.05, 0.09, 0.099]
+        assert profiler.count('tick') == 100
+        assert abs(profiler.total('tick') - 5.05) < 1e-9
+        assert profiler.percentiles('nothing') == [0.0, 0.0, 0.0]
+
+    def test_samples_are_bounded(self):
+        profiler = TickProfiler(samples=10)
+        for i in range(100):
+            profiler.record('tick', i)
+        assert profiler.count('tick') == 100
+        assert profiler.percentiles('tick', (0, 100)) == [90, 99]
+
+    def test_measure(self):
+        profiler = TickProfiler()
+        try:
+            with profiler.measure('command:look'):
+                raise ValueError('failed commands are measured too')
+        except ValueError:
+            pass
+        assert profiler.names() == ['command:look']
+
+    def test_slow_ticks(self):
+        profiler = TickProfiler()
+        profiler.tick_done(0.5, 1.0, ('', 0.0))
+        assert not profiler.slow_ticks
+        profiler.tick_done(1.5, 1.0, ('Wolf.do_wander', 1.2))
+        assert profiler.num_slow_ticks == 1
+        assert profiler.slow_ticks[0].culprit == 'Wolf.do_wander'
+        assert profiler.slow_ticks[0].culprit_duration == 1.2
+        profiler.reset()
+        assert profiler.num_slow_ticks == 0
+        assert profiler.names() == []
+
+    def test_prometheus(self):
+        profiler = TickProfiler()
+        profiler.record('deferred:Wolf."do"', 0.25)
+        profiler.gauge('llm_queue_depth', lambda: 3)
+        profiler.gauge('broken', lambda: 1 / 0)
+        text = profiler.prometheus()
+        assert '# TYPE tale_seconds summary' in text
+        assert 'tale_seconds{phase="deferred:Wolf.\\"do\\"",quantile="0.5"} 0.250000' in text
+        assert 'tale_seconds_count{phase="deferred:Wolf.\\"do\\""} 1' in text
+        assert 'tale_llm_queue_depth 3.0' in text
+        assert 'broken' not in text
+        assert text.endswith('\n')
+
+    def test_deferred_name(self):
+        due = datetime.datetime.now()
+        assert deferred_name(Deferred(due, Thing().append, [], None)) == 'Thing.append'
+        assert deferred_name(Deferred(due, module_level_func, [], None)) == 'tests.test_tick_profiler.module_level_func'
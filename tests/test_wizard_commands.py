@@ -200,4 +200,35 @@ class TestEvents():
             if event == event_string:
                 assert(True)
                 return
-        assert(False)
\ No newline at end of file
+        assert(False)
+    def test_ticks(self):
+        context = tale._MudContext()
+        context.driver = FakeDriver()
+        context.driver.profiler.record('deferred:Wolf.do_wander', 0.002)
+        context.driver.profiler.record('command:look', 0.001)
+        context.driver.profiler.tick_done(2.0, 1.0, ('Wolf.do_wander', 1.5))
+        player = Player('test', 'f')
+        player.privileges.add('wizard')
+        wizard.do_ticks(player, ParseResult(verb='ticks', args=['deferred']), context)
+        output = ''.join(player.test_get_output_paragraphs())
+        assert 'deferred:Wolf.do_wander' in output
+        assert 'command:look' not in output
+        assert 'slowest deferred: Wolf.do_wander 1500 ms' in output
+        wizard.do_ticks(player, ParseResult(verb='ticks', args=['reset']), context)
+        assert context.driver.profiler.names() == []
+
+    def test_llm_budget(self):
+        context = tale._MudContext()
+        context.driver = FakeDriver()
+        governor = context.driver.llm_util.governor
+        governor.rate_limits = {'idle': 1}
+        assert governor.admit('idle')
+        assert not governor.admit('idle')
+        player = Player('test', 'f')
+        player.privileges.add('wizard')
+        wizard.do_llm_budget(player, ParseResult(verb='llm_budget'), context)
+        output = ''.join(player.test_get_output_paragraphs())
+        assert 'Llm budget' in output
+        assert 'idle' in output
+        wizard.do_llm_budget(player, ParseResult(verb='llm_budget', args=['reset']), context)
+        assert governor.stats()['kinds']['idle']['refused'] == 0
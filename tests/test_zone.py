@@ -1,6 +1,8 @@
 """ Tests zone.py """
 
 import json
+
+import pytest
 from tale import zone
 from tale.base import Location
 from tale.coord import Coord
@@ -85,4 +87,15 @@ class TestZone():
         zone_info = '{ "name": "Whispering Woods", "description": "A dense, misty forest teeming with life. The trees whisper secrets to those who listen, and the creatures here are said to possess ancient wisdom. Friendly creatures roam the area, and the air is filled with the sweet scent of enchanted flowers.", "races": [], "items": [], "mood": 5, "level": 1} \n'
         z = zone.from_json(json.loads(zone_info))
         assert z.name == 'Whispering Woods'
-        assert z.description.startswith('A dense, misty forest teeming with life. The trees whisper secrets to those who listen, and the creatures here are said to possess ancient wisdom.')
\ No newline at end of file
+        assert z.description.startswith('A dense, misty forest teeming with life. The trees whisper secrets to those who listen, and the creatures here are said to possess ancient wisdom.')
+    def test_random_location(self):
+        zone = Zone('test')
+        with pytest.raises(IndexError):
+            zone.random_location()
+        hall = Location('hall')
+        zone.add_location(hall)
+        assert zone.random_location() == hall
+        zone.locations['kitchen'] = Location('kitchen')
+        assert {zone.random_location().name for _ in range(50)} == {'hall', 'kitchen'}
+        zone.remove_location('hall')
+        assert zone.random_location().name == 'kitchen'